@@ -0,0 +1,134 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+# Distinct IPs listed in one digest; the rest are summarised as a count
+DIGEST_MAX_IPS = 20
+
+
+class _Group:
+    def __init__(self, window_end):
+        self.window_end = window_end
+        self.count = 0
+        self.ips = Counter()
+        self.first = None
+        self.last = None
+
+
+class AlertCoalescer:
+    """Collapses repeated security alerts for one (recipient, app) pair.
+
+    ``admit(recipient, app_name, ip_address)`` returns True for the first
+    event in a ``window``-second window; the caller then captures evidence
+    and sends the full alert. Later events in the window return False and
+    are only counted. When a window ends with folded events, one digest
+    (count, time range, source IPs) is enqueued on the alert queue as an
+    ``alert_digest`` job and a new window starts; a window that ends quiet
+    is dropped, so the next event alerts immediately again. A ``window`` of
+    0 admits everything. Follows the Flask extension pattern like
+    LockoutEngine.
+    """
+
+    def __init__(self, app=None, window=300, queue=None, kind='alert_digest'):
+        self.window = window
+        self.queue = queue
+        self.kind = kind
+        self._lock = threading.Lock()
+        self._groups = {}
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._immediate = 0
+        self._folded = 0
+        self._digests = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.window = app.config.get('ALERT_COALESCE_WINDOW', self.window)
+        self.queue = app.extensions.get('alert_queue') or self.queue
+        app.extensions['alert_coalescer'] = self
+
+    def admit(self, recipient, app_name, ip_address=None):
+        """True if this event should be alerted now, False if it was folded into a digest"""
+        if self.window <= 0:
+            return True
+        now = time.time()
+        with self._lock:
+            group = self._groups.get((recipient, app_name))
+            if group is None or (now >= group.window_end and group.count == 0):
+                group = self._groups[(recipient, app_name)] = _Group(now + self.window)
+                self._immediate += 1
+                return True
+            group.count += 1
+            group.ips[ip_address or 'unknown'] += 1
+            group.first = group.first or now
+            group.last = now
+            self._folded += 1
+            return False
+
+    def flush(self, force=False):
+        """Enqueue digests for windows that have ended (every window if ``force``)"""
+        now = time.time()
+        digests = []
+        with self._lock:
+            for key, group in list(self._groups.items()):
+                if not force and now < group.window_end:
+                    continue
+                if group.count == 0:
+                    del self._groups[key]
+                    continue
+                digests.append(self._digest(key, group))
+                self._groups[key] = _Group(now + self.window)
+            self._digests += len(digests)
+        for digest in digests:
+            try:
+                self.queue.enqueue(self.kind, digest)
+            except Exception as e:
+                print(f"Error queueing alert digest for {digest['recipient']}: {str(e)}")
+        return len(digests)
+
+    def _digest(self, key, group):
+        recipient, app_name = key
+        ips = group.ips.most_common(DIGEST_MAX_IPS)
+        return {
+            'recipient': recipient,
+            'app_name': app_name,
+            'count': group.count,
+            'first': datetime.fromtimestamp(group.first).strftime('%Y-%m-%d %H:%M:%S'),
+            'last': datetime.fromtimestamp(group.last).strftime('%Y-%m-%d %H:%M:%S'),
+            'ips': ips,
+            'other_ips': len(group.ips) - len(ips),
+        }
+
+    def _run(self):
+        # Check a few times per window so digests go out close to the window end
+        while not self._stopping.wait(max(1.0, min(self.window / 4, 30.0))):
+            self.flush()
+
+    def start(self):
+        if self.window > 0 and (self._thread is None or not self._thread.is_alive()):
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and enqueue whatever has been folded so far"""
+        self._stopping.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+        self.flush(force=True)
+
+    def stats(self):
+        with self._lock:
+            events = self._immediate + self._folded
+            return {
+                'window': self.window,
+                'groups': len(self._groups),
+                'pending_events': sum(group.count for group in self._groups.values()),
+                'immediate': self._immediate,
+                'folded': self._folded,
+                'digests': self._digests,
+                'suppression_ratio': round(self._folded / events, 3) if events else None,
+            }
@@ -0,0 +1,312 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from evidence import Evidence
+
+
+class PermanentAlertError(Exception):
+    """Raised by a handler when retrying cannot help; the job is dead-lettered at once"""
+
+
+class AlertQueue:
+    """Durable queue of alert jobs in a local SQLite file, drained by a worker pool.
+
+    ``enqueue(kind, payload, evidence)`` is one short local transaction, so
+    request handlers never wait on a mail server; evidence images are kept
+    as BLOBs rather than base64 inside the JSON payload. Workers run the
+    handler registered for ``kind`` (inside an app context when there is an
+    app), delete the job when it succeeds and otherwise retry it with
+    jittered exponential backoff. A job that fails ``max_attempts`` times,
+    or raises PermanentAlertError, stays in the table as a dead letter until
+    requeued. A claimed job holds a ``lease``; if its worker dies the job
+    becomes due again once it expires, so several processes can share one
+    queue file. Follows the Flask extension pattern like LockoutEngine.
+    """
+
+    def __init__(self, app=None, path=None, workers=2, max_attempts=5, backoff=5.0, max_backoff=600.0,
+                 lease=300.0, poll_interval=1.0):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.app = None
+        self.handlers = {}
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads = []
+        self._ready = False
+
+        self._enqueued = 0
+        self._delivered = 0
+        self._retried = 0
+        self._dead_lettered = 0
+        self._active = 0
+        self._latencies = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.app = app
+        self.path = config.get('ALERT_QUEUE_PATH', self.path)
+        self.workers = config.get('ALERT_WORKERS', self.workers)
+        self.max_attempts = config.get('ALERT_MAX_ATTEMPTS', self.max_attempts)
+        self.backoff = config.get('ALERT_RETRY_BACKOFF', self.backoff)
+        self.max_backoff = config.get('ALERT_RETRY_MAX_BACKOFF', self.max_backoff)
+        app.extensions['alert_queue'] = self
+
+    def register(self, kind, handler):
+        """Deliver ``kind`` jobs with ``handler(payload)``"""
+        self.handlers[kind] = handler
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            directory = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        if not self._ready:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_jobs (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'pending',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    enqueued_at REAL NOT NULL,
+                    run_at REAL NOT NULL,
+                    last_error TEXT
+                )
+            """)
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_alert_jobs_due ON alert_jobs (status, run_at)')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS alert_evidence (
+                    job_id INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    mime_type TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    captured_at REAL NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (job_id, position)
+                )
+            """)
+            self._ready = True
+        return conn
+
+    def enqueue(self, kind, payload, evidence=()):
+        """Store a job for the workers and return its id.
+
+        ``evidence`` (Evidence objects) is stored as BLOBs next to the job and
+        handed to the handler as ``payload['evidence']``.
+        """
+        now = time.time()
+        evidence = [item for item in evidence if item]
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = conn.execute(
+                'INSERT INTO alert_jobs (kind, payload, enqueued_at, run_at) VALUES (?, ?, ?, ?)',
+                (kind, json.dumps(payload), now, now)
+            )
+            conn.executemany(
+                'INSERT INTO alert_evidence (job_id, position, mime_type, filename, captured_at, data) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [(cursor.lastrowid, i, item.mime_type, item.filename, item.captured_at, item.data)
+                 for i, item in enumerate(evidence)]
+            )
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        with self._wake:
+            self._enqueued += 1
+            self._wake.notify()
+        return cursor.lastrowid
+
+    def _claim(self):
+        """Lease the next due job as (id, kind, payload, attempts, enqueued_at), or None"""
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 'sending' rows past their lease belong to a worker that died mid-delivery
+            row = conn.execute(
+                "SELECT id, kind, payload, attempts, enqueued_at FROM alert_jobs "
+                "WHERE status IN ('pending', 'sending') AND run_at <= ? ORDER BY run_at, id LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE alert_jobs SET status = 'sending', attempts = attempts + 1, run_at = ? "
+                             "WHERE id = ?", (now + self.lease, row[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if row is None:
+            return None
+        payload = json.loads(row[2])
+        payload['evidence'] = [
+            Evidence(data, mime_type, filename, captured_at)
+            for mime_type, filename, captured_at, data in conn.execute(
+                'SELECT mime_type, filename, captured_at, data FROM alert_evidence WHERE job_id = ? ORDER BY position',
+                (row[0],)
+            )
+        ]
+        return row[0], row[1], payload, row[3] + 1, row[4]
+
+    def _next_due(self):
+        row = self._conn().execute(
+            "SELECT MIN(run_at) FROM alert_jobs WHERE status IN ('pending', 'sending')"
+        ).fetchone()
+        return row[0]
+
+    def run_once(self):
+        """Deliver one due job; False if none was due"""
+        job = self._claim()
+        if job is None:
+            return False
+        job_id, kind, payload, attempts, enqueued_at = job
+        with self._lock:
+            self._active += 1
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                raise PermanentAlertError(f'no handler for {kind!r}')
+            if self.app is not None:
+                with self.app.app_context():
+                    handler(payload)
+            else:
+                handler(payload)
+        except Exception as e:
+            self._failed(job_id, kind, attempts, e)
+        else:
+            self._delete(job_id)
+            with self._lock:
+                self._delivered += 1
+                self._latencies.append(time.time() - enqueued_at)
+        finally:
+            with self._lock:
+                self._active -= 1
+        return True
+
+    def _delete(self, job_id):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM alert_evidence WHERE job_id = ?', (job_id,))
+            conn.execute('DELETE FROM alert_jobs WHERE id = ?', (job_id,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def _failed(self, job_id, kind, attempts, error):
+        message = f'{type(error).__name__}: {error}'
+        if isinstance(error, PermanentAlertError) or attempts >= self.max_attempts:
+            print(f"Alert job {job_id} ({kind}) dead-lettered after {attempts} attempt(s): {message}")
+            self._conn().execute("UPDATE alert_jobs SET status = 'dead', last_error = ? WHERE id = ?",
+                                 (message, job_id))
+            with self._lock:
+                self._dead_lettered += 1
+            return
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1)) * random.uniform(0.5, 1.0)
+        print(f"Alert job {job_id} ({kind}) failed, retrying in {delay:.1f}s: {message}")
+        self._conn().execute("UPDATE alert_jobs SET status = 'pending', run_at = ?, last_error = ? WHERE id = ?",
+                             (time.time() + delay, message, job_id))
+        with self._lock:
+            self._retried += 1
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopping:
+                    return
+            try:
+                if self.run_once():
+                    continue
+                next_due = self._next_due()
+            except Exception as e:
+                print(f"Error in alert worker: {str(e)}")
+                next_due = None
+            timeout = self.poll_interval
+            if next_due is not None:
+                timeout = max(0.0, min(timeout, next_due - time.time()))
+            with self._wake:
+                if not self._stopping:
+                    self._wake.wait(timeout)
+
+    def start(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            if self._threads:
+                return
+            self._stopping = False
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'alert-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Stop the workers once their current job is done; queued jobs stay on disk"""
+        with self._wake:
+            self._stopping = True
+            self._wake.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    def dead_letters(self, limit=50):
+        rows = self._conn().execute(
+            "SELECT id, kind, attempts, enqueued_at, last_error FROM alert_jobs WHERE status = 'dead' "
+            "ORDER BY id DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [{'id': row[0], 'kind': row[1], 'attempts': row[2], 'enqueued_at': row[3], 'last_error': row[4]}
+                for row in rows]
+
+    def requeue(self, job_id):
+        """Give a dead letter a fresh set of attempts; False if there is no such dead letter"""
+        cursor = self._conn().execute(
+            "UPDATE alert_jobs SET status = 'pending', attempts = 0, run_at = ? WHERE id = ? AND status = 'dead'",
+            (time.time(), job_id)
+        )
+        if cursor.rowcount:
+            with self._wake:
+                self._wake.notify()
+        return cursor.rowcount > 0
+
+    def stats(self):
+        now = time.time()
+        counts = dict(self._conn().execute('SELECT status, COUNT(*) FROM alert_jobs GROUP BY status').fetchall())
+        oldest = self._conn().execute(
+            "SELECT MIN(enqueued_at) FROM alert_jobs WHERE status IN ('pending', 'sending')"
+        ).fetchone()[0]
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                'path': self.path,
+                'workers': len([thread for thread in self._threads if thread.is_alive()]),
+                'depth': counts.get('pending', 0) + counts.get('sending', 0),
+                'active': self._active,
+                'dead_letters': counts.get('dead', 0),
+                'oldest_pending_s': round(now - oldest, 3) if oldest else 0.0,
+                'enqueued': self._enqueued,
+                'delivered': self._delivered,
+                'retried': self._retried,
+                'dead_lettered': self._dead_lettered,
+                'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0.0,
+                'latency_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0.0,
+                'latency_max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            }
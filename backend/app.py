@@ -1,31 +1,40 @@
 from flask import Flask, request, jsonify, send_file
 from flask_cors import CORS
-from flask_mail import Mail, Message
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-import hdbcli.dbapi
 from dotenv import load_dotenv
 import os
-import cv2
-import numpy as np
 from datetime import datetime
-import base64
 import json
-from io import BytesIO
-import pyautogui
 from werkzeug.security import generate_password_hash, check_password_hash
 import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from monitoring_service import MonitoringService
-import requests
-import win32gui
-import win32process
-import psutil
+from email.message import EmailMessage
 import subprocess
 import time
 from threading import Thread
 import threading
+import atexit
+from lazy import LazyModule, LazyObject
+from capture import CameraCapture, ScreenCapture
+from capture_providers import create_provider
+from evidence import Evidence
+from imaging import ImageEncoder
+from camera import CameraService
+from geolocation import GeoLocator
+from enrichment import LocationBackfiller, attach_locations
+from alert_queue import AlertQueue, PermanentAlertError
+from alert_digest import AlertCoalescer
+from mailer import SMTPSessionPool, is_permanent
+from http_client import HttpClient
 from models import db, Notification, SecurityAlert
+from attempt_recorder import LoginAttemptRecorder
+from lockout import LockoutEngine
+from ratelimit import RateLimiter
+from maintenance import AttemptMaintenance
+from archive import ColdArchive, DATASETS, archive_security_alerts
+from pagination import decode_cursor, encode_cursor, parse_bool, parse_page_size, parse_timestamp
+from login_check import LOGIN_OK, LOGIN_BAD_PASSWORD
+from credentials import CredentialVerifier, VerifierBusy, authenticate
+from storage import create_storage
 
 # Load environment variables
 load_dotenv()
@@ -40,13 +49,62 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Initialize database
 db.init_app(app)
 
+# Desktop dependencies load on first use so API-only workers start fast
+# and the module imports on headless servers
+psutil = LazyModule('psutil')
+
+def create_monitoring_service():
+    from monitoring_service import MonitoringService
+    return MonitoringService()
+
 # Initialize monitoring service
-monitoring_service = MonitoringService()
+monitoring_service = LazyObject(create_monitoring_service)
+
+# Evidence images are downscaled to fit these dimensions and re-encoded
+# (WebP, else JPEG) at the best quality that fits in EVIDENCE_MAX_BYTES
+app.config['EVIDENCE_MAX_BYTES'] = int(os.getenv('EVIDENCE_MAX_BYTES', 300_000))
+app.config['EVIDENCE_MAX_WIDTH'] = int(os.getenv('EVIDENCE_MAX_WIDTH', 1600))
+app.config['EVIDENCE_MAX_HEIGHT'] = int(os.getenv('EVIDENCE_MAX_HEIGHT', 1600))
+app.config['EVIDENCE_FORMATS'] = os.getenv('EVIDENCE_FORMATS', 'webp,jpeg').lower().split(',')
+app.config['EVIDENCE_MIN_QUALITY'] = int(os.getenv('EVIDENCE_MIN_QUALITY', 30))
+app.config['EVIDENCE_MAX_QUALITY'] = int(os.getenv('EVIDENCE_MAX_QUALITY', 85))
+image_encoder = ImageEncoder(app)
+
+# Screenshots: 'windows', 'x11' (CAPTURE_DISPLAY, e.g. an Xvfb ':99') or 'auto';
+# 'none' keeps the pyautogui full-screen grab. CAPTURE_SCALE shrinks each grab
+app.config['CAPTURE_PROVIDER'] = os.getenv('CAPTURE_PROVIDER', 'auto')
+app.config['CAPTURE_DISPLAY'] = os.getenv('CAPTURE_DISPLAY')
+app.config['CAPTURE_SCALE'] = float(os.getenv('CAPTURE_SCALE', 1))
+screen_capture = ScreenCapture(image_encoder,
+                               provider=create_provider(app.config['CAPTURE_PROVIDER'], app.config['CAPTURE_DISPLAY']),
+                               scale=app.config['CAPTURE_SCALE'])
+
+# Optional warm camera: keeps the device open while monitoring runs and
+# buffers recent frames, so alerts get the frame from the failed attempt.
+# CAMERA_SOURCE is a device index or a video file (looped) for testing
+app.config['CAMERA_SERVICE'] = os.getenv('CAMERA_SERVICE', 'false').lower() in ('1', 'true', 'yes')
+app.config['CAMERA_SOURCE'] = os.getenv('CAMERA_SOURCE', '0')
+app.config['CAMERA_BUFFER_FRAMES'] = int(os.getenv('CAMERA_BUFFER_FRAMES', 16))
+app.config['CAMERA_FPS'] = float(os.getenv('CAMERA_FPS', 4))
+app.config['CAMERA_WARMUP_FRAMES'] = int(os.getenv('CAMERA_WARMUP_FRAMES', 5))
+camera_service = CameraService(app)
+camera_capture = CameraCapture(encoder=image_encoder, service=camera_service)
 
 # Security Configuration
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY')
-app.config['MAX_LOGIN_ATTEMPTS'] = int(os.getenv('MAX_LOGIN_ATTEMPTS', 3))
+
+# Lockout: failures per username / per IP inside a sliding window (seconds)
+app.config['LOCKOUT_THRESHOLD'] = int(os.getenv('LOCKOUT_THRESHOLD') or os.getenv('MAX_LOGIN_ATTEMPTS') or 3)
+app.config['LOCKOUT_IP_THRESHOLD'] = int(os.getenv('LOCKOUT_IP_THRESHOLD', 20))
+app.config['LOCKOUT_WINDOW'] = int(os.getenv('LOCKOUT_WINDOW', 900))
+app.config['LOCKOUT_BACKEND'] = os.getenv('LOCKOUT_BACKEND', 'memory').lower()
+app.config['LOCKOUT_SQLITE_PATH'] = os.getenv('LOCKOUT_SQLITE_PATH', os.path.join(app.instance_path, 'lockout.db'))
+lockout = LockoutEngine(app)
+
+# Listing endpoints
+app.config['API_PAGE_SIZE'] = int(os.getenv('API_PAGE_SIZE', 50))
+app.config['API_MAX_PAGE_SIZE'] = int(os.getenv('API_MAX_PAGE_SIZE', 500))
 
 # Email Configuration
 app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -55,117 +113,158 @@ app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
 app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD')
 app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_USERNAME')
-mail = Mail(app)
+app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False').lower() == 'true'
+# Alert emails reuse authenticated SMTP sessions instead of reconnecting per message
+app.config['MAIL_POOL_SIZE'] = int(os.getenv('MAIL_POOL_SIZE', 2))
+app.config['MAIL_TIMEOUT'] = float(os.getenv('MAIL_TIMEOUT', 10))
+app.config['MAIL_NOOP_AFTER'] = float(os.getenv('MAIL_NOOP_AFTER', 30))
+app.config['MAIL_IDLE_TIMEOUT'] = float(os.getenv('MAIL_IDLE_TIMEOUT', 120))
+smtp_sessions = SMTPSessionPool(app)
+atexit.register(smtp_sessions.close)
+
+# Alert emails are queued in a local SQLite file and sent by background
+# workers, retrying with backoff; jobs that keep failing are dead-lettered
+app.config['ALERT_QUEUE_PATH'] = os.getenv('ALERT_QUEUE_PATH', os.path.join(app.instance_path, 'alerts.db'))
+app.config['ALERT_WORKERS'] = int(os.getenv('ALERT_WORKERS', 2))
+app.config['ALERT_MAX_ATTEMPTS'] = int(os.getenv('ALERT_MAX_ATTEMPTS', 5))
+app.config['ALERT_RETRY_BACKOFF'] = float(os.getenv('ALERT_RETRY_BACKOFF', 5))
+app.config['ALERT_RETRY_MAX_BACKOFF'] = float(os.getenv('ALERT_RETRY_MAX_BACKOFF', 600))
+alert_queue = AlertQueue(app)
+
+# Lockout alerts for the same recipient and app within this many seconds are
+# folded into one digest email after the first full alert (0 disables it)
+app.config['ALERT_COALESCE_WINDOW'] = int(os.getenv('ALERT_COALESCE_WINDOW', 300))
+alert_coalescer = AlertCoalescer(app)
 
 # JWT Configuration
 jwt = JWTManager(app)
 
-# Database Configuration
-DB_CONFIG = {
-    'address': os.getenv('DB_ADDRESS'),
-    'port': int(os.getenv('DB_PORT')),
-    'user': os.getenv('DB_USER'),
-    'password': os.getenv('DB_PASSWORD')
-}
-
-def get_db_connection():
-    try:
-        conn = hdbcli.dbapi.connect(
-            address=os.getenv('DB_ADDRESS'),
-            port=int(os.getenv('DB_PORT')),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD')
-        )
-        print("Successfully connected to HANA database")
-        return conn
-    except Exception as e:
-        print(f"HANA Database connection error: {str(e)}")
-        return None
-
-def test_db_connection():
-    """Test database connection and table structure"""
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            # Check if USERS table exists and its structure using HANA system views
-            cursor.execute("SELECT COLUMN_NAME, DATA_TYPE_NAME FROM TABLE_COLUMNS WHERE TABLE_NAME = 'USERS' AND SCHEMA_NAME = CURRENT_SCHEMA")
-            columns = cursor.fetchall()
-            print("\nUSERS table structure:")
-            if columns:
-                for col in columns:
-                    print(f"Column: {col[0]}, Type: {col[1]}")
-            else:
-                print("No columns found. Creating USERS table...")
-                # Create USERS table if it doesn't exist
-                cursor.execute("""
-                    CREATE TABLE USERS (
-                        USERNAME NVARCHAR(100) PRIMARY KEY,
-                        PASSWORD NVARCHAR(100) NOT NULL,
-                        EMAIL NVARCHAR(100) NOT NULL
-                    )
-                """)
-                conn.commit()
-                print("USERS table created successfully")
-            
-            # Check existing users
-            cursor.execute("SELECT USERNAME, EMAIL FROM USERS")
-            users = cursor.fetchall()
-            print("\nExisting users:")
-            for user in users:
-                print(f"Username: {user[0]}, Email: {user[1]}")
-            
-            return True
-        except Exception as e:
-            print(f"Database test error: {str(e)}")
-            return False
-        finally:
-            cursor.close()
-            conn.close()
-    return False
+# Database Configuration: 'hana' for SAP HANA Cloud, 'sqlite' for a local stand-in
+app.config['STORAGE_BACKEND'] = os.getenv('STORAGE_BACKEND', 'hana').lower()
+app.config['STORAGE_SQLITE_PATH'] = os.getenv('STORAGE_SQLITE_PATH', os.path.join(app.instance_path, 'appsec.db'))
+app.config['DB_ADDRESS'] = os.getenv('DB_ADDRESS')
+app.config['DB_PORT'] = int(os.getenv('DB_PORT', 443))
+app.config['DB_USER'] = os.getenv('DB_USER')
+app.config['DB_PASSWORD'] = os.getenv('DB_PASSWORD')
+
+# Connection pool
+app.config['DB_POOL_SIZE'] = int(os.getenv('DB_POOL_SIZE', 10))
+app.config['DB_POOL_TIMEOUT'] = float(os.getenv('DB_POOL_TIMEOUT', 5))
+app.config['DB_POOL_MAX_AGE'] = int(os.getenv('DB_POOL_MAX_AGE', 1800))
+# User-record cache for the alert and monitor paths (size 0 disables it)
+app.config['USER_CACHE_SIZE'] = int(os.getenv('USER_CACHE_SIZE', 1024))
+app.config['USER_CACHE_TTL'] = int(os.getenv('USER_CACHE_TTL', 300))
+# Cached /api/db/users pages, cleared on every user write
+app.config['USER_PAGE_CACHE_SIZE'] = int(os.getenv('USER_PAGE_CACHE_SIZE', 256))
+app.config['USER_PAGE_CACHE_TTL'] = int(os.getenv('USER_PAGE_CACHE_TTL', 30))
+
+# Password hashing: werkzeug method string with its work factor, run on a
+# bounded pool (PASSWORD_HASH_WORKERS running, PASSWORD_HASH_QUEUE waiting)
+app.config['PASSWORD_HASH_METHOD'] = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.getenv('PASSWORD_HASH_WORKERS', os.cpu_count() or 4))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.getenv('PASSWORD_HASH_QUEUE', 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+verifier = CredentialVerifier(app)
+atexit.register(verifier.shutdown)
+
+# Token buckets checked before login/register touch the database: tokens per
+# second and burst size, per client IP and per username (a rate of 0 disables that limit)
+app.config['RATE_LIMIT_ENABLED'] = os.getenv('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+app.config['RATE_LIMIT_IP_RATE'] = float(os.getenv('RATE_LIMIT_IP_RATE', 1.0))
+app.config['RATE_LIMIT_IP_BURST'] = int(os.getenv('RATE_LIMIT_IP_BURST', 10))
+app.config['RATE_LIMIT_USER_RATE'] = float(os.getenv('RATE_LIMIT_USER_RATE', 0.2))
+app.config['RATE_LIMIT_USER_BURST'] = int(os.getenv('RATE_LIMIT_USER_BURST', 5))
+app.config['RATE_LIMIT_STRIPES'] = int(os.getenv('RATE_LIMIT_STRIPES', 16))
+limiter = RateLimiter(app)
+
+# Outbound HTTP: one pooled session, per-endpoint base URL and timeout, jittered
+# retries and a circuit breaker per upstream
+app.config['HTTP_POOL_SIZE'] = int(os.getenv('HTTP_POOL_SIZE', 10))
+app.config['HTTP_RETRIES'] = int(os.getenv('HTTP_RETRIES', 2))
+app.config['HTTP_BACKOFF'] = float(os.getenv('HTTP_BACKOFF', 0.2))
+app.config['HTTP_BREAKER_THRESHOLD'] = int(os.getenv('HTTP_BREAKER_THRESHOLD', 5))
+app.config['HTTP_BREAKER_RESET'] = float(os.getenv('HTTP_BREAKER_RESET', 30))
+app.config['IP_API_URL'] = os.getenv('IP_API_URL', 'http://ip-api.com')
+app.config['IPIFY_URL'] = os.getenv('IPIFY_URL', 'https://api.ipify.org')
+app.config['GEO_TIMEOUT'] = float(os.getenv('GEO_TIMEOUT', 3))
+app.config['PUBLIC_IP_TIMEOUT'] = float(os.getenv('PUBLIC_IP_TIMEOUT', 3))
+http_client = HttpClient(app)
+atexit.register(http_client.close)
+
+# Shared IP geolocation cache, persisted across restarts (empty path keeps it in memory)
+app.config['GEO_CACHE_SIZE'] = int(os.getenv('GEO_CACHE_SIZE', 4096))
+app.config['GEO_CACHE_TTL'] = int(os.getenv('GEO_CACHE_TTL', 86400))
+app.config['GEO_NEGATIVE_TTL'] = int(os.getenv('GEO_NEGATIVE_TTL', 300))
+app.config['GEO_CACHE_PATH'] = os.getenv('GEO_CACHE_PATH', os.path.join(app.instance_path, 'geolocation.json'))
+# Offline IP-range CSV consulted before ip-api.com; the HTTP fallback can be switched off
+app.config['GEO_DATABASE_PATH'] = os.getenv('GEO_DATABASE_PATH', '')
+app.config['GEO_HTTP_FALLBACK'] = os.getenv('GEO_HTTP_FALLBACK', 'true').lower() in ('1', 'true', 'yes')
+geolocator = GeoLocator(app)
+atexit.register(geolocator.save)
+
+storage = create_storage(app.config)
+atexit.register(storage.close)
+
+# Locations resolved while listing attempts are written back to
+# LOGIN_ATTEMPTS.LOCATION in the background so later reads skip the lookup
+app.config['ATTEMPT_LOCATION_BACKFILL'] = os.getenv('ATTEMPT_LOCATION_BACKFILL', 'true').lower() in ('1', 'true', 'yes')
+location_backfiller = LocationBackfiller(storage.set_attempt_locations)
+
+# Failed-login recording: 'sync' writes each failure in the same call that
+# fetches the password hash (LOGIN_LOOKUP on HANA), 'buffered' batches rows through the write-behind recorder
+app.config['LOGIN_ATTEMPT_DURABILITY'] = os.getenv('LOGIN_ATTEMPT_DURABILITY', 'sync').lower()
+app.config['LOGIN_ATTEMPT_BUFFER_SIZE'] = int(os.getenv('LOGIN_ATTEMPT_BUFFER_SIZE', 10000))
+app.config['LOGIN_ATTEMPT_FLUSH_SIZE'] = int(os.getenv('LOGIN_ATTEMPT_FLUSH_SIZE', 500))
+app.config['LOGIN_ATTEMPT_FLUSH_INTERVAL'] = float(os.getenv('LOGIN_ATTEMPT_FLUSH_INTERVAL', 1.0))
+
+attempt_recorder = LoginAttemptRecorder(
+    storage.record_attempts,
+    max_buffer=app.config['LOGIN_ATTEMPT_BUFFER_SIZE'],
+    flush_size=app.config['LOGIN_ATTEMPT_FLUSH_SIZE'],
+    flush_interval=app.config['LOGIN_ATTEMPT_FLUSH_INTERVAL']
+)
+if app.config['LOGIN_ATTEMPT_DURABILITY'] == 'buffered':
+    attempt_recorder.start()
+    atexit.register(attempt_recorder.stop)
+
+# Retention: raw LOGIN_ATTEMPTS older than this many days are folded into
+# hourly rollups by a background job (0 disables it)
+app.config['ATTEMPT_RETENTION_DAYS'] = int(os.getenv('ATTEMPT_RETENTION_DAYS', 90))
+app.config['ATTEMPT_MAINTENANCE_INTERVAL'] = int(os.getenv('ATTEMPT_MAINTENANCE_INTERVAL', 3600))
+app.config['ATTEMPT_MAINTENANCE_BATCH'] = int(os.getenv('ATTEMPT_MAINTENANCE_BATCH', 1000))
+
+# Cold archive: aged attempts and SecurityAlert rows are exported to
+# compressed columnar files here before deletion (empty disables it)
+app.config['ARCHIVE_PATH'] = os.getenv('ARCHIVE_PATH', os.path.join(app.instance_path, 'archive'))
+app.config['ALERT_RETENTION_DAYS'] = int(os.getenv('ALERT_RETENTION_DAYS', 90))
+
+cold_archive = ColdArchive(app.config['ARCHIVE_PATH']) if app.config['ARCHIVE_PATH'] else None
+
+def archive_old_alerts(cutoff, batch_size):
+    with app.app_context():
+        return archive_security_alerts(cold_archive, cutoff, batch_size)
+
+attempt_maintenance = AttemptMaintenance(
+    storage,
+    app.config['ATTEMPT_RETENTION_DAYS'],
+    batch_size=app.config['ATTEMPT_MAINTENANCE_BATCH'],
+    interval=app.config['ATTEMPT_MAINTENANCE_INTERVAL'],
+    archive=cold_archive,
+    archive_alerts=archive_old_alerts if cold_archive else None,
+    alert_retention_days=app.config['ALERT_RETENTION_DAYS']
+)
 
 def init_db():
-    with app.app_context():
-        try:
-            # Test database connection and create tables if needed
-            if test_db_connection():
-                print("Database initialization successful")
-                # Create LOGIN_ATTEMPTS table if it doesn't exist
-                conn = get_db_connection()
-                if conn:
-                    cursor = conn.cursor()
-                    try:
-                        # First check if table exists
-                        cursor.execute("""
-                            SELECT COUNT(*) FROM TABLES 
-                            WHERE TABLE_NAME = 'LOGIN_ATTEMPTS'
-                        """)
-                        table_exists = cursor.fetchone()[0] > 0
-
-                        if not table_exists:
-                            cursor.execute("""
-                                CREATE TABLE LOGIN_ATTEMPTS (
-                                    ID INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
-                                    USERNAME NVARCHAR(100) NOT NULL,
-                                    SUCCESS BOOLEAN NOT NULL,
-                                    IP_ADDRESS NVARCHAR(45),
-                                    TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                                )
-                            """)
-                            conn.commit()
-                            print("LOGIN_ATTEMPTS table created successfully")
-                    except Exception as e:
-                        print(f"Error creating LOGIN_ATTEMPTS table: {str(e)}")
-                    finally:
-                        cursor.close()
-                        conn.close()
-            else:
-                print("Database initialization failed")
-        except Exception as e:
-            print(f"Database initialization error: {str(e)}")
+    """Bring the database schema up to date"""
+    try:
+        version = storage.migrate()
+        print(f"Database schema is at version {version}")
+    except Exception as e:
+        print(f"Database initialization error: {str(e)}")
 
 @app.route('/api/login', methods=['POST', 'OPTIONS'])
 @app.route('/api/auth/login', methods=['POST', 'OPTIONS'])
+@limiter.limit('login', username_field='username')
 def login():
     # Handle CORS preflight request
     if request.method == 'OPTIONS':
@@ -187,76 +286,85 @@ def login():
         print("Missing credentials")
         return jsonify({'error': 'Missing credentials'}), 400
     
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            # Get user from database
-            cursor.execute('SELECT USERNAME, PASSWORD, EMAIL FROM USERS WHERE USERNAME = ?', (username,))
-            user = cursor.fetchone()
-            
-            if user:
-                stored_username = user[0]
-                stored_password = user[1]
-                stored_email = user[2]
-                
-                print("Credential comparison:")
-                print(f"Stored username: {stored_username}")
-                print(f"Input username: {username}")
-                print(f"Stored password: {stored_password}")
-                print(f"Input password: {password}")
-                
-                if stored_password == password:
-                    print("Login successful - Passwords match")
-                    access_token = create_access_token(identity=username)
-                    response = jsonify({
-                        'token': access_token,
-                        'email': stored_email,
-                        'message': 'Login successful'
-                    })
-                    return response, 200
-                else:
-                    print("Login failed - Password mismatch")
-                    # Get failed attempts count
-                    cursor.execute('SELECT COUNT(*) FROM LOGIN_ATTEMPTS WHERE USERNAME = ? AND SUCCESS = FALSE', (username,))
-                    failed_attempts = cursor.fetchone()[0]
-                    remaining_attempts = 3 - failed_attempts
-                    
-                    # Record failed attempt
-                    cursor.execute('INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS) VALUES (?, FALSE, ?)',
-                                 (username, request.remote_addr))
-                    conn.commit()
-                    
-                    if remaining_attempts <= 0:
-                        # Send security alert
-                        send_security_alert(username, request.remote_addr, capture_screenshot())
-                        return jsonify({
-                            'error': 'Account locked due to too many failed attempts',
-                            'message': 'Account locked. A security alert has been sent.',
-                            'remaining_attempts': 0
-                        }), 429
-                    
-                    return jsonify({
-                        'error': 'Invalid credentials',
-                        'message': 'Password is incorrect',
-                        'remaining_attempts': remaining_attempts,
-                        'is_last_attempt': remaining_attempts == 1
-                    }), 401
+    ip_address = request.remote_addr
+    if lockout.is_locked(username, ip_address):
+        print(f"Login rejected - {username} / {ip_address} is locked out")
+        return jsonify({
+            'error': 'Account locked due to too many failed attempts',
+            'message': 'Account locked. Please try again later.',
+            'remaining_attempts': 0
+        }), 429
+
+    buffered = app.config['LOGIN_ATTEMPT_DURABILITY'] == 'buffered'
+    try:
+        # Unless buffered, a failed attempt is recorded by the same call that fetches the hash
+        status, stored_email = authenticate(storage, verifier, username, password, ip_address,
+                                            record=not buffered)
+    except VerifierBusy as e:
+        print("Login deferred - credential verifier saturated")
+        return verifier_busy_response(e)
+    except Exception as e:
+        print(f"Login error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
+    if status == LOGIN_OK:
+        print("Login successful - Passwords match")
+        lockout.reset(username)
+        access_token = create_access_token(identity=username)
+        response = jsonify({
+            'token': access_token,
+            'email': stored_email,
+            'message': 'Login successful'
+        })
+        return response, 200
+    elif status == LOGIN_BAD_PASSWORD:
+        print("Login failed - Password mismatch")
+        if buffered:
+            attempt_recorder.record(username, False, ip_address)
+        remaining_attempts = lockout.record_failure(username, ip_address)
+
+        if remaining_attempts <= 0:
+            # Send security alert; repeats within the coalescing window only feed the digest
+            alert_sent = alert_coalescer.admit(stored_email, 'AppSec', ip_address)
+            if alert_sent:
+                send_security_alert(username, 'AppSec', ip_address, screenshot_data=capture_screenshot(),
+                                    user_email=stored_email)
+                message = 'Account locked. A security alert has been sent.'
             else:
-                print(f"Login failed - No user found with username: {username}")
-                return jsonify({
-                    'error': 'Invalid credentials',
-                    'message': 'Username not found'
-                }), 401
-        except Exception as e:
-            print(f"Login error: {str(e)}")
-            return jsonify({'error': str(e)}), 500
-        finally:
-            cursor.close()
-            conn.close()
-    return jsonify({'error': 'Database connection failed'}), 500
+                message = ('Account locked. A security alert was sent recently; '
+                           'this attempt will be included in the next alert digest.')
+            return jsonify({
+                'error': 'Account locked due to too many failed attempts',
+                'message': message,
+                'alert_sent': alert_sent,
+                'remaining_attempts': 0
+            }), 429
+        
+        return jsonify({
+            'error': 'Invalid credentials',
+            'message': 'Password is incorrect',
+            'remaining_attempts': remaining_attempts,
+            'is_last_attempt': remaining_attempts == 1
+        }), 401
+    else:
+        print(f"Login failed - No user found with username: {username}")
+        # Unknown usernames only count against the client IP
+        lockout.record_failure(None, ip_address)
+        return jsonify({
+            'error': 'Invalid credentials',
+            'message': 'Username not found'
+        }), 401
+
+def verifier_busy_response(error):
+    response = jsonify({
+        'error': 'Server busy',
+        'message': 'Too many logins in progress. Please try again shortly.'
+    })
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
 
 @app.route('/api/register', methods=['POST', 'OPTIONS'])
+@limiter.limit('register', username_field='username')
 def register():
     # Handle CORS preflight request
     if request.method == 'OPTIONS':
@@ -279,158 +387,131 @@ def register():
         print("Missing required fields")
         return jsonify({'error': 'Missing required fields'}), 400
     
-    conn = get_db_connection()
-    if conn:
-        cursor = conn.cursor()
-        try:
-            # Check if username exists
-            cursor.execute('SELECT USERNAME FROM USERS WHERE USERNAME = ?', (username,))
-            if cursor.fetchone():
-                print(f"Username already exists: {username}")
-                return jsonify({'error': 'Username already exists'}), 400
-            
-            # Insert new user
-            cursor.execute(
-                'INSERT INTO USERS (USERNAME, PASSWORD, EMAIL) VALUES (?, ?, ?)',
-                (username, password, email)
-            )
-            conn.commit()
-            print(f"Registration successful for user: {username}")
-            print(f"Stored credentials - Username: {username}, Password: {password}")
-            return jsonify({'message': 'Registration successful'}), 201
-        except Exception as e:
-            print(f"Registration error: {str(e)}")
-            conn.rollback()
-            return jsonify({'error': str(e)}), 500
-        finally:
-            cursor.close()
-            conn.close()
-    return jsonify({'error': 'Database connection failed'}), 500
-
-def capture_screenshot():
     try:
-        # Take full screen screenshot
-        screenshot = pyautogui.screenshot(region=(0, 0, pyautogui.size().width, pyautogui.size().height))
-        # Convert to bytes
-        buffered = BytesIO()
-        screenshot.save(buffered, format="PNG", quality=95)  # Increased quality
-        screenshot_bytes = buffered.getvalue()
-        return base64.b64encode(screenshot_bytes).decode()
+        # The primary key rejects duplicates, so no separate existence check is needed
+        if not storage.create_user(username, verifier.hash(password), email):
+            print(f"Username already exists: {username}")
+            return jsonify({'error': 'Username already exists'}), 400
+        print(f"Registration successful for user: {username}")
+        return jsonify({'message': 'Registration successful'}), 201
+    except VerifierBusy as e:
+        return verifier_busy_response(e)
     except Exception as e:
-        print(f"Screenshot error: {str(e)}")
-        return None
+        print(f"Registration error: {str(e)}")
+        return jsonify({'error': str(e)}), 500
 
-def capture_camera_image():
-    try:
-        # Initialize camera
-        cap = cv2.VideoCapture(0)
-        if not cap.isOpened():
-            print("Error: Could not open camera")
-            return None
-
-        # Capture frame
-        ret, frame = cap.read()
-        if not ret:
-            print("Error: Could not capture frame")
-            return None
-
-        # Release camera
-        cap.release()
-
-        # Convert frame to bytes
-        _, buffer = cv2.imencode('.jpg', frame)
-        return base64.b64encode(buffer).decode()
-    except Exception as e:
-        print(f"Camera capture error: {str(e)}")
-        return None
+def capture_screenshot(pid=None, window=None):
+    return screen_capture.capture(pid, window)
 
-def get_ip_location(ip_address):
-    try:
-        response = requests.get(f'http://ip-api.com/json/{ip_address}')
-        data = response.json()
-        if data['status'] == 'success':
-            return {
-                'city': data.get('city', 'Unknown'),
-                'state': data.get('regionName', 'Unknown'),
-                'country': data.get('country', 'Unknown'),
-                'isp': data.get('isp', 'Unknown')
-            }
-    except Exception as e:
-        print(f"Error getting IP location: {str(e)}")
-    return None
+def capture_camera_image(at=None):
+    return camera_capture.capture(at)
 
-def send_security_alert(username, app_name, ip_address, location, screenshot_data=None, camera_image=None):
-    """Send security alert email with all collected data"""
+def send_security_alert(username, app_name, ip_address, location=None, screenshot_data=None, camera_image=None,
+                        user_email=None):
+    """Queue a security alert email for ``username`` (or the logged-in user) with all collected data.
+
+    screenshot_data and camera_image are Evidence objects (or None); their
+    bytes go to the queue as they are.
+    """
     try:
-        # Get current user's email from database
-        current_user = get_jwt_identity()
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT EMAIL FROM USERS WHERE USERNAME = ?', (current_user,))
-            result = cursor.fetchone()
-            user_email = result[0] if result else None
-            cursor.close()
-            conn.close()
-
-            if user_email:
-                print(f"Preparing to send security alert to {user_email}")
-                msg = Message(
-                    subject='Security Alert: Unauthorized Access Attempt',
-                    sender=app.config['MAIL_USERNAME'],
-                    recipients=[user_email]
-                )
+        if not user_email:
+            result = storage.get_user(username or get_jwt_identity())
+            user_email = result[2] if result else None
+
+        if user_email:
+            job_id = alert_queue.enqueue('security_alert', {
+                'recipient': user_email,
+                'app_name': app_name,
+                'ip_address': ip_address,
+                'location': location,
+                'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }, evidence=[item for item in (screenshot_data, camera_image) if item is not None])
+            print(f"Queued security alert {job_id} for {user_email}")
+            return True
+        else:
+            print(f"No email found for user")
+            return False
 
-                # Create HTML email body with more detailed information
-                msg.html = f"""
-                <h2>Security Alert: Unauthorized Access Attempt</h2>
-                <p>Multiple failed login attempts have been detected for a monitored application.</p>
-                <ul>
-                    <li><strong>Application:</strong> {app_name}</li>
-                    <li><strong>IP Address:</strong> {ip_address}</li>
-                    <li><strong>Location:</strong> {location['city']}, {location['region']}, {location['country']}</li>
-                    <li><strong>Time:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ({location['timezone']})</li>
-                </ul>
-                <p style="color: red;"><strong>Action Required:</strong> Please review your application's security settings and take appropriate action.</p>
-                <p>If this was not you, someone may be attempting to access your applications without authorization.</p>
-                """
-
-                # Attach screenshot if available
-                if screenshot_data:
-                    try:
-                        # Convert base64 to image
-                        if ',' in screenshot_data:
-                            screenshot_data = screenshot_data.split(',')[1]  # Remove data URL prefix
-                        screenshot_bytes = base64.b64decode(screenshot_data)
-                        msg.attach('screenshot.png', 'image/png', screenshot_bytes)
-                        print("Screenshot attached to email")
-                    except Exception as e:
-                        print(f"Error attaching screenshot: {str(e)}")
+    except Exception as e:
+        print(f"Error queueing security alert: {str(e)}")
+        return False
 
-                # Attach camera image if available
-                if camera_image:
-                    try:
-                        # Convert base64 to image
-                        if ',' in camera_image:
-                            camera_data = camera_image.split(',')[1]  # Remove data URL prefix
-                        camera_bytes = base64.b64decode(camera_data)
-                        msg.attach('intruder.jpg', 'image/jpeg', camera_bytes)
-                        print("Camera image attached to email")
-                    except Exception as e:
-                        print(f"Error attaching camera image: {str(e)}")
+def deliver_security_alert(alert):
+    """Alert-queue handler that builds and sends the security alert email"""
+    location = alert['location'] or get_location(alert['ip_address'])
+    msg = EmailMessage()
+    msg['Subject'] = 'Security Alert: Unauthorized Access Attempt'
+    msg['From'] = app.config['MAIL_DEFAULT_SENDER']
+    msg['To'] = alert['recipient']
+
+    # Create HTML email body with more detailed information
+    msg.set_content(f"""
+    <h2>Security Alert: Unauthorized Access Attempt</h2>
+    <p>Multiple failed login attempts have been detected for a monitored application.</p>
+    <ul>
+        <li><strong>Application:</strong> {alert['app_name']}</li>
+        <li><strong>IP Address:</strong> {alert['ip_address']}</li>
+        <li><strong>Location:</strong> {location['city']}, {location['region']}, {location['country']}</li>
+        <li><strong>Time:</strong> {alert['time']} ({location['timezone']})</li>
+    </ul>
+    <p style="color: red;"><strong>Action Required:</strong> Please review your application's security settings and take appropriate action.</p>
+    <p>If this was not you, someone may be attempting to access your applications without authorization.</p>
+    """, subtype='html')
+
+    # Attach screenshot and camera image if available; jobs queued before
+    # evidence was stored as BLOBs still carry base64 in the payload
+    evidence = alert['evidence'] + [
+        Evidence.from_data_url(alert.get(key), mime_type, filename)
+        for key, mime_type, filename in (('screenshot', 'image/png', 'screenshot.png'),
+                                         ('camera_image', 'image/jpeg', 'intruder.jpg'))
+        if alert.get(key)
+    ]
+    for item in evidence:
+        if item:
+            item.attach_to(msg)
 
-                # Send email
-                with app.app_context():
-                    mail.send(msg)
-                print(f"Security alert successfully sent to {user_email}")
-                return True
-            else:
-                print(f"No email found for user")
-                return False
+    try:
+        smtp_sessions.send(msg)
+    except Exception as e:
+        # 5xx replies (bad recipient, rejected auth) will not succeed on retry
+        if is_permanent(e):
+            raise PermanentAlertError(str(e)) from e
+        raise
+    print(f"Security alert successfully sent to {alert['recipient']}")
+
+alert_queue.register('security_alert', deliver_security_alert)
+
+def deliver_security_digest(digest):
+    """Alert-queue handler for the summary of alerts folded by the coalescer"""
+    msg = EmailMessage()
+    msg['Subject'] = f"Security Alert Digest: {digest['count']} more attempts on {digest['app_name']}"
+    msg['From'] = app.config['MAIL_DEFAULT_SENDER']
+    msg['To'] = digest['recipient']
+
+    rows = ''.join(f"<li>{ip}: {count}</li>" for ip, count in digest['ips'])
+    if digest['other_ips']:
+        rows += f"<li>and {digest['other_ips']} other addresses</li>"
+    msg.set_content(f"""
+    <h2>Security Alert Digest</h2>
+    <p>Failed login attempts continued after the last alert for a monitored application.</p>
+    <ul>
+        <li><strong>Application:</strong> {digest['app_name']}</li>
+        <li><strong>Further lockouts:</strong> {digest['count']}</li>
+        <li><strong>Between:</strong> {digest['first']} and {digest['last']}</li>
+    </ul>
+    <p><strong>Source addresses:</strong></p>
+    <ul>{rows}</ul>
+    <p style="color: red;"><strong>Action Required:</strong> Please review your application's security settings and take appropriate action.</p>
+    """, subtype='html')
 
+    try:
+        smtp_sessions.send(msg)
     except Exception as e:
-        print(f"Error sending security alert: {str(e)}")
-        return False
+        if is_permanent(e):
+            raise PermanentAlertError(str(e)) from e
+        raise
+
+alert_queue.register('alert_digest', deliver_security_digest)
 
 @app.route('/api/protected', methods=['GET'])
 @jwt_required()
@@ -448,6 +529,7 @@ def start_monitoring():
             return jsonify({'error': 'No process names provided'}), 400
             
         monitoring_service.start_monitoring(process_names)
+        camera_service.acquire('process-monitor')
         return jsonify({'message': 'Monitoring started successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -456,6 +538,7 @@ def start_monitoring():
 def stop_monitoring():
     try:
         monitoring_service.stop_monitoring()
+        camera_service.release('process-monitor')
         return jsonify({'message': 'Monitoring stopped successfully'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -473,7 +556,7 @@ class WindowsAppMonitor:
         self.monitored_apps = []
         self.monitoring_thread = None
         self.should_stop = False
-        self.max_login_attempts = 3
+        self.max_login_attempts = app.config['LOCKOUT_THRESHOLD']
         self.login_attempts = {}
         self.lock = threading.Lock()
         self.redirect_url = "http://localhost:3000/login"
@@ -582,74 +665,114 @@ class WindowsAppMonitor:
 
     def handle_login_attempt(self, app_name, username, password):
         """Handle login attempt with user credentials"""
+        attempted_at = time.time()
+        current_user = get_jwt_identity()
+
+        # Nothing to resume or count: skip the password hash entirely
         with self.lock:
-            # Find the suspended process for this app
-            for pid, data in list(self.suspended_processes.items()):
-                if data['app_name'].lower() == app_name.lower():
-                    # Get current logged in user's email
-                    current_user = get_jwt_identity()
-                    conn = get_db_connection()
-                    if conn:
-                        cursor = conn.cursor()
+            if not self._has_suspended(app_name):
+                return False, "No suspended process found for this app"
+
+        # Look the users up and check the password off the monitor lock so slow work never blocks the monitor loop
+        try:
+            # Get current logged in user's email
+            current_user_result = storage.get_user(current_user)
+            current_user_email = current_user_result[2] if current_user_result else None
+
+            # Uncached USERS read, like login(), so a password changed elsewhere applies at once
+            status, _ = authenticate(storage, verifier, username, password)
+            valid = status == LOGIN_OK
+        except VerifierBusy:
+            return False, "Credential verification busy, please retry"
+        except Exception as e:
+            print(f"Error verifying credentials: {str(e)}")
+            return False, "Error verifying credentials"
+
+        with self.lock:
+            ok, message, locked_out = self._resolve_suspended(app_name, valid)
+        if not locked_out:
+            return ok, message
+
+        # Out of attempts. Captures and the alert happen after the monitor lock is
+        # released, and the screenshot is taken before terminating so the app's window still exists
+        send_alert = False
+        if not current_user_email:
+            print("No logged in user email found for security alert")
+        elif alert_coalescer.admit(current_user_email, app_name, request.remote_addr):
+            send_alert = True
+        else:
+            print(f"Security alert for {app_name} folded into the digest for {current_user_email}")
+        process = locked_out['process']
+        screenshot_data = capture_screenshot(pid=process.pid) if send_alert else None
+        if not self._terminate(app_name, process.pid, locked_out):
+            message = "Error terminating process"
+        if send_alert:
+            print(f"Sending security alert to logged in user: {current_user} ({current_user_email})")
+            self._send_security_alert(app_name, process.info['name'], current_user_email, screenshot_data,
+                                      attempted_at)
+        return ok, message
+
+    def _has_suspended(self, app_name):
+        """True if a process for app_name is waiting on a login; caller holds self.lock"""
+        return any(data['app_name'].lower() == app_name.lower() and not data.get('locked_out')
+                   for data in self.suspended_processes.values())
+
+    def _resolve_suspended(self, app_name, valid):
+        """Resume or count a failure against the suspended process; caller holds self.lock.
+
+        Returns (ok, message, locked_out). locked_out is the process's entry once
+        it has used up its attempts; it is marked so no other login picks it,
+        and the caller must _terminate it.
+        """
+        # Find the suspended process for this app
+        for pid, data in list(self.suspended_processes.items()):
+            if data['app_name'].lower() == app_name.lower() and not data.get('locked_out'):
+                try:
+                    if valid:
                         try:
-                            # Get current logged in user's email
-                            cursor.execute('SELECT EMAIL FROM USERS WHERE USERNAME = ?', (current_user,))
-                            current_user_result = cursor.fetchone()
-                            current_user_email = current_user_result[0] if current_user_result else None
-
-                            # Query the USERS table in HANA for login validation
-                            cursor.execute('SELECT PASSWORD FROM USERS WHERE USERNAME = ?', (username,))
-                            result = cursor.fetchone()
-
-                            if result and result[0] == password:  # In production, use proper password hashing
-                                try:
-                                    # Resume the process
-                                    data['process'].resume()
-                                    print(f"Resumed {app_name} after successful login")
-                                    # Add to successfully logged in processes
-                                    self.successfully_logged_in.add(pid)
-                                    # Remove from suspended processes
-                                    del self.suspended_processes[pid]
-                                    self.blocked_pids.remove(pid)
-                                    # Remove from notification sent
-                                    self.notification_sent.discard(pid)
-                                    return True, "Login successful"
-                                except Exception as e:
-                                    print(f"Error resuming process: {str(e)}")
-                                    return False, "Error resuming process"
-                            else:
-                                data['login_attempts'] += 1
-                                print(f"Login attempt {data['login_attempts']} failed for {app_name}")
-                                
-                                if data['login_attempts'] >= self.max_login_attempts:
-                                    try:
-                                        # Terminate the process
-                                        data['process'].terminate()
-                                        print(f"Terminated {app_name} due to max login attempts")
-                                        # Remove from suspended processes
-                                        del self.suspended_processes[pid]
-                                        self.blocked_pids.remove(pid)
-                                        # Remove from notification sent
-                                        self.notification_sent.discard(pid)
-                                        # Send security alert to current logged in user's email
-                                        if current_user_email:
-                                            print(f"Sending security alert to logged in user: {current_user} ({current_user_email})")
-                                            self._send_security_alert(app_name, data['process'].info['name'], current_user_email)
-                                        else:
-                                            print("No logged in user email found for security alert")
-                                        return False, "Max login attempts exceeded"
-                                    except Exception as e:
-                                        print(f"Error terminating process: {str(e)}")
-                                        return False, "Error terminating process"
-                                return False, f"Invalid credentials. Attempts remaining: {self.max_login_attempts - data['login_attempts']}"
+                            # Resume the process
+                            data['process'].resume()
+                            print(f"Resumed {app_name} after successful login")
+                            # Add to successfully logged in processes
+                            self.successfully_logged_in.add(pid)
+                            # Remove from suspended processes
+                            del self.suspended_processes[pid]
+                            self.blocked_pids.remove(pid)
+                            # Remove from notification sent
+                            self.notification_sent.discard(pid)
+                            return True, "Login successful", None
                         except Exception as e:
-                            print(f"Error verifying credentials: {str(e)}")
-                            return False, "Error verifying credentials"
-                        finally:
-                            cursor.close()
-                            conn.close()
-                    return False, "Database connection failed"
-            return False, "No suspended process found for this app"
+                            print(f"Error resuming process: {str(e)}")
+                            return False, "Error resuming process", None
+                    else:
+                        data['login_attempts'] += 1
+                        print(f"Login attempt {data['login_attempts']} failed for {app_name}")
+
+                        if data['login_attempts'] >= self.max_login_attempts:
+                            data['locked_out'] = True
+                            return False, "Max login attempts exceeded", data
+                        return False, f"Invalid credentials. Attempts remaining: {self.max_login_attempts - data['login_attempts']}", None
+                except Exception as e:
+                    print(f"Error verifying credentials: {str(e)}")
+                    return False, "Error verifying credentials", None
+        return False, "No suspended process found for this app", None
+
+    def _terminate(self, app_name, pid, data):
+        """Terminate a locked-out process and stop tracking it; False if it could not be terminated"""
+        try:
+            data['process'].terminate()
+            print(f"Terminated {app_name} due to max login attempts")
+        except Exception as e:
+            print(f"Error terminating process: {str(e)}")
+            with self.lock:
+                # Still suspended: the next failed login retries the termination
+                data['locked_out'] = False
+            return False
+        with self.lock:
+            self.suspended_processes.pop(pid, None)
+            self.blocked_pids.discard(pid)
+            self.notification_sent.discard(pid)
+        return True
 
     def add_app(self, app_name, process_name):
         """Add an application to monitor"""
@@ -718,30 +841,29 @@ class WindowsAppMonitor:
         except Exception as e:
             print(f"Error handling app launch: {str(e)}")
 
-    def _send_security_alert(self, app_name, process_name, user_email):
-        """Send security alert for failed login attempts"""
+    def _send_security_alert(self, app_name, process_name, user_email, screenshot_data, attempted_at=None):
+        """Queue a security alert; ``screenshot_data`` is the app's window, grabbed before it was terminated"""
         try:
             print(f"Preparing security alert for {app_name} to {user_email}")
-            # Get screenshot
-            screenshot_data = capture_screenshot()
-            
-            # Get camera image
-            camera_data = capture_camera_image()
+
+            # Get camera image, from the moment of the attempt if the camera service is warm
+            camera_data = capture_camera_image(attempted_at)
             
             # Get IP address
-            ip_address = request.remote_addr if request.remote_addr != '127.0.0.1' else requests.get('https://api.ipify.org?format=json').json()['ip']
+            ip_address = request.remote_addr if request.remote_addr != '127.0.0.1' else get_public_ip()
             
-            # Send the alert using the main send_security_alert function
+            # Queue the alert through the main send_security_alert function;
+            # the location is resolved by the alert worker
             send_security_alert(
                 username=None,  # We don't need username as we have direct email
                 app_name=app_name,
                 ip_address=ip_address,
-                location=get_location(ip_address),
                 screenshot_data=screenshot_data,
-                camera_image=camera_data
+                camera_image=camera_data,
+                user_email=user_email
             )
-            
-            print(f"Security alert sent successfully to {user_email}")
+
+            print(f"Security alert queued for {user_email}")
             
         except Exception as e:
             print(f"Error sending security alert: {str(e)}")
@@ -755,6 +877,7 @@ class WindowsAppMonitor:
             self.monitoring_thread = threading.Thread(target=self._monitor_loop)
             self.monitoring_thread.daemon = True
             self.monitoring_thread.start()
+            camera_service.acquire('windows-monitor')
             print("Windows app monitoring started")
             return True
         return False
@@ -764,6 +887,7 @@ class WindowsAppMonitor:
         print("Attempting to stop monitoring...")
         self.should_stop = True
         self.is_running = False
+        camera_service.release('windows-monitor')
         if self.monitoring_thread and self.monitoring_thread.is_alive():
             self.monitoring_thread.join()
             print("Windows app monitoring stopped")
@@ -918,8 +1042,9 @@ def handle_login_failed():
     try:
         data = request.get_json()
         app_name = data.get('app_name')
-        screenshot = data.get('screenshot')
-        camera_image = data.get('camera_image')
+        # Base64 data URLs are decoded once here, at the JSON boundary
+        screenshot = Evidence.from_data_url(data.get('screenshot'), 'image/png', 'screenshot.png')
+        camera_image = Evidence.from_data_url(data.get('camera_image'), 'image/jpeg', 'intruder.jpg')
         max_attempts_reached = data.get('max_attempts_reached', False)
 
         if not app_name:
@@ -928,41 +1053,40 @@ def handle_login_failed():
         if max_attempts_reached:
             # Get current logged in user's email
             current_user = get_jwt_identity()
-            conn = get_db_connection()
-            if conn:
-                cursor = conn.cursor()
-                try:
-                    cursor.execute('SELECT EMAIL FROM USERS WHERE USERNAME = ?', (current_user,))
-                    result = cursor.fetchone()
-                    if result:
-                        user_email = result[0]
-                        print(f"Sending security alert to logged in user: {current_user} ({user_email})")
-                        
-                        # Get IP address
-                        ip_address = request.remote_addr if request.remote_addr != '127.0.0.1' else requests.get('https://api.ipify.org?format=json').json()['ip']
-                        
-                        # Send security alert
-                        send_security_alert(
-                            username=current_user,  # Pass the logged in username
-                            app_name=app_name,
-                            ip_address=ip_address,
-                            location=get_location(ip_address),
-                            screenshot_data=screenshot,
-                            camera_image=camera_image
-                        )
-                        
-                        return jsonify({
-                            'message': 'Security alert sent',
-                            'details': 'Account locked due to multiple failed attempts'
-                        })
-                    else:
-                        print(f"No email found for logged in user: {current_user}")
-                        return jsonify({'error': 'Could not find user email'}), 500
-                finally:
-                    cursor.close()
-                    conn.close()
+            result = storage.get_user(current_user)
+
+            if result:
+                user_email = result[2]
+
+                # Repeats within the coalescing window only feed the digest
+                if not alert_coalescer.admit(user_email, app_name, request.remote_addr):
+                    return jsonify({
+                        'message': 'Security alert added to digest',
+                        'details': 'Account locked due to multiple failed attempts'
+                    })
+
+                print(f"Sending security alert to logged in user: {current_user} ({user_email})")
+                
+                # Get IP address
+                ip_address = request.remote_addr if request.remote_addr != '127.0.0.1' else get_public_ip()
+                
+                # Send security alert
+                send_security_alert(
+                    username=current_user,  # Pass the logged in username
+                    app_name=app_name,
+                    ip_address=ip_address,
+                    screenshot_data=screenshot,
+                    camera_image=camera_image,
+                    user_email=user_email
+                )
+                
+                return jsonify({
+                    'message': 'Security alert sent',
+                    'details': 'Account locked due to multiple failed attempts'
+                })
             else:
-                return jsonify({'error': 'Database connection failed'}), 500
+                print(f"No email found for logged in user: {current_user}")
+                return jsonify({'error': 'Could not find user email'}), 500
             
         return jsonify({'message': f'Login failure recorded for {app_name}'})
     except Exception as e:
@@ -971,27 +1095,11 @@ def handle_login_failed():
 
 def get_public_ip():
     """Get public IP address when running locally"""
-    try:
-        response = requests.get('https://api.ipify.org?format=json')
-        return response.json()['ip']
-    except:
-        return '127.0.0.1'
+    return http_client.public_ip()
 
 def get_location(ip_address):
     """Get location information from IP address"""
-    try:
-        response = requests.get(f'http://ip-api.com/json/{ip_address}')
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                'city': data.get('city', 'Unknown'),
-                'country': data.get('country', 'Unknown'),
-                'region': data.get('regionName', 'Unknown'),
-                'timezone': data.get('timezone', 'Unknown')
-            }
-    except:
-        pass
-    return {'city': 'Unknown', 'country': 'Unknown', 'region': 'Unknown', 'timezone': 'Unknown'}
+    return geolocator.locate(ip_address)
 
 @app.route('/api/monitor/running-apps', methods=['GET', 'OPTIONS'])
 @jwt_required()
@@ -1148,16 +1256,37 @@ def remove_windows_app(app_name):
 @app.route('/api/db/users', methods=['GET'])
 @jwt_required()
 def get_users():
-    """Get all users from HANA database"""
+    """Get a page of users, optionally filtered by username and/or email prefix.
+
+    Ordered by username, or by email when only ?email= is given. Pass the
+    returned next_cursor back as ?cursor= to fetch the following page.
+    """
     try:
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT USERNAME, EMAIL FROM USERS')
-            users = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            return jsonify([{'username': user[0], 'email': user[1]} for user in users])
+        page_size = parse_page_size(request.args.get('limit'),
+                                    app.config['API_PAGE_SIZE'], app.config['API_MAX_PAGE_SIZE'])
+        username = request.args.get('username') or None
+        email = request.args.get('email') or None
+        by_email = email and not username
+        cursor_token = request.args.get('cursor')
+        after = decode_cursor(cursor_token) if cursor_token else None
+        if after is not None and len(after) != (2 if by_email else 1):
+            raise ValueError('Invalid cursor')
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # One extra row tells us whether another page exists
+        users = storage.list_users(page_size + 1, username=username, email=email, after=after)
+        next_cursor = None
+        if len(users) > page_size:
+            users = users[:page_size]
+            last = users[-1]
+            next_cursor = encode_cursor(last[1], last[0]) if by_email else encode_cursor(last[0])
+
+        return jsonify({
+            'users': [{'username': user[0], 'email': user[1]} for user in users],
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         print(f"Error fetching users: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -1165,26 +1294,191 @@ def get_users():
 @app.route('/api/db/login-attempts', methods=['GET'])
 @jwt_required()
 def get_login_attempts():
-    """Get all login attempts from HANA database"""
+    """Get a page of login attempts from the database, newest first.
+
+    Filters: username, success, ip, since, until. Pass the returned
+    next_cursor back as ?cursor= to fetch the following page. Attempts past
+    the retention window come back as hourly rollups with rolled_up set
+    and attempts holding the count. location is resolved for the whole
+    page in one batched lookup and stored back for later reads.
+    """
     try:
-        conn = get_db_connection()
-        if conn:
-            cursor = conn.cursor()
-            cursor.execute('SELECT USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP FROM LOGIN_ATTEMPTS ORDER BY TIMESTAMP DESC')
-            attempts = cursor.fetchall()
-            cursor.close()
-            conn.close()
-            return jsonify([{
-                'username': attempt[0],
-                'success': attempt[1],
-                'ip_address': attempt[2],
-                'timestamp': attempt[3].isoformat() if attempt[3] else None
-            } for attempt in attempts])
+        page_size = parse_page_size(request.args.get('limit'),
+                                    app.config['API_PAGE_SIZE'], app.config['API_MAX_PAGE_SIZE'])
+        filters = {
+            'username': request.args.get('username') or None,
+            'success': parse_bool(request.args.get('success')),
+            'ip_address': request.args.get('ip') or None,
+            'since': parse_timestamp(request.args.get('since'), 'since'),
+            'until': parse_timestamp(request.args.get('until'), 'until'),
+        }
+
+        # Keyset pagination on (TIMESTAMP, ID) so deep pages cost the same as the first
+        cursor_token = request.args.get('cursor')
+        if cursor_token:
+            last_timestamp, last_id = decode_cursor(cursor_token)
+            filters['before'] = (parse_timestamp(last_timestamp, 'cursor'), int(last_id))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        # One extra row tells us whether another page exists
+        attempts = storage.list_attempts(page_size + 1, **filters)
+        next_cursor = None
+        if len(attempts) > page_size:
+            attempts = attempts[:page_size]
+            next_cursor = encode_cursor(attempts[-1][4], attempts[-1][0])
+
+        items = [{
+            'id': attempt[0],
+            'username': attempt[1],
+            'success': bool(attempt[2]),
+            'ip_address': attempt[3],
+            'timestamp': attempt[4].isoformat() if attempt[4] else None,
+            'attempts': attempt[5],
+            'location': attempt[6],
+            'rolled_up': attempt[0] < 0
+        } for attempt in attempts]
+        # Distinct addresses on the page are resolved in one batch
+        attach_locations(items, geolocator,
+                         location_backfiller if app.config['ATTEMPT_LOCATION_BACKFILL'] else None)
+
+        return jsonify({
+            'attempts': items,
+            'next_cursor': next_cursor
+        })
     except Exception as e:
         print(f"Error fetching login attempts: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
-if __name__ == '__main__':
+@app.route('/api/db/pool-stats', methods=['GET'])
+@jwt_required()
+def get_pool_stats():
+    """Get database connection pool occupancy and wait times, plus the failed-login write-behind buffer"""
+    return jsonify({**storage.stats(), 'attempt_recorder': {
+        'durability': app.config['LOGIN_ATTEMPT_DURABILITY'], **attempt_recorder.stats()}})
+
+@app.route('/api/auth/verifier-stats', methods=['GET'])
+@jwt_required()
+def get_verifier_stats():
+    """Get credential-hashing queue depth, rejections and verify latency"""
+    return jsonify(verifier.stats())
+
+@app.route('/api/auth/rate-limit-stats', methods=['GET'])
+@jwt_required()
+def get_rate_limit_stats():
+    """Get admitted and rejected request counts for the login/register limiter"""
+    return jsonify(limiter.stats())
+
+@app.route('/api/monitor/alert-stats', methods=['GET'])
+@jwt_required()
+def get_alert_stats():
+    """Get alert queue depth, delivery latency, dead-letter, SMTP session, evidence encoding, camera and screenshot counts"""
+    return jsonify({**alert_queue.stats(), 'smtp': smtp_sessions.stats(),
+                    'coalescer': alert_coalescer.stats(), 'evidence': image_encoder.stats(),
+                    'camera': camera_service.stats(), 'screen': screen_capture.stats()})
+
+@app.route('/api/monitor/alerts/dead-letters', methods=['GET'])
+@jwt_required()
+def get_dead_letters():
+    """List alerts that could not be delivered"""
+    try:
+        limit = parse_page_size(request.args.get('limit'),
+                                app.config['API_PAGE_SIZE'], app.config['API_MAX_PAGE_SIZE'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'dead_letters': alert_queue.dead_letters(limit)})
+
+@app.route('/api/monitor/alerts/dead-letters/<int:job_id>/retry', methods=['POST'])
+@jwt_required()
+def retry_dead_letter(job_id):
+    """Put a dead-lettered alert back on the queue"""
+    if not alert_queue.requeue(job_id):
+        return jsonify({'error': 'No such dead letter'}), 404
+    return jsonify({'message': 'Alert requeued'})
+
+@app.route('/api/monitor/http-stats', methods=['GET'])
+@jwt_required()
+def get_http_stats():
+    """Get per-upstream call, retry and circuit-breaker counts"""
+    return jsonify(http_client.stats())
+
+@app.route('/api/db/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    """Get hit/miss counts for the in-process caches"""
+    return jsonify({**storage.cache_stats(), 'geolocation': geolocator.stats(),
+                    'location_backfill': location_backfiller.stats()})
+
+@app.route('/api/db/archive/<dataset>', methods=['GET'])
+@jwt_required()
+def query_archive(dataset):
+    """Query archived history (login_attempts or security_alerts), oldest first.
+
+    Filters: since, until, plus exact matches on any text column (e.g.
+    ?username=bob). ?columns=a,b limits which columns are read.
+    """
+    if cold_archive is None:
+        return jsonify({'error': 'Archive is disabled'}), 404
+    if dataset not in DATASETS:
+        return jsonify({'error': f'Unknown dataset: {dataset}'}), 404
+
+    try:
+        schema = dict(DATASETS[dataset][0])
+        columns = request.args.get('columns')
+        where = {column: value for column, value in request.args.items()
+                 if schema.get(column) == 'str'}
+        rows = list(cold_archive.query(
+            dataset,
+            columns=columns.split(',') if columns else None,
+            since=parse_timestamp(request.args.get('since'), 'since'),
+            until=parse_timestamp(request.args.get('until'), 'until'),
+            where=where,
+            limit=parse_page_size(request.args.get('limit'),
+                                  app.config['API_PAGE_SIZE'], app.config['API_MAX_PAGE_SIZE'])
+        ))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    for row in rows:
+        for column, value in row.items():
+            if isinstance(value, datetime):
+                row[column] = value.isoformat()
+    return jsonify({dataset: rows})
+
+_workers_lock = threading.Lock()
+_workers_started = False
+
+def start_background_workers():
+    """Migrate the schema, then start the alert, digest, backfill and maintenance threads; once per process.
+
+    Runs before the first request so `flask run` and WSGI servers drain the
+    alert queue too, while importing this module stays free of threads.
+    """
+    global _workers_started
+    with _workers_lock:
+        if _workers_started:
+            return
+        _workers_started = True
     print("\nInitializing database...")
     init_db()
+    if app.config['ATTEMPT_RETENTION_DAYS'] > 0:
+        attempt_maintenance.start()
+        atexit.register(attempt_maintenance.stop)
+    alert_queue.start()
+    alert_coalescer.start()
+    # atexit runs in reverse: the coalescer enqueues its last digests before the workers stop
+    atexit.register(alert_queue.stop)
+    atexit.register(alert_coalescer.stop)
+    if app.config['ATTEMPT_LOCATION_BACKFILL']:
+        location_backfiller.start()
+        atexit.register(location_backfiller.stop)
+
+@app.before_request
+def ensure_background_workers():
+    if not _workers_started:
+        start_background_workers()
+
+if __name__ == '__main__':
+    start_background_workers()
     app.run(debug=True) 
\ No newline at end of file
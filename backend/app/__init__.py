@@ -1,11 +1,34 @@
+import atexit
+import threading
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from config import Config
+from lockout import LockoutEngine
+from credentials import CredentialVerifier
+from ratelimit import RateLimiter
+from geolocation import GeoLocator
+from http_client import HttpClient
+from enrichment import LocationBackfiller
+from alert_queue import AlertQueue
+from mailer import SMTPSessionPool
+from alert_digest import AlertCoalescer
+from imaging import ImageEncoder
+from camera import CameraService
 
 db = SQLAlchemy()
 jwt = JWTManager()
+lockout = LockoutEngine()
+verifier = CredentialVerifier()
+limiter = RateLimiter()
+http_client = HttpClient()
+geolocator = GeoLocator()
+alert_queue = AlertQueue()
+smtp_sessions = SMTPSessionPool()
+alert_coalescer = AlertCoalescer()
+image_encoder = ImageEncoder()
+camera_service = CameraService()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -14,6 +37,16 @@ def create_app(config_class=Config):
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
+    lockout.init_app(app)
+    verifier.init_app(app)
+    limiter.init_app(app)
+    http_client.init_app(app)
+    geolocator.init_app(app)
+    alert_queue.init_app(app)
+    smtp_sessions.init_app(app)
+    alert_coalescer.init_app(app)
+    image_encoder.init_app(app)
+    camera_service.init_app(app)
     CORS(app)
 
     # Register blueprints
@@ -26,4 +59,45 @@ def create_app(config_class=Config):
     from app.applications import bp as applications_bp
     app.register_blueprint(applications_bp, url_prefix='/api/applications')
 
-    return app 
\ No newline at end of file
+    # Alert emails are sent by background workers, never in the request
+    from app.security import deliver_alert_digest, deliver_alert_email
+    alert_queue.register('alert_email', deliver_alert_email)
+    alert_queue.register('alert_digest', deliver_alert_digest)
+
+    # Workers start with the first request, so scripts such as init_db.py
+    # that only need an app context never start threads or open the camera
+    @app.before_request
+    def ensure_background_workers():
+        if not app.extensions.get('background_workers'):
+            start_background_workers(app)
+
+    return app
+
+
+_workers_lock = threading.Lock()
+
+
+def start_background_workers(app):
+    """Start the alert, digest and backfill threads and the warm camera; once per app"""
+    with _workers_lock:
+        if app.extensions.get('background_workers'):
+            return
+        app.extensions['background_workers'] = True
+    alert_queue.start()
+    alert_coalescer.start()
+    # atexit runs in reverse: the coalescer enqueues its last digests before the workers stop
+    atexit.register(alert_queue.stop)
+    atexit.register(alert_coalescer.stop)
+
+    # With CAMERA_SERVICE on, intruder images come from the warm camera's buffer;
+    # the app holds it for its whole life, so no other consumer's release stops it
+    camera_service.acquire('app')
+    atexit.register(camera_service.stop)
+
+    # Locations resolved while listing attempts are written back in the background
+    if app.config.get('ATTEMPT_LOCATION_BACKFILL'):
+        from app.models import LoginAttempt
+        backfiller = LocationBackfiller(LoginAttempt.backfill_locations, app)
+        backfiller.start()
+        atexit.register(backfiller.stop)
+        app.extensions['location_backfiller'] = backfiller
@@ -1,11 +1,23 @@
-from flask import Blueprint, request, jsonify
+import time
+from flask import Blueprint, current_app, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from app.models import User, db
-from app.security import capture_image, get_location, send_alert_email
+from app import alert_coalescer, limiter, lockout
+from credentials import VerifierBusy
+from enrichment import attach_locations
+from pagination import parse_page_size
+from app.models import LoginAttempt, User, db
+from app.security import capture_image, send_alert_email
 
 bp = Blueprint('auth', __name__)
 
+@bp.errorhandler(VerifierBusy)
+def verifier_busy(error):
+    response = jsonify({'error': 'Server busy. Please try again shortly.'})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 503
+
 @bp.route('/register', methods=['POST'])
+@limiter.limit('register', username_field='email')
 def register():
     data = request.get_json()
     
@@ -20,41 +32,44 @@ def register():
     return jsonify({'message': 'User registered successfully'}), 201
 
 @bp.route('/login', methods=['POST'])
+@limiter.limit('login', username_field='email')
 def login():
+    attempted_at = time.time()
     data = request.get_json()
+    ip_address = request.remote_addr
+    if lockout.is_locked(data['email'], ip_address):
+        return jsonify({'error': 'Account locked. Please try again later.'}), 429
+
     user = User.query.filter_by(email=data['email']).first()
     
     if not user or not user.check_password(data['password']):
-        # Record failed attempt
-        from app.models import LoginAttempt
+        # Record failed attempt; the location is resolved by the alert worker
+        # or backfilled the first time the attempt is listed
         attempt = LoginAttempt(
             user_id=user.id if user else None,
             success=False,
-            ip_address=request.remote_addr,
-            location=get_location(request.remote_addr)
+            ip_address=ip_address
         )
         db.session.add(attempt)
         db.session.commit()
         
-        # Check if max attempts reached
-        failed_attempts = LoginAttempt.query.filter_by(
-            user_id=user.id if user else None,
-            success=False
-        ).count()
+        # Check if max attempts reached within the lockout window
+        remaining_attempts = lockout.record_failure(user.email if user else None, ip_address)
         
-        if failed_attempts >= 3:
-            # Capture image and send alert
-            image_path = capture_image()
-            send_alert_email(user.email, image_path, attempt.location)
+        # Capture image and send alert; repeats within the coalescing window only feed the digest
+        if user and remaining_attempts <= 0 and alert_coalescer.admit(user.email, 'AppSec', ip_address):
+            image_path = capture_image(attempted_at)
+            send_alert_email(user.email, image_path, ip_address=ip_address)
             
         return jsonify({'error': 'Invalid credentials'}), 401
     
+    lockout.reset(user.email)
+
     # Record successful attempt
     attempt = LoginAttempt(
         user_id=user.id,
         success=True,
-        ip_address=request.remote_addr,
-        location=get_location(request.remote_addr)
+        ip_address=ip_address
     )
     db.session.add(attempt)
     db.session.commit()
@@ -71,4 +86,35 @@ def get_current_user():
         'id': user.id,
         'email': user.email,
         'created_at': user.created_at.isoformat()
-    }) 
\ No newline at end of file
+    })
+
+@bp.route('/login-attempts', methods=['GET'])
+@jwt_required()
+def get_login_attempts():
+    """The current user's login attempts, newest first, with locations resolved per page"""
+    try:
+        page_size = parse_page_size(request.args.get('limit'), 50, 500)
+        before = int(request.args['cursor']) if request.args.get('cursor') else None
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+
+    query = LoginAttempt.query.filter_by(user_id=get_jwt_identity())
+    if before is not None:
+        query = query.filter(LoginAttempt.id < before)
+    attempts = query.order_by(LoginAttempt.id.desc()).limit(page_size + 1).all()
+    next_cursor = None
+    if len(attempts) > page_size:
+        attempts = attempts[:page_size]
+        next_cursor = str(attempts[-1].id)
+
+    items = [{
+        'id': attempt.id,
+        'timestamp': attempt.timestamp.isoformat() if attempt.timestamp else None,
+        'success': attempt.success,
+        'ip_address': attempt.ip_address,
+        'location': attempt.location,
+        'application_id': attempt.application_id
+    } for attempt in attempts]
+    attach_locations(items, current_app.extensions['geolocator'],
+                     current_app.extensions.get('location_backfiller'))
+    return jsonify({'attempts': items, 'next_cursor': next_cursor})
@@ -1,6 +1,5 @@
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
-from app import db
+from app import db, verifier
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -11,10 +10,14 @@ class User(db.Model):
     login_attempts = db.relationship('LoginAttempt', backref='user', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = verifier.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        # Upgrades the hash in the session when the work factor changed; the caller commits
+        ok, new_hash = verifier.verify(self.password_hash, password)
+        if new_hash:
+            self.password_hash = new_hash
+        return ok
 
 class Application(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -33,4 +36,11 @@ class LoginAttempt(db.Model):
     location = db.Column(db.String(255))
     image_path = db.Column(db.String(255))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False) 
\ No newline at end of file
+    application_id = db.Column(db.Integer, db.ForeignKey('application.id'), nullable=False)
+
+    @classmethod
+    def backfill_locations(cls, locations):
+        """Store {ip_address: location} on attempts from those addresses that have none yet"""
+        for ip_address, location in locations.items():
+            cls.query.filter_by(ip_address=ip_address, location=None).update({'location': location})
+        db.session.commit()
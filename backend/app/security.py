@@ -1,41 +1,52 @@
-import cv2
 import os
 from datetime import datetime
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut
-import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.image import MIMEImage
 from flask import current_app
+from lazy import LazyModule
+from alert_queue import PermanentAlertError
+from mailer import is_permanent
 
-def capture_image():
-    """Capture image from webcam and save it."""
+# OpenCV is only needed when an intruder image is actually captured
+cv2 = LazyModule('cv2')
+
+def capture_image(at=None):
+    """Capture image from webcam and save it.
+
+    Uses the camera service's frame closest to ``at`` when it is running,
+    otherwise opens the webcam for a single frame.
+    """
     try:
-        # Initialize webcam
-        cap = cv2.VideoCapture(0)
-        
-        # Read frame
-        ret, frame = cap.read()
+        frame = None
+        service = current_app.extensions.get('camera_service')
+        if service is not None and service.running:
+            frame = service.frame_at(at)
+        if frame is None:
+            # Initialize webcam
+            cap = cv2.VideoCapture(0)
+            
+            # Read frame, then release webcam
+            ret, frame = cap.read()
+            cap.release()
+            if not ret:
+                frame = None
         
-        if ret:
-            # Create filename with timestamp
+        if frame is not None:
+            # Encode within the evidence byte budget; the format decides the extension
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'intruder_{timestamp}.jpg'
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+            evidence = current_app.extensions['image_encoder'].encode_bgr(frame, f'intruder_{timestamp}')
+            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], evidence.filename)
             
             # Ensure upload directory exists
             os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
             
             # Save image
-            cv2.imwrite(filepath, frame)
-            
-            # Release webcam
-            cap.release()
+            with open(filepath, 'wb') as f:
+                f.write(evidence.data)
             
             return filepath
             
-        cap.release()
         return None
         
     except Exception as e:
@@ -43,57 +54,86 @@ def capture_image():
         return None
 
 def get_location(ip_address):
-    """Get location from IP address using geopy."""
+    """Get a one-line location for an IP address from the shared geolocation cache."""
+    return current_app.extensions['geolocator'].describe(ip_address)
+
+def send_alert_email(user_email, image_path, location=None, ip_address=None):
+    """Queue an email alert with intruder image and location; the alert workers send it."""
     try:
-        geolocator = Nominatim(user_agent="appsec")
-        location = geolocator.geocode(ip_address)
-        
-        if location:
-            return f"{location.address}"
-        return "Location not found"
-        
-    except GeocoderTimedOut:
-        return "Location lookup timed out"
+        current_app.extensions['alert_queue'].enqueue('alert_email', {
+            'recipient': user_email,
+            'image_path': image_path,
+            'location': location,
+            'ip_address': ip_address,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+        return True
+
     except Exception as e:
-        print(f"Error getting location: {str(e)}")
-        return "Error getting location"
+        print(f"Error queueing email: {str(e)}")
+        return False
+
+def deliver_alert_email(alert):
+    """Alert-queue handler that sends one queued alert email."""
+    location = alert['location'] or get_location(alert['ip_address'])
+    msg = MIMEMultipart()
+    msg['Subject'] = 'AppSec Security Alert - Unauthorized Access Attempt'
+    msg['From'] = current_app.config['MAIL_USERNAME']
+    msg['To'] = alert['recipient']
+
+    # Email body
+    body = f"""
+    Security Alert!
+
+    An unauthorized access attempt was detected.
+    Location: {location}
+    Time: {alert['time']}
+
+    Please check the attached image of the intruder.
+    """
+
+    msg.attach(MIMEText(body, 'plain'))
 
-def send_alert_email(user_email, image_path, location):
-    """Send email alert with intruder image and location."""
+    # Attach image if available
+    image_path = alert['image_path']
+    if image_path and os.path.exists(image_path):
+        with open(image_path, 'rb') as f:
+            img = MIMEImage(f.read())
+            img.add_header('Content-Disposition', 'attachment', filename=os.path.basename(image_path))
+            msg.attach(img)
+
+    # Send over a pooled SMTP session; 5xx replies will not succeed on retry
     try:
-        msg = MIMEMultipart()
-        msg['Subject'] = 'AppSec Security Alert - Unauthorized Access Attempt'
-        msg['From'] = current_app.config['MAIL_USERNAME']
-        msg['To'] = user_email
-        
-        # Email body
-        body = f"""
-        Security Alert!
-        
-        An unauthorized access attempt was detected.
-        Location: {location}
-        Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-        
-        Please check the attached image of the intruder.
-        """
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # Attach image if available
-        if image_path and os.path.exists(image_path):
-            with open(image_path, 'rb') as f:
-                img = MIMEImage(f.read())
-                img.add_header('Content-Disposition', 'attachment', filename=os.path.basename(image_path))
-                msg.attach(img)
-        
-        # Send email
-        with smtplib.SMTP(current_app.config['MAIL_SERVER'], current_app.config['MAIL_PORT']) as server:
-            server.starttls()
-            server.login(current_app.config['MAIL_USERNAME'], current_app.config['MAIL_PASSWORD'])
-            server.send_message(msg)
-            
-        return True
-        
+        current_app.extensions['smtp_sessions'].send(msg)
+    except Exception as e:
+        if is_permanent(e):
+            raise PermanentAlertError(str(e)) from e
+        raise
+
+def deliver_alert_digest(digest):
+    """Alert-queue handler for the summary of alerts folded by the coalescer."""
+    msg = MIMEMultipart()
+    msg['Subject'] = f"AppSec Security Alert Digest - {digest['count']} more attempts"
+    msg['From'] = current_app.config['MAIL_USERNAME']
+    msg['To'] = digest['recipient']
+
+    sources = '\n'.join(f"        {ip}: {count}" for ip, count in digest['ips'])
+    if digest['other_ips']:
+        sources += f"\n        and {digest['other_ips']} other addresses"
+    body = f"""
+    Security Alert Digest
+
+    Unauthorized access attempts continued after the last alert.
+    Further lockouts: {digest['count']}
+    Between: {digest['first']} and {digest['last']}
+    Source addresses:
+{sources}
+    """
+    msg.attach(MIMEText(body, 'plain'))
+
+    try:
+        current_app.extensions['smtp_sessions'].send(msg)
     except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return False 
\ No newline at end of file
+        if is_permanent(e):
+            raise PermanentAlertError(str(e)) from e
+        raise
@@ -9,19 +9,23 @@ import win32con
 import win32api
 import cv2
 import numpy as np
-import base64
-from io import BytesIO
-from PIL import ImageGrab
-import pyautogui
 from flask import current_app
+from capture import ScreenCapture
+from capture_providers import create_provider
+from imaging import ImageEncoder
 
-def capture_screenshot():
-    # Capture the entire screen
-    screenshot = ImageGrab.grab()
-    # Convert to bytes
-    buffered = BytesIO()
-    screenshot.save(buffered, format="PNG")
-    return base64.b64encode(buffered.getvalue()).decode()
+# Shared by both screenshot paths so they honour the same byte budget
+image_encoder = ImageEncoder()
+screen_capture = ScreenCapture(image_encoder,
+                               provider=create_provider(os.getenv('CAPTURE_PROVIDER', 'auto'),
+                                                        os.getenv('CAPTURE_DISPLAY')),
+                               scale=float(os.getenv('CAPTURE_SCALE', 1)))
+
+def capture_screenshot(window_info=None):
+    # Capture the given window, or the entire screen without one
+    window = window_info.get('hwnd') if window_info else None
+    screenshot = screen_capture.capture(window=window)
+    return screenshot.to_base64() if screenshot else None
 
 def get_active_window_info():
     try:
@@ -32,6 +36,7 @@ def get_active_window_info():
         # Get the process name
         process = psutil.Process(pid)
         return {
+            'hwnd': hwnd,
             'window_title': win32gui.GetWindowText(hwnd),
             'process_name': process.name(),
             'pid': pid,
@@ -62,8 +67,8 @@ def main():
                     # Launch security app if it's not already running
                     launch_security_app()
                     
-                    # Capture screenshot
-                    screenshot_data = capture_screenshot()
+                    # Capture screenshot of the active window
+                    screenshot_data = capture_screenshot(window_info)
                     print("Screenshot captured")
                     
                     # Here you would typically send this information to your backend
@@ -91,6 +96,7 @@ class AppMonitor:
             process = psutil.Process(pid)
             
             return {
+                'hwnd': hwnd,
                 'window_title': win32gui.GetWindowText(hwnd),
                 'process_name': process.name(),
                 'process_id': pid,
@@ -104,12 +110,16 @@ class AppMonitor:
         """Take a screenshot of the current window"""
         try:
             timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"screenshot_{timestamp}.png"
-            filepath = os.path.join(self.screenshot_dir, filename)
             
-            # Take screenshot
-            screenshot = pyautogui.screenshot()
-            screenshot.save(filepath)
+            # Take screenshot of just that window
+            screenshot = screen_capture.capture(pid=window_info['process_id'], window=window_info.get('hwnd'),
+                                                name=f"screenshot_{timestamp}")
+            if screenshot is None:
+                return None
+            filename = screenshot.filename
+            filepath = os.path.join(self.screenshot_dir, filename)
+            with open(filepath, 'wb') as f:
+                f.write(screenshot.data)
             
             return {
                 'filename': filename,
@@ -0,0 +1,203 @@
+import gzip
+import json
+import os
+import shutil
+import uuid
+from datetime import date, datetime
+
+# Column layout of each archived dataset: (name, type). Types only matter
+# for decoding; 'datetime' values are stored as ISO strings.
+LOGIN_ATTEMPT_COLUMNS = (
+    ('id', 'int'),
+    ('username', 'str'),
+    ('success', 'bool'),
+    ('ip_address', 'str'),
+    ('timestamp', 'datetime'),
+)
+
+SECURITY_ALERT_COLUMNS = (
+    ('id', 'int'),
+    ('title', 'str'),
+    ('message', 'str'),
+    ('type', 'str'),
+    ('severity', 'str'),
+    ('status', 'str'),
+    ('ip_address', 'str'),
+    ('geolocation_data', 'json'),
+    ('intruder_image', 'str'),
+    ('created_at', 'datetime'),
+)
+
+DATASETS = {
+    'login_attempts': (LOGIN_ATTEMPT_COLUMNS, 'timestamp'),
+    'security_alerts': (SECURITY_ALERT_COLUMNS, 'created_at'),
+}
+
+
+def _encode(value, kind):
+    if value is None:
+        return None
+    if kind == 'datetime':
+        return value.isoformat()
+    if kind == 'bool':
+        return bool(value)
+    return value
+
+
+def _decode(values, kind):
+    if kind == 'datetime':
+        return [datetime.fromisoformat(value) if value is not None else None for value in values]
+    return values
+
+
+class ColdArchive:
+    """Compressed, columnar, date-partitioned files for aged history.
+
+    Layout: ``<root>/<dataset>/date=YYYY-MM-DD/part-*/<column>.json.gz``
+    plus a ``_meta.json`` per part holding the row count and time range.
+    Each column lives in its own gzip file, so a query decompresses only
+    the columns it asks for, and only in partitions and parts whose time
+    range overlaps the request. Parts are written to a hidden directory and
+    renamed into place, so readers never see half-written data.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def write(self, dataset, rows):
+        """Append ``rows`` (tuples in the dataset's column order); returns parts written"""
+        columns, time_column = DATASETS[dataset]
+        time_index = [name for name, _ in columns].index(time_column)
+
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(row[time_index].date(), []).append(row)
+
+        for day, day_rows in by_day.items():
+            self._write_part(dataset, day, columns, time_index, day_rows)
+        return len(by_day)
+
+    def _write_part(self, dataset, day, columns, time_index, rows):
+        partition = os.path.join(self.root, dataset, f'date={day.isoformat()}')
+        os.makedirs(partition, exist_ok=True)
+        name = f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        staging = os.path.join(partition, '.' + name)
+        os.makedirs(staging)
+        try:
+            for index, (column, kind) in enumerate(columns):
+                values = [_encode(row[index], kind) for row in rows]
+                with gzip.open(os.path.join(staging, f'{column}.json.gz'), 'wt', encoding='utf-8') as f:
+                    json.dump(values, f)
+            times = [row[time_index] for row in rows]
+            with open(os.path.join(staging, '_meta.json'), 'w') as f:
+                json.dump({
+                    'rows': len(rows),
+                    'min': min(times).isoformat(),
+                    'max': max(times).isoformat(),
+                }, f)
+            os.rename(staging, os.path.join(partition, name))
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def _parts(self, dataset, since=None, until=None):
+        """Part directories whose partition date and time range overlap [since, until)"""
+        base = os.path.join(self.root, dataset)
+        if not os.path.isdir(base):
+            return
+        for entry in sorted(os.listdir(base)):
+            if not entry.startswith('date='):
+                continue
+            day = date.fromisoformat(entry[5:])
+            if (since and day < since.date()) or (until and day > until.date()):
+                continue
+            partition = os.path.join(base, entry)
+            for part in sorted(os.listdir(partition)):
+                if part.startswith('.'):
+                    continue
+                path = os.path.join(partition, part)
+                with open(os.path.join(path, '_meta.json')) as f:
+                    meta = json.load(f)
+                if since and datetime.fromisoformat(meta['max']) < since:
+                    continue
+                if until and datetime.fromisoformat(meta['min']) >= until:
+                    continue
+                yield path, meta
+
+    def query(self, dataset, columns=None, since=None, until=None, where=None, limit=None):
+        """Yield archived rows as dicts, oldest partition first.
+
+        ``columns`` limits what is read and returned (default: all);
+        ``where`` is a dict of column -> exact value to match.
+        """
+        schema, time_column = DATASETS[dataset]
+        kinds = dict(schema)
+        columns = list(columns or kinds)
+        where = where or {}
+        for column in list(columns) + list(where):
+            if column not in kinds:
+                raise ValueError(f'Unknown column for {dataset}: {column}')
+
+        returned = 0
+        for path, meta in self._parts(dataset, since, until):
+            cache = {}
+
+            def load(column):
+                if column not in cache:
+                    with gzip.open(os.path.join(path, f'{column}.json.gz'), 'rt', encoding='utf-8') as f:
+                        cache[column] = _decode(json.load(f), kinds[column])
+                return cache[column]
+
+            selected = range(meta['rows'])
+            if since or until:
+                times = load(time_column)
+                selected = [i for i in selected
+                            if (not since or times[i] >= since) and (not until or times[i] < until)]
+            for column, value in where.items():
+                values = load(column)
+                selected = [i for i in selected if values[i] == value]
+            if not selected:
+                continue
+
+            data = [load(column) for column in columns]
+            for i in selected:
+                yield {column: values[i] for column, values in zip(columns, data)}
+                returned += 1
+                if limit is not None and returned >= limit:
+                    return
+
+    def stats(self):
+        result = {}
+        for dataset in DATASETS:
+            parts = rows = size = 0
+            for path, meta in self._parts(dataset):
+                parts += 1
+                rows += meta['rows']
+                size += sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            result[dataset] = {'parts': parts, 'rows': rows, 'bytes': size}
+        return result
+
+
+def archive_security_alerts(archive, cutoff, batch_size):
+    """Move up to ``batch_size`` SecurityAlert rows older than ``cutoff`` into the archive.
+
+    Must run inside an app context. Rows are deleted only after their part
+    is on disk, so a crash can at worst archive a batch twice.
+    """
+    from models import db, SecurityAlert
+
+    alerts = (SecurityAlert.query
+              .filter(SecurityAlert.created_at < cutoff)
+              .order_by(SecurityAlert.created_at, SecurityAlert.id)
+              .limit(batch_size)
+              .all())
+    if not alerts:
+        return 0
+    archive.write('security_alerts', [
+        tuple(getattr(alert, column) for column, _ in SECURITY_ALERT_COLUMNS) for alert in alerts
+    ])
+    SecurityAlert.query.filter(SecurityAlert.id.in_([alert.id for alert in alerts])).delete(
+        synchronize_session=False)
+    db.session.commit()
+    return len(alerts)
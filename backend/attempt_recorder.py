@@ -0,0 +1,120 @@
+import threading
+import time
+from datetime import datetime
+
+
+class LoginAttemptRecorder:
+    """Write-behind buffer for LOGIN_ATTEMPTS rows.
+
+    Attempts are appended to an in-memory buffer and written with a single
+    batched insert once ``flush_size`` rows are waiting or every
+    ``flush_interval`` seconds. The buffer is bounded by ``max_buffer``: a
+    caller that finds it full flushes inline. Lockout does not depend on
+    the table (see LockoutEngine), so unflushed rows only delay the audit
+    trail.
+    """
+
+    def __init__(self, write, max_buffer=10000, flush_size=500, flush_interval=1.0):
+        # write(rows) persists (username, success, ip_address, timestamp) tuples in one batch
+        self._write = write
+        self.max_buffer = max_buffer
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._buffer = []
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._recorded = 0
+        self._flushed = 0
+        self._flushes = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+        self._flush_seconds = 0.0
+        self._flush_max = 0.0
+
+    def start(self):
+        """Start the background flush thread"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flush thread and write out whatever is still buffered"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+    def record(self, username, success, ip_address):
+        """Buffer one login attempt"""
+        if len(self._buffer) >= self.max_buffer:
+            # Backpressure: the caller pays for the flush rather than growing the buffer
+            self.flush()
+
+        with self._lock:
+            self._buffer.append((username, bool(success), ip_address, datetime.now()))
+            self._recorded += 1
+            size = len(self._buffer)
+
+        if size >= self.flush_size:
+            self._wake.set()
+
+    def flush(self):
+        """Write all buffered rows in one batch, returning how many were committed"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._write(batch)
+            except Exception as e:
+                print(f"Error flushing login attempts: {str(e)}")
+                with self._lock:
+                    self._failed_flushes += 1
+                    # Keep the rows for the next flush, dropping the oldest beyond the bound
+                    retained = batch + self._buffer
+                    overflow = len(retained) - self.max_buffer
+                    if overflow > 0:
+                        self._dropped += overflow
+                        retained = retained[overflow:]
+                    self._buffer = retained
+                return 0
+
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self._flushed += len(batch)
+                self._flushes += 1
+                self._flush_seconds += elapsed
+                self._flush_max = max(self._flush_max, elapsed)
+            return len(batch)
+
+    def stats(self):
+        with self._lock:
+            oldest = self._buffer[0][3] if self._buffer else None
+            return {
+                'running': self._thread is not None and self._thread.is_alive(),
+                'buffered': len(self._buffer),
+                'oldest_buffered_s': round((datetime.now() - oldest).total_seconds(), 3) if oldest else 0.0,
+                'recorded': self._recorded,
+                'flushed': self._flushed,
+                'flushes': self._flushes,
+                'failed_flushes': self._failed_flushes,
+                'dropped': self._dropped,
+                'flush_avg_ms': round(self._flush_seconds / self._flushes * 1000, 2) if self._flushes else 0.0,
+                'flush_max_ms': round(self._flush_max * 1000, 2),
+            }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
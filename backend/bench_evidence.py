@@ -0,0 +1,102 @@
+import base64
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from email.message import EmailMessage
+from alert_queue import AlertQueue
+from evidence import Evidence
+
+# Compares the per-alert cost of carrying evidence as base64 strings (the
+# old capture -> queue -> mail path) with carrying raw bytes:
+#   python bench_evidence.py [iterations] [screenshot_kb]
+#
+# Each iteration captures (simulated), enqueues, claims and attaches the
+# evidence to the outgoing message; reports median CPU time and the peak
+# traced memory. Serialising the message for SMTP costs the same on both
+# paths and is reported once on its own.
+
+CAMERA_KB = 150
+
+
+def legacy_capture(png, jpeg):
+    return base64.b64encode(png).decode(), base64.b64encode(jpeg).decode()
+
+
+def legacy_decode(data):
+    if ',' in data:
+        data = data.split(',')[1]
+    return base64.b64decode(data)
+
+
+def legacy_handler(alert):
+    msg = EmailMessage()
+    msg.set_content('alert')
+    msg.add_attachment(legacy_decode(alert['screenshot']), maintype='image', subtype='png', filename='screenshot.png')
+    msg.add_attachment(legacy_decode(alert['camera_image']), maintype='image', subtype='jpeg', filename='intruder.jpg')
+    return msg
+
+
+def evidence_handler(alert):
+    msg = EmailMessage()
+    msg.set_content('alert')
+    for item in alert['evidence']:
+        item.attach_to(msg)
+    return msg
+
+
+def run_legacy(queue, png, jpeg):
+    screenshot, camera = legacy_capture(png, jpeg)
+    queue.enqueue('legacy', {'screenshot': screenshot, 'camera_image': camera})
+    del screenshot, camera
+    queue.run_once()
+
+
+def run_evidence(queue, png, jpeg):
+    evidence = [Evidence(memoryview(png), 'image/png', 'screenshot.png'),
+                Evidence(memoryview(jpeg), 'image/jpeg', 'intruder.jpg')]
+    queue.enqueue('evidence', {}, evidence=evidence)
+    del evidence
+    queue.run_once()
+
+
+def measure(label, fn, queue, png, jpeg, iterations):
+    fn(queue, png, jpeg)  # warm up the connection and tables
+    timings = []
+    for _ in range(iterations):
+        started = time.process_time()
+        fn(queue, png, jpeg)
+        timings.append((time.process_time() - started) * 1000)
+
+    tracemalloc.start()
+    fn(queue, png, jpeg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} median {statistics.median(timings):8.2f} ms   peak {peak / 1024 / 1024:8.2f} MB")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    screenshot_kb = int(sys.argv[2]) if len(sys.argv) > 2 else 2048
+    # Random bytes stand in for encoded images: both are incompressible
+    png = os.urandom(screenshot_kb * 1024)
+    jpeg = os.urandom(CAMERA_KB * 1024)
+
+    with tempfile.TemporaryDirectory() as directory:
+        queue = AlertQueue(path=os.path.join(directory, 'alerts.db'))
+        queue.register('legacy', legacy_handler)
+        queue.register('evidence', evidence_handler)
+        print(f"screenshot {screenshot_kb} KB + camera {CAMERA_KB} KB, {iterations} alerts per path")
+        measure('base64', run_legacy, queue, png, jpeg, iterations)
+        measure('bytes', run_evidence, queue, png, jpeg, iterations)
+
+    msg = evidence_handler({'evidence': [Evidence(png, 'image/png'), Evidence(jpeg, 'image/jpeg')]})
+    started = time.process_time()
+    msg.as_bytes()
+    print(f"{'as_bytes':<10} {(time.process_time() - started) * 1000:13.2f} ms   (MIME serialisation, both paths)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import os
+import statistics
+import sys
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from storage import HanaStorage, SQLiteStorage
+
+# Compares the database cost of a failed login before and after LOGIN_LOOKUP:
+#   python bench_login.py [iterations]
+#
+# 'before' is the SELECT of the user's hash followed by a separate INSERT of
+# the failed attempt; 'after' is the single LOGIN_LOOKUP call. Hash
+# verification costs the same on both paths and is left out. Runs against
+# HANA from the DB_* settings, or against SQLite with STORAGE_BACKEND=sqlite
+# (where round trips are free, so only the HANA figures are meaningful).
+
+load_dotenv()
+
+BENCH_USER = '__bench_login__'
+BENCH_IP = '127.0.0.1'
+
+
+def open_storage():
+    if os.getenv('STORAGE_BACKEND', 'hana').lower() == 'sqlite':
+        return SQLiteStorage(os.getenv('STORAGE_SQLITE_PATH', 'instance/bench_login.db'))
+    return HanaStorage(os.getenv('DB_ADDRESS'), int(os.getenv('DB_PORT', 443)),
+                       os.getenv('DB_USER'), os.getenv('DB_PASSWORD'))
+
+
+def two_round_trips(storage):
+    """The sequence login() used before: read the hash, then insert the failure"""
+    with storage.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute('SELECT PASSWORD, EMAIL FROM USERS WHERE USERNAME = ?', (BENCH_USER,))
+            cursor.fetchone()
+            cursor.execute('INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP) VALUES (?, ?, ?, ?)',
+                           (BENCH_USER, False, BENCH_IP, datetime.now()))
+            conn.commit()
+        finally:
+            cursor.close()
+
+
+def measure(label, fn, iterations):
+    fn()  # warm up the pooled connection and prepared statements
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:<12} median {statistics.median(timings):8.2f} ms   p95 {p95:8.2f} ms")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    storage = open_storage()
+    storage.migrate()
+    storage.create_user(BENCH_USER, 'pbkdf2:sha256:600000$bench$0', 'bench@example.com')
+    try:
+        print(f"Failed login latency over {iterations} iterations")
+        measure('before', lambda: two_round_trips(storage), iterations)
+        measure('after', lambda: storage.lookup_login(BENCH_USER, BENCH_IP), iterations)
+    finally:
+        with storage.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('DELETE FROM LOGIN_ATTEMPTS WHERE USERNAME = ?', (BENCH_USER,))
+                cursor.execute('DELETE FROM USERS WHERE USERNAME = ?', (BENCH_USER,))
+                conn.commit()
+            finally:
+                cursor.close()
+        storage.close()
+
+
+if __name__ == '__main__':
+    main()
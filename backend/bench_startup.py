@@ -0,0 +1,70 @@
+import json
+import os
+import subprocess
+import sys
+
+# Reports what it costs to import the API module and each heavy dependency:
+#   python bench_startup.py [runs]
+#
+# Every measurement runs in a fresh interpreter so nothing is cached between them.
+
+HEAVY_MODULES = [
+    'cv2', 'numpy', 'pyautogui', 'win32gui', 'win32process', 'psutil',
+    'flask_mail', 'monitoring_service', 'app_monitor',
+]
+
+PROBE = """
+import importlib.util, json, sys, time
+started = time.perf_counter()
+try:
+    target = sys.argv[1]
+    if target.endswith('.py'):
+        # app.py shares its name with the app/ package, so load it by path
+        spec = importlib.util.spec_from_file_location(target[:-3] + '_main', target)
+        spec.loader.exec_module(importlib.util.module_from_spec(spec))
+    else:
+        __import__(target)
+    error = None
+except BaseException as e:
+    error = f'{type(e).__name__}: {e}'
+elapsed = time.perf_counter() - started
+heavy = [name for name in sys.argv[2:] if name in sys.modules]
+print(json.dumps({'seconds': elapsed, 'error': error, 'loaded': heavy}))
+"""
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def probe(module):
+    # Importing app must not reach for HANA or start background threads
+    env = dict(os.environ, STORAGE_BACKEND=os.environ.get('STORAGE_BACKEND', 'sqlite'))
+    result = subprocess.run([sys.executable, '-c', PROBE, module] + HEAVY_MODULES,
+                            cwd=HERE, env=env, capture_output=True, text=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(module, runs):
+    results = [probe(module) for _ in range(runs)]
+    timings = sorted(r['seconds'] * 1000 for r in results)
+    return timings[len(timings) // 2], results[-1]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    print(f"{'module':<20} {'median':>10}   status")
+    for module in HEAVY_MODULES:
+        median, last = measure(module, runs)
+        status = 'ok' if last['error'] is None else f"unavailable ({last['error'].splitlines()[0][:60]})"
+        print(f"{module:<20} {median:8.1f} ms   {status}")
+
+    print()
+    for target in ('app.py', 'app'):
+        median, last = measure(target, runs)
+        status = 'ok' if last['error'] is None else last['error'].splitlines()[0]
+        print(f"{'import ' + target:<20} {median:8.1f} ms   {status}")
+        print(f"{'':<20} heavy modules loaded: {', '.join(last['loaded']) or 'none'}")
+
+
+if __name__ == '__main__':
+    main()
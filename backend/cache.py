@@ -0,0 +1,148 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """A load in progress that other callers for the same key wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after ``ttl`` seconds.
+
+    ``get(key, load)`` returns the cached value or calls ``load(key)``;
+    concurrent misses on one key share a single load (single-flight).
+    A load returning None is cached for ``negative_ttl`` seconds (0 skips
+    caching it). ``max_size`` of 0 disables caching while still collapsing
+    concurrent loads.
+    """
+
+    def __init__(self, max_size=1024, ttl=300, negative_ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._flights = {}
+        # Keys invalidated while their load was in flight; that load must not be stored
+        self._stale = set()
+
+        self._hits = 0
+        self._misses = 0
+        self._loads = 0
+        self._shared_loads = 0
+        self._evictions = 0
+        self._expirations = 0
+        self._invalidations = 0
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return value
+                del self._entries[key]
+                self._expirations += 1
+            self._misses += 1
+
+            flight = self._flights.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._flights[key] = _Flight()
+            else:
+                self._shared_loads += 1
+
+        if not owner:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = load(key)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._loads += 1
+                del self._flights[key]
+                stale = key in self._stale
+                self._stale.discard(key)
+                if flight.error is None and not stale:
+                    self._store(key, flight.value)
+            flight.done.set()
+        return flight.value
+
+    def _store(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self.ttl if value is not None else self.negative_ttl
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        self._entries[key] = (value, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def peek(self, key):
+        """(True, value) for a fresh entry, else (False, None); never loads"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return True, entry[0]
+            self._misses += 1
+            return False, None
+
+    def put(self, key, value, ttl=None):
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def snapshot(self):
+        """Live entries as (key, value, seconds_left), least recently used first"""
+        now = time.monotonic()
+        with self._lock:
+            return [(key, value, expires - now) for key, (value, expires) in self._entries.items() if expires > now]
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+            if key in self._flights:
+                self._stale.add(key)
+            self._invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._stale.update(self._flights)
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_ratio': round(self._hits / lookups, 3) if lookups else None,
+                'loads': self._loads,
+                'shared_loads': self._shared_loads,
+                'evictions': self._evictions,
+                'expirations': self._expirations,
+                'invalidations': self._invalidations,
+            }
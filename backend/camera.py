@@ -0,0 +1,228 @@
+import threading
+import time
+from lazy import LazyModule
+
+# Only loaded once the service actually starts
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+
+
+class CameraService:
+    """Keeps the camera open and the last few frames in memory.
+
+    Opening a webcam takes a second or more and its first frames come out
+    dark while exposure settles, so a cold capture at alert time is slow
+    and often useless. While started, a thread grabs every frame the device
+    produces (grabbing is cheap and keeps the driver's queue from going
+    stale) and decodes ``fps`` of them per second into a ring of ``frames``
+    slots, one preallocated array. ``frame_at(ts)`` then hands back the
+    newest frame taken at or before ``ts`` at once, so an alert can show
+    the moment of the failed attempt rather than whatever came after.
+
+    ``source`` is a device index or a video file path; files loop at their
+    own frame rate, which makes the service usable without a camera.
+    Follows the Flask extension pattern like LockoutEngine; ``start()``
+    does nothing unless ``enabled``. Consumers that come and go (the
+    monitors) use ``acquire(owner)`` / ``release(owner)`` instead, so the
+    camera stays on until the last of them lets go.
+    """
+
+    def __init__(self, app=None, source=0, frames=16, fps=4.0, warmup=5, enabled=False):
+        self.source = source
+        self.size = frames
+        self.fps = fps
+        self.warmup = warmup
+        self.enabled = enabled
+
+        self._lock = threading.Lock()
+        self._owners_lock = threading.Lock()
+        self._owners = frozenset()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._frames = None
+        self._times = [0.0] * frames
+        self._head = -1
+        self._count = 0
+
+        self._opened_at = None
+        self._opens = 0
+        self._grabbed = 0
+        self._stored = 0
+        self._read_failures = 0
+        self._served = 0
+        self._missed = 0
+        self._served_age = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('CAMERA_SERVICE', self.enabled)
+        self.source = config.get('CAMERA_SOURCE', self.source)
+        self.size = config.get('CAMERA_BUFFER_FRAMES', self.size)
+        self.fps = config.get('CAMERA_FPS', self.fps)
+        self.warmup = config.get('CAMERA_WARMUP_FRAMES', self.warmup)
+        self._times = [0.0] * self.size
+        app.extensions['camera_service'] = self
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if not self.enabled or self.running:
+            return False
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name='camera-service', daemon=True)
+        self._thread.start()
+        return True
+
+    def acquire(self, owner):
+        """Start the service on behalf of ``owner``; acquiring twice counts once"""
+        with self._owners_lock:
+            self._owners = self._owners | {owner}
+            return self.start()
+
+    def release(self, owner, timeout=5.0):
+        """Drop ``owner``'s hold; the service stops once no owner is left"""
+        with self._owners_lock:
+            self._owners = self._owners - {owner}
+            if self._owners:
+                return False
+            self.stop(timeout)
+            return True
+
+    def stop(self, timeout=5.0):
+        """Stop grabbing and release the device whoever holds it; buffered frames are dropped"""
+        self._stopping.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join(timeout)
+        with self._lock:
+            self._head = -1
+            self._count = 0
+
+    def _open(self):
+        source = self.source
+        if isinstance(source, str) and source.isdigit():
+            source = int(source)
+        cap = cv2.VideoCapture(source)
+        if not cap.isOpened():
+            cap.release()
+            return None, False
+        is_file = not isinstance(source, int)
+        for _ in range(0 if is_file else self.warmup):
+            cap.grab()
+        with self._lock:
+            self._opens += 1
+            self._opened_at = time.time()
+        return cap, is_file
+
+    def _run(self):
+        while not self._stopping.is_set():
+            cap, is_file = self._open()
+            if cap is None:
+                print(f"Camera service: could not open {self.source!r}, retrying")
+                self._stopping.wait(5.0)
+                continue
+            try:
+                self._grab_loop(cap, is_file)
+            except Exception as e:
+                print(f"Camera service error: {str(e)}")
+                self._stopping.wait(1.0)
+            finally:
+                cap.release()
+                with self._lock:
+                    self._opened_at = None
+
+    def _grab_loop(self, cap, is_file):
+        interval = 1.0 / self.fps
+        # A file plays back in real time, as a camera would deliver it
+        frame_time = 1.0 / (cap.get(cv2.CAP_PROP_FPS) or 30.0) if is_file else 0.0
+        next_store = 0.0
+        failures = 0
+        while not self._stopping.is_set():
+            if not cap.grab():
+                if is_file and cap.set(cv2.CAP_PROP_POS_FRAMES, 0):
+                    continue
+                with self._lock:
+                    self._read_failures += 1
+                failures += 1
+                if failures >= 10:
+                    return  # reopen the device
+                self._stopping.wait(0.1)
+                continue
+            failures = 0
+            now = time.time()
+            with self._lock:
+                self._grabbed += 1
+            if now >= next_store:
+                self._store(cap, now)
+                next_store = max(next_store + interval, now)
+            if frame_time:
+                self._stopping.wait(frame_time)
+
+    def _store(self, cap, now):
+        with self._lock:
+            slot = (self._head + 1) % self.size
+            if self._frames is not None:
+                ok, frame = cap.retrieve(self._frames[slot])
+                if ok and frame.shape != self._frames.shape[1:]:
+                    self._frames = None  # the device changed resolution
+            else:
+                ok, frame = cap.retrieve()
+            if not ok:
+                self._read_failures += 1
+                return
+            if self._frames is None:
+                self._frames = np.empty((self.size,) + frame.shape, dtype=frame.dtype)
+                self._frames[slot] = frame
+                self._count = 0
+            self._times[slot] = now
+            self._head = slot
+            self._count = min(self._count + 1, self.size)
+            self._stored += 1
+
+    def frame_at(self, timestamp=None, max_age=None):
+        """Copy of the newest buffered frame taken at or before ``timestamp`` (default: now).
+
+        Falls back to the oldest frame if ``timestamp`` predates the buffer.
+        Returns None when nothing usable is buffered: the service is stopped,
+        still warming up, or its newest frame is older than ``max_age``
+        seconds (default: three store intervals, at least 2s).
+        """
+        now = time.time()
+        if max_age is None:
+            max_age = max(2.0, 3.0 / self.fps)
+        with self._lock:
+            if self._count == 0 or now - self._times[self._head] > max_age:
+                self._missed += 1
+                return None
+            slot = self._head
+            for back in range(self._count):
+                slot = (self._head - back) % self.size
+                if timestamp is None or self._times[slot] <= timestamp:
+                    break
+            frame = self._frames[slot].copy()
+            self._served += 1
+            self._served_age += now - self._times[slot]
+        return frame
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'running': self.running,
+                'owners': sorted(self._owners),
+                'source': str(self.source),
+                'open_seconds': round(time.time() - self._opened_at, 1) if self._opened_at else 0.0,
+                'opens': self._opens,
+                'buffered': self._count,
+                'buffer_seconds': round(self._times[self._head] - self._times[(self._head - self._count + 1) % self.size], 2)
+                if self._count else 0.0,
+                'grabbed': self._grabbed,
+                'stored': self._stored,
+                'read_failures': self._read_failures,
+                'served': self._served,
+                'missed': self._missed,
+                'avg_served_age_ms': round(self._served_age / self._served * 1000, 1) if self._served else 0.0,
+            }
@@ -0,0 +1,121 @@
+import threading
+import time
+from capture_providers import clip
+from imaging import ImageEncoder
+from lazy import LazyModule
+
+# Heavy, desktop-only dependencies: imported the first time a capture runs,
+# so API-only workers and headless servers never load them
+cv2 = LazyModule('cv2')
+pyautogui = LazyModule('pyautogui')
+
+
+class ScreenCapture:
+    """Screenshots as Evidence, encoded to fit the encoder's byte budget.
+
+    With a CaptureProvider, passing the ``pid`` or ``window`` of the
+    monitored application grabs only that window's bounds; the whole screen
+    is used when no target is given or it cannot be found. Without one,
+    pyautogui grabs the whole screen. Images are shrunk by ``scale``
+    before encoding.
+    """
+
+    def __init__(self, encoder=None, provider=None, scale=1.0):
+        self.encoder = encoder or ImageEncoder()
+        self.provider = provider
+        self.scale = scale
+
+        self._lock = threading.Lock()
+        self._captures = 0
+        self._windowed = 0
+        self._fallbacks = 0
+        self._pixels = 0
+        self._grab_seconds = 0.0
+
+    def available(self):
+        return self.provider.available() if self.provider else pyautogui.available()
+
+    def grab(self, pid=None, window=None):
+        """PIL image of the target window (or the whole screen), before scaling"""
+        if self.provider is None:
+            size = pyautogui.size()
+            return pyautogui.screenshot(region=(0, 0, size.width, size.height)), False
+        screen = self.provider.screen_bounds()
+        bbox = None
+        if pid or window:
+            bounds = self.provider.window_bounds(pid, window)
+            # Windows can hang off the screen edge; only the visible part can be grabbed
+            bbox = clip(bounds, screen) if bounds else None
+        return self.provider.grab(bbox or screen), bbox is not None
+
+    def capture(self, pid=None, window=None, name='screenshot'):
+        try:
+            started = time.perf_counter()
+            screenshot, windowed = self.grab(pid, window)
+            grabbed = time.perf_counter() - started
+            with self._lock:
+                self._captures += 1
+                self._windowed += windowed
+                self._fallbacks += bool(pid or window) and not windowed
+                self._pixels += screenshot.width * screenshot.height
+                self._grab_seconds += grabbed
+            if self.scale < 1.0:
+                size = (max(1, int(screenshot.width * self.scale)), max(1, int(screenshot.height * self.scale)))
+                screenshot = screenshot.resize(size, reducing_gap=2.0)
+            return self.encoder.encode(screenshot, name)
+        except Exception as e:
+            print(f"Screenshot error: {str(e)}")
+            return None
+
+    def stats(self):
+        with self._lock:
+            return {
+                'provider': self.provider.name if self.provider else 'pyautogui',
+                'scale': self.scale,
+                'captures': self._captures,
+                'window_captures': self._windowed,
+                'window_not_found': self._fallbacks,
+                'avg_megapixels': round(self._pixels / self._captures / 1e6, 2) if self._captures else 0.0,
+                'avg_grab_ms': round(self._grab_seconds / self._captures * 1000, 2) if self._captures else 0.0,
+            }
+
+
+class CameraCapture:
+    """Single webcam frames as Evidence, encoded to fit the encoder's byte budget.
+
+    With a running CameraService the frame comes from its buffer instead of
+    opening the device for one shot.
+    """
+
+    def __init__(self, device=0, encoder=None, service=None):
+        self.device = device
+        self.encoder = encoder or ImageEncoder()
+        self.service = service
+
+    def available(self):
+        return cv2.available()
+
+    def capture(self, at=None):
+        """Evidence for the frame closest to (not after) ``at`` when buffered, else a fresh frame"""
+        try:
+            if self.service is not None and self.service.running:
+                frame = self.service.frame_at(at)
+                if frame is not None:
+                    return self.encoder.encode_bgr(frame, 'intruder')
+
+            cap = cv2.VideoCapture(self.device)
+            if not cap.isOpened():
+                print("Error: Could not open camera")
+                return None
+            try:
+                ret, frame = cap.read()
+            finally:
+                cap.release()
+            if not ret:
+                print("Error: Could not capture frame")
+                return None
+
+            return self.encoder.encode_bgr(frame, 'intruder')
+        except Exception as e:
+            print(f"Camera capture error: {str(e)}")
+            return None
@@ -0,0 +1,214 @@
+import os
+import sys
+import threading
+from lazy import LazyModule
+
+PIL_Image = LazyModule('PIL.Image')
+PIL_ImageGrab = LazyModule('PIL.ImageGrab')
+win32api = LazyModule('win32api')
+win32con = LazyModule('win32con')
+win32gui = LazyModule('win32gui')
+win32process = LazyModule('win32process')
+win32ui = LazyModule('win32ui')
+Xlib_display = LazyModule('Xlib.display')
+Xlib_X = LazyModule('Xlib.X')
+
+
+class CaptureProvider:
+    """Locates windows and grabs screen regions on one windowing system.
+
+    Bounds are (left, top, right, bottom) in screen pixels. ``window`` is
+    the platform's window id (an HWND or an X11 window id); with only a
+    ``pid`` the provider picks that process's window, preferring the
+    focused one and then the largest.
+    """
+
+    name = None
+
+    def available(self):
+        return False
+
+    def window_bounds(self, pid=None, window=None):
+        """Bounds of the window, the focused window if neither is given, or None if not found"""
+        raise NotImplementedError
+
+    def screen_bounds(self):
+        raise NotImplementedError
+
+    def grab(self, bbox):
+        """PIL image of the screen inside ``bbox``"""
+        raise NotImplementedError
+
+
+class WindowsCaptureProvider(CaptureProvider):
+    """Win32 windows; grabs copy only the requested region with BitBlt"""
+
+    name = 'windows'
+
+    def available(self):
+        return sys.platform == 'win32' and win32ui.available()
+
+    def window_bounds(self, pid=None, window=None):
+        if window is None:
+            window = self._find_window(pid) if pid else win32gui.GetForegroundWindow()
+        if not window or not win32gui.IsWindow(window) or win32gui.IsIconic(window):
+            return None
+        return win32gui.GetWindowRect(window)
+
+    def _find_window(self, pid):
+        foreground = win32gui.GetForegroundWindow()
+        if foreground and win32process.GetWindowThreadProcessId(foreground)[1] == pid:
+            return foreground
+        found = []
+
+        def visit(hwnd, _):
+            if (win32gui.IsWindowVisible(hwnd) and win32gui.GetWindowText(hwnd)
+                    and win32process.GetWindowThreadProcessId(hwnd)[1] == pid):
+                found.append(hwnd)
+            return True
+
+        win32gui.EnumWindows(visit, None)
+        return max(found, key=lambda hwnd: _area(win32gui.GetWindowRect(hwnd)), default=None)
+
+    def screen_bounds(self):
+        # The virtual screen spans every monitor
+        left = win32api.GetSystemMetrics(win32con.SM_XVIRTUALSCREEN)
+        top = win32api.GetSystemMetrics(win32con.SM_YVIRTUALSCREEN)
+        return (left, top,
+                left + win32api.GetSystemMetrics(win32con.SM_CXVIRTUALSCREEN),
+                top + win32api.GetSystemMetrics(win32con.SM_CYVIRTUALSCREEN))
+
+    def grab(self, bbox):
+        left, top, right, bottom = bbox
+        width, height = right - left, bottom - top
+        desktop = win32gui.GetDesktopWindow()
+        desktop_dc = win32gui.GetWindowDC(desktop)
+        source = win32ui.CreateDCFromHandle(desktop_dc)
+        memory = source.CreateCompatibleDC()
+        bitmap = win32ui.CreateBitmap()
+        try:
+            bitmap.CreateCompatibleBitmap(source, width, height)
+            memory.SelectObject(bitmap)
+            memory.BitBlt((0, 0), (width, height), source, (left, top), win32con.SRCCOPY)
+            bits = bitmap.GetBitmapBits(True)
+        finally:
+            win32gui.DeleteObject(bitmap.GetHandle())
+            memory.DeleteDC()
+            source.DeleteDC()
+            win32gui.ReleaseDC(desktop, desktop_dc)
+        return PIL_Image.frombuffer('RGB', (width, height), bits, 'raw', 'BGRX', 0, 1)
+
+
+class X11CaptureProvider(CaptureProvider):
+    """X11 windows (including Xvfb) through python-xlib; grabs fetch only the region.
+
+    Windows are matched to processes by their _NET_WM_PID property. Under
+    a window manager the candidates come from _NET_CLIENT_LIST; on a bare
+    server such as Xvfb the root's mapped children are searched instead.
+    """
+
+    name = 'x11'
+
+    def __init__(self, display=None):
+        self.display_name = display or None
+        self._display = None
+        # An Xlib connection must not be used from two threads at once
+        self._lock = threading.Lock()
+
+    def available(self):
+        if not (self.display_name or os.environ.get('DISPLAY')) or not Xlib_display.available():
+            return False
+        try:
+            with self._lock:
+                self._connect()
+            return True
+        except Exception:
+            return False
+
+    def _connect(self):
+        if self._display is None:
+            self._display = Xlib_display.Display(self.display_name)
+        return self._display
+
+    def _property(self, display, window, name):
+        prop = window.get_full_property(display.intern_atom(name), Xlib_X.AnyPropertyType)
+        return list(prop.value) if prop is not None else []
+
+    def window_bounds(self, pid=None, window=None):
+        with self._lock:
+            display = self._connect()
+            root = display.screen().root
+            if window is None:
+                active = self._property(display, root, '_NET_ACTIVE_WINDOW')
+                window = self._find_window(display, root, pid, active[0] if active else None) if pid \
+                    else (active[0] if active else None)
+            if not window:
+                return None
+            return self._bounds(display, root, display.create_resource_object('window', window))
+
+    def _find_window(self, display, root, pid, active):
+        if active and pid in self._property(display, display.create_resource_object('window', active), '_NET_WM_PID'):
+            return active
+        clients = self._property(display, root, '_NET_CLIENT_LIST')
+        windows = ([display.create_resource_object('window', client) for client in clients] if clients
+                   else root.query_tree().children)
+        found = []
+        for window in windows:
+            try:
+                if (window.get_attributes().map_state == Xlib_X.IsViewable
+                        and pid in self._property(display, window, '_NET_WM_PID')):
+                    found.append(window)
+            except Exception:
+                continue  # the window went away meanwhile
+        best = max(found, key=lambda window: _area(self._bounds(display, root, window)), default=None)
+        return best.id if best is not None else None
+
+    def _bounds(self, display, root, window):
+        geometry = window.get_geometry()
+        origin = root.translate_coords(window, 0, 0)
+        return origin.x, origin.y, origin.x + geometry.width, origin.y + geometry.height
+
+    def screen_bounds(self):
+        with self._lock:
+            screen = self._connect().screen()
+            return 0, 0, screen.width_in_pixels, screen.height_in_pixels
+
+    def grab(self, bbox):
+        left, top, right, bottom = bbox
+        with self._lock:
+            display = self._connect()
+            screen = display.screen()
+            if screen.root_depth not in (24, 32):
+                # Unusual visuals: let Pillow convert the whole screen instead
+                return PIL_ImageGrab.grab(bbox, xdisplay=self.display_name or os.environ.get('DISPLAY'))
+            reply = screen.root.get_image(left, top, right - left, bottom - top, Xlib_X.ZPixmap, 0xffffffff)
+        return PIL_Image.frombytes('RGB', (right - left, bottom - top), reply.data, 'raw', 'BGRX')
+
+
+PROVIDERS = {'windows': WindowsCaptureProvider, 'x11': X11CaptureProvider}
+
+
+def create_provider(name='auto', display=None):
+    """The named provider, or for 'auto' the first available one; None when there is none (or 'none')"""
+    name = (name or 'auto').lower()
+    if name == 'none':
+        return None
+    if name != 'auto':
+        return PROVIDERS[name](display) if name == 'x11' else PROVIDERS[name]()
+    for provider in (WindowsCaptureProvider(), X11CaptureProvider(display)):
+        if provider.available():
+            return provider
+    return None
+
+
+def clip(bbox, bounds):
+    """Intersection of two boxes, or None if they do not overlap"""
+    left, top = max(bbox[0], bounds[0]), max(bbox[1], bounds[1])
+    right, bottom = min(bbox[2], bounds[2]), min(bbox[3], bounds[3])
+    if right <= left or bottom <= top:
+        return None
+    return left, top, right, bottom
+
+
+def _area(bbox):
+    return max(0, bbox[2] - bbox[0]) * max(0, bbox[3] - bbox[1])
@@ -15,11 +15,77 @@ class Config:
     # Email configuration
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 587)
-    MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
+    MAIL_USE_TLS = (os.environ.get('MAIL_USE_TLS') or 'true').lower() in ('1', 'true', 'yes')
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    # Pooled SMTP sessions: NOOP-checked after MAIL_NOOP_AFTER idle seconds,
+    # replaced after MAIL_IDLE_TIMEOUT
+    MAIL_POOL_SIZE = int(os.environ.get('MAIL_POOL_SIZE') or 2)
+    MAIL_TIMEOUT = float(os.environ.get('MAIL_TIMEOUT') or 10)
+    MAIL_NOOP_AFTER = float(os.environ.get('MAIL_NOOP_AFTER') or 30)
+    MAIL_IDLE_TIMEOUT = float(os.environ.get('MAIL_IDLE_TIMEOUT') or 120)
     
-    # Security settings
-    MAX_LOGIN_ATTEMPTS = 3
+    # Security settings: sliding-window lockout per user and per IP
+    LOCKOUT_THRESHOLD = int(os.environ.get('LOCKOUT_THRESHOLD') or os.environ.get('MAX_LOGIN_ATTEMPTS') or 3)
+    LOCKOUT_IP_THRESHOLD = int(os.environ.get('LOCKOUT_IP_THRESHOLD') or 20)
+    LOCKOUT_WINDOW = int(os.environ.get('LOCKOUT_WINDOW') or 900)  # seconds
+    LOCKOUT_BACKEND = os.environ.get('LOCKOUT_BACKEND') or 'memory'  # or 'sqlite' to share across workers
+    LOCKOUT_SQLITE_PATH = os.environ.get('LOCKOUT_SQLITE_PATH') or os.path.join(basedir, 'instance/lockout.db')
+
+    # Password hashing: werkzeug method with work factor, on a bounded worker pool
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or 'pbkdf2:sha256:600000'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 4)
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE') or 32)
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT') or 10)
+
+    # Token-bucket rate limits for login/register: tokens per second and burst
+    RATE_LIMIT_ENABLED = (os.environ.get('RATE_LIMIT_ENABLED') or 'true').lower() in ('1', 'true', 'yes')
+    RATE_LIMIT_IP_RATE = float(os.environ.get('RATE_LIMIT_IP_RATE') or 1.0)
+    RATE_LIMIT_IP_BURST = int(os.environ.get('RATE_LIMIT_IP_BURST') or 10)
+    RATE_LIMIT_USER_RATE = float(os.environ.get('RATE_LIMIT_USER_RATE') or 0.2)
+    RATE_LIMIT_USER_BURST = int(os.environ.get('RATE_LIMIT_USER_BURST') or 5)
+    RATE_LIMIT_STRIPES = int(os.environ.get('RATE_LIMIT_STRIPES') or 16)
+
+    # Outbound HTTP client: pooling, retries and circuit breakers per upstream
+    HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE') or 10)
+    HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES') or 2)
+    HTTP_BACKOFF = float(os.environ.get('HTTP_BACKOFF') or 0.2)
+    HTTP_BREAKER_THRESHOLD = int(os.environ.get('HTTP_BREAKER_THRESHOLD') or 5)
+    HTTP_BREAKER_RESET = float(os.environ.get('HTTP_BREAKER_RESET') or 30)
+    IP_API_URL = os.environ.get('IP_API_URL') or 'http://ip-api.com'
+    IPIFY_URL = os.environ.get('IPIFY_URL') or 'https://api.ipify.org'
+    PUBLIC_IP_TIMEOUT = float(os.environ.get('PUBLIC_IP_TIMEOUT') or 3)
+
+    # Shared IP geolocation cache
+    GEO_CACHE_SIZE = int(os.environ.get('GEO_CACHE_SIZE') or 4096)
+    GEO_CACHE_TTL = int(os.environ.get('GEO_CACHE_TTL') or 86400)  # seconds
+    GEO_NEGATIVE_TTL = int(os.environ.get('GEO_NEGATIVE_TTL') or 300)
+    GEO_TIMEOUT = float(os.environ.get('GEO_TIMEOUT') or 3)
+    GEO_CACHE_PATH = os.environ.get('GEO_CACHE_PATH', os.path.join(basedir, 'instance/geolocation.json'))
+    GEO_DATABASE_PATH = os.environ.get('GEO_DATABASE_PATH') or ''  # offline IP-range CSV
+    GEO_HTTP_FALLBACK = (os.environ.get('GEO_HTTP_FALLBACK') or 'true').lower() in ('1', 'true', 'yes')
+    # Alert email queue: SQLite file, worker count and retry policy
+    ALERT_QUEUE_PATH = os.environ.get('ALERT_QUEUE_PATH', os.path.join(basedir, 'instance/alerts.db'))
+    ALERT_WORKERS = int(os.environ.get('ALERT_WORKERS') or 2)
+    ALERT_MAX_ATTEMPTS = int(os.environ.get('ALERT_MAX_ATTEMPTS') or 5)
+    ALERT_RETRY_BACKOFF = float(os.environ.get('ALERT_RETRY_BACKOFF') or 5)
+    ALERT_RETRY_MAX_BACKOFF = float(os.environ.get('ALERT_RETRY_MAX_BACKOFF') or 600)
+    # Repeat lockout alerts per (user, app) inside this many seconds go into one digest
+    ALERT_COALESCE_WINDOW = int(os.environ.get('ALERT_COALESCE_WINDOW', 300))
+    # Write locations resolved for attempt listings back to LoginAttempt.location
+    ATTEMPT_LOCATION_BACKFILL = (os.environ.get('ATTEMPT_LOCATION_BACKFILL') or 'true').lower() in ('1', 'true', 'yes')
+    # Evidence images: max size, then the best WebP/JPEG quality that fits the byte budget
+    EVIDENCE_MAX_BYTES = int(os.environ.get('EVIDENCE_MAX_BYTES') or 300_000)
+    EVIDENCE_MAX_WIDTH = int(os.environ.get('EVIDENCE_MAX_WIDTH') or 1600)
+    EVIDENCE_MAX_HEIGHT = int(os.environ.get('EVIDENCE_MAX_HEIGHT') or 1600)
+    EVIDENCE_FORMATS = (os.environ.get('EVIDENCE_FORMATS') or 'webp,jpeg').lower().split(',')
+    EVIDENCE_MIN_QUALITY = int(os.environ.get('EVIDENCE_MIN_QUALITY') or 30)
+    EVIDENCE_MAX_QUALITY = int(os.environ.get('EVIDENCE_MAX_QUALITY') or 85)
+    # Warm camera service: device index or looped video file, and its frame buffer
+    CAMERA_SERVICE = (os.environ.get('CAMERA_SERVICE') or 'false').lower() in ('1', 'true', 'yes')
+    CAMERA_SOURCE = os.environ.get('CAMERA_SOURCE') or '0'
+    CAMERA_BUFFER_FRAMES = int(os.environ.get('CAMERA_BUFFER_FRAMES') or 16)
+    CAMERA_FPS = float(os.environ.get('CAMERA_FPS') or 4)
+    CAMERA_WARMUP_FRAMES = int(os.environ.get('CAMERA_WARMUP_FRAMES') or 5)
     UPLOAD_FOLDER = os.path.join(basedir, 'app/uploads')
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'} 
\ No newline at end of file
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'} 
\ No newline at end of file
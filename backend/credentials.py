@@ -0,0 +1,220 @@
+import hmac
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug.security import check_password_hash, generate_password_hash
+from login_check import LOGIN_UNKNOWN_USER, LOGIN_OK, LOGIN_BAD_PASSWORD
+
+# Prefixes of werkzeug hash strings; anything else in a PASSWORD column is a
+# legacy plaintext row
+HASH_METHODS = ('pbkdf2:', 'scrypt:')
+
+
+class VerifierBusy(Exception):
+    """Raised instead of queueing when the hashing pool is saturated"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Credential verification is saturated; retry in {retry_after}s')
+        self.retry_after = retry_after
+
+
+class CredentialVerifier:
+    """Password hashing and verification on a bounded worker pool.
+
+    At most ``workers`` hashes run at once and at most ``max_queue`` more may
+    wait; beyond that calls fail fast with VerifierBusy so a login flood
+    cannot tie up every request thread. ``method`` is a werkzeug method string
+    including its work factor (e.g. ``pbkdf2:sha256:600000`` or
+    ``scrypt:32768:8:1``); rows hashed differently, or stored as legacy
+    plaintext, are rehashed on the next successful verify. Both hashlib
+    backends release the GIL, so a thread pool gives real parallelism.
+    """
+
+    def __init__(self, app=None, method='pbkdf2:sha256:600000', workers=4, max_queue=32, timeout=10.0):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._prefix = None
+
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._timeouts = 0
+        self._rehashed = 0
+        self._latencies = deque(maxlen=1000)
+        self._waits = deque(maxlen=1000)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.method = config.get('PASSWORD_HASH_METHOD', self.method)
+        self.workers = config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_queue = config.get('PASSWORD_HASH_QUEUE', self.max_queue)
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        app.extensions['credential_verifier'] = self
+
+    def hash(self, password):
+        """Hash ``password`` with the configured method"""
+        return self._submit(generate_password_hash, password, self.method)
+
+    def verify(self, stored, password):
+        """Check ``password`` against a stored hash or legacy plaintext.
+
+        Returns (ok, new_hash); new_hash is set when the row should be
+        rewritten with the current method.
+        """
+        if not stored:
+            return False, None
+        return self._submit(self._verify, stored, password)
+
+    def needs_rehash(self, stored):
+        return stored.split('$', 1)[0] != self.method_prefix
+
+    @property
+    def method_prefix(self):
+        """``method`` as werkzeug writes it into hashes, e.g. 'scrypt' -> 'scrypt:32768:8:1'"""
+        prefix = self._prefix
+        if prefix is None or prefix[0] != self.method:
+            # Short forms take werkzeug's defaults, so ask it once rather than guess
+            prefix = self._prefix = (self.method, generate_password_hash('', self.method).split('$', 1)[0])
+        return prefix[1]
+
+    @staticmethod
+    def is_hashed(stored):
+        return stored.startswith(HASH_METHODS) and stored.count('$') == 2
+
+    def _verify(self, stored, password):
+        if self.is_hashed(stored):
+            ok = check_password_hash(stored, password)
+        else:
+            ok = hmac.compare_digest(stored.encode(), password.encode())
+        if ok and self.needs_rehash(stored):
+            with self._lock:
+                self._rehashed += 1
+            return True, generate_password_hash(password, self.method)
+        return ok, None
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                    thread_name_prefix='credential-verifier')
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+            return self._executor, self._slots
+
+    def _submit(self, fn, *args):
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise VerifierBusy(self._retry_after())
+
+        submitted = time.monotonic()
+        with self._lock:
+            self._queued += 1
+        try:
+            future = executor.submit(self._run, fn, submitted, slots, *args)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            slots.release()
+            raise
+
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            # The hash still finishes and frees its slot; only this caller gives up
+            with self._lock:
+                self._timeouts += 1
+            raise VerifierBusy(self._retry_after())
+
+    def _run(self, fn, submitted, slots, *args):
+        started = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+        try:
+            return fn(*args)
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._waits.append(started - submitted)
+                self._latencies.append(finished - submitted)
+            slots.release()
+
+    def _retry_after(self):
+        """Seconds until the current backlog should have drained"""
+        with self._lock:
+            service = (sum(self._latencies) / len(self._latencies)) if self._latencies else 1.0
+            backlog = self._queued + self._active
+        return max(1, math.ceil(backlog * service / max(self.workers, 1)))
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            waits = list(self._waits)
+            return {
+                'method': self.method,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'queue_depth': self._queued,
+                'active': self._active,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'timeouts': self._timeouts,
+                'rehashed': self._rehashed,
+                'wait_avg_ms': round(sum(waits) / len(waits) * 1000, 2) if waits else 0.0,
+                'latency_p50_ms': round(latencies[len(latencies) // 2] * 1000, 2) if latencies else 0.0,
+                'latency_p95_ms': round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else 0.0,
+                'latency_max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+def authenticate(storage, verifier, username, password, ip_address=None, record=False):
+    """Return (status, email) for a login, upgrading the stored hash when needed.
+
+    email is the account's address for both LOGIN_OK and LOGIN_BAD_PASSWORD
+    (the latter so lockout alerts can be addressed without another read).
+
+    With ``record`` a failed attempt from ``ip_address`` is written in the
+    same round trip as the lookup (see storage.lookup_login); a correct
+    password, or a verification that never ran, deletes it again.
+
+    Reads the row directly rather than from the user cache so a password
+    change elsewhere takes effect immediately. Raises VerifierBusy when the
+    pool is saturated.
+    """
+    user = storage.lookup_login(username, ip_address, record=record)
+    if user is None:
+        return LOGIN_UNKNOWN_USER, None
+    stored, email, attempt_id = user
+    try:
+        ok, new_hash = verifier.verify(stored, password)
+    except Exception:
+        # Turned away before the password was judged: not a failed attempt
+        if attempt_id is not None:
+            storage.discard_attempt(attempt_id)
+        raise
+    if not ok:
+        return LOGIN_BAD_PASSWORD, email
+    if attempt_id is not None:
+        storage.discard_attempt(attempt_id)
+    if new_hash:
+        storage.update_user(username, password=new_hash)
+    return LOGIN_OK, email
@@ -0,0 +1,216 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of DB-API connections.
+
+    Connections are opened lazily by ``connect`` up to ``max_size``, validated
+    cheaply on checkout and recycled once they are older than ``max_age``
+    seconds. Idle connections that have not been used for ``ping_after``
+    seconds get a round trip with ``ping_query`` before being handed out.
+    """
+
+    def __init__(self, connect, max_size=10, timeout=5.0, max_age=1800,
+                 ping_after=60, ping_query='SELECT 1 FROM DUMMY'):
+        self._connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.ping_after = ping_after
+        self.ping_query = ping_query
+
+        self._cond = threading.Condition(threading.Lock())
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._created = {}    # id(conn) -> created_at, for connections checked out
+        self._statements = {}  # id(conn) -> {sql: cursor}
+        self._size = 0
+        self._closed = False
+
+        self._checkouts = 0
+        self._timeouts = 0
+        self._opened = 0
+        self._recycled = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._peak_in_use = 0
+
+    def acquire(self, timeout=None):
+        """Check a connection out of the pool"""
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout('Connection pool is closed')
+                    if self._idle:
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        # Reserve a slot and open the connection outside the lock
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._timeouts += 1
+                        raise PoolTimeout(f'No database connection available after {timeout:.1f}s')
+                    self._cond.wait(remaining)
+
+            if entry is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+                created_at = time.monotonic()
+                with self._cond:
+                    self._opened += 1
+            else:
+                conn, created_at, last_used = entry
+                if not self._is_usable(conn, created_at, last_used):
+                    self._discard(conn)
+                    with self._cond:
+                        self._recycled += 1
+                    continue
+
+            waited = time.monotonic() - started
+            with self._cond:
+                self._created[id(conn)] = created_at
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+                self._peak_in_use = max(self._peak_in_use, self._size - len(self._idle))
+            return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, or close it if ``discard`` is set"""
+        with self._cond:
+            created_at = self._created.pop(id(conn), None)
+        if created_at is None:
+            return
+
+        expired = time.monotonic() - created_at >= self.max_age
+        if discard or expired or self._closed:
+            self._discard(conn)
+            if expired and not discard:
+                with self._cond:
+                    self._recycled += 1
+            return
+
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout=None):
+        """Context manager that checks a connection out and back in"""
+        conn = self.acquire(timeout)
+        with self.returning(conn):
+            yield conn
+
+    @contextmanager
+    def returning(self, conn):
+        """Return an already checked-out connection when the block exits.
+
+        If the block raises, the transaction is rolled back; a connection that
+        cannot even roll back is considered broken and is closed.
+        """
+        try:
+            yield conn
+        except BaseException:
+            broken = False
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            self.release(conn, discard=broken)
+            raise
+        else:
+            self.release(conn)
+
+    def statement(self, conn, sql):
+        """Cursor dedicated to ``sql`` on a checked-out connection.
+
+        The cursor lives as long as the connection, so re-executing the same
+        statement reuses the driver's prepared statement instead of parsing
+        it again on the server.
+        """
+        cursors = self._statements.setdefault(id(conn), {})
+        cursor = cursors.get(sql)
+        if cursor is None:
+            cursor = cursors[sql] = conn.cursor()
+        return cursor
+
+    def stats(self):
+        """Occupancy and wait-time figures for sizing the pool"""
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - idle,
+                'idle': idle,
+                'peak_in_use': self._peak_in_use,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'opened': self._opened,
+                'recycled': self._recycled,
+                'wait_avg_ms': round(self._wait_total / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                'wait_max_ms': round(self._wait_max * 1000, 3),
+            }
+
+    def close(self):
+        """Close idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            self._discard(conn)
+
+    def _is_usable(self, conn, created_at, last_used):
+        now = time.monotonic()
+        if now - created_at >= self.max_age:
+            return False
+        # hdbcli exposes a local liveness flag that costs no round trip
+        is_connected = getattr(conn, 'isconnected', None)
+        if is_connected is not None and not is_connected():
+            return False
+        if self.ping_query and now - last_used >= self.ping_after:
+            try:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute(self.ping_query)
+                    cursor.fetchone()
+                finally:
+                    cursor.close()
+            except Exception:
+                return False
+        return True
+
+    def _discard(self, conn):
+        for cursor in self._statements.pop(id(conn), {}).values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
@@ -0,0 +1,122 @@
+import threading
+from cache import TTLCache
+from geolocation import format_location
+
+
+def attach_locations(items, geolocator, backfiller=None, ip_key='ip_address', location_key='location'):
+    """Fill in ``location_key`` on every dict in ``items`` that lacks one.
+
+    The distinct addresses on the page are resolved together with
+    GeoLocator.lookup_many and joined back, so a page of 50 attempts from
+    3 addresses costs at most one batched lookup. Newly resolved locations
+    are handed to ``backfiller`` so later reads find them stored.
+    """
+    pending = [item for item in items if not item.get(location_key) and item.get(ip_key)]
+    if not pending:
+        return items
+
+    locations = geolocator.lookup_many(item[ip_key] for item in pending)
+    resolved = {}
+    for item in pending:
+        location = locations.get(item[ip_key])
+        if location is None:
+            item[location_key] = None
+            continue
+        item[location_key] = resolved[item[ip_key]] = format_location(location)
+
+    if backfiller is not None and resolved:
+        backfiller.submit(resolved)
+    return items
+
+
+class LocationBackfiller:
+    """Background writer that stores resolved locations on their attempts.
+
+    ``write({ip_address: location})`` persists one batch, inside
+    ``app.app_context()`` when an app is given. Addresses written in the
+    last ``recent_ttl`` seconds are skipped, and at most ``max_pending``
+    addresses wait at once; beyond that submissions are dropped, since the
+    next read resolves them again anyway.
+    """
+
+    def __init__(self, write, app=None, max_pending=1024, interval=1.0, recent_size=4096, recent_ttl=3600):
+        self._write = write
+        self.app = app
+        self.max_pending = max_pending
+        self.interval = interval
+        self._recent = TTLCache(max_size=recent_size, ttl=recent_ttl)
+
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+
+        self._written = 0
+        self._batches = 0
+        self._failed_batches = 0
+        self._dropped = 0
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the writer thread and write out whatever is still pending"""
+        self._stopping.set()
+        self._wake.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+        self.flush()
+
+    def submit(self, locations):
+        with self._lock:
+            for ip_address, location in locations.items():
+                if ip_address in self._pending or self._recent.peek(ip_address)[0]:
+                    continue
+                if len(self._pending) >= self.max_pending:
+                    self._dropped += 1
+                    continue
+                self._pending[ip_address] = location
+        self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return
+        try:
+            if self.app is not None:
+                with self.app.app_context():
+                    self._write(batch)
+            else:
+                self._write(batch)
+        except Exception as e:
+            print(f"Error backfilling attempt locations: {str(e)}")
+            with self._lock:
+                self._failed_batches += 1
+            return
+        for ip_address in batch:
+            self._recent.put(ip_address, True)
+        with self._lock:
+            self._written += len(batch)
+            self._batches += 1
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': len(self._pending),
+                'written': self._written,
+                'batches': self._batches,
+                'failed_batches': self._failed_batches,
+                'dropped': self._dropped,
+                'running': self._thread is not None and self._thread.is_alive(),
+            }
@@ -0,0 +1,62 @@
+import base64
+import binascii
+import time
+
+
+class Evidence:
+    """One captured image as raw bytes plus its MIME type.
+
+    ``data`` may be bytes, bytearray or a memoryview and is not copied
+    here; ImageEncoder hands over the encoded bytes it produced. Base64 is
+    only produced or parsed at the JSON boundary (to_base64 /
+    from_data_url); the alert queue stores the bytes as a BLOB and mail
+    attachments take them as they are.
+    """
+
+    __slots__ = ('data', 'mime_type', 'filename', 'captured_at')
+
+    def __init__(self, data, mime_type, filename=None, captured_at=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.filename = filename or 'evidence.' + mime_type.split('/')[-1]
+        self.captured_at = captured_at or time.time()
+
+    @classmethod
+    def from_data_url(cls, value, mime_type, filename=None):
+        """Decode a base64 string or ``data:<type>;base64,`` URL from a JSON body; None if empty or invalid"""
+        if not value or not isinstance(value, str):
+            return None
+        header, sep, encoded = value.partition(',')
+        if not sep:
+            encoded = header
+        elif header.startswith('data:') and header[5:].split(';')[0] not in ('', mime_type):
+            mime_type = header[5:].split(';')[0]
+            if filename:
+                filename = filename.rsplit('.', 1)[0] + '.' + mime_type.split('/')[-1]
+        try:
+            data = base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError) as e:
+            print(f"Ignoring undecodable {mime_type} evidence: {str(e)}")
+            return None
+        return cls(data, mime_type, filename)
+
+    @property
+    def size(self):
+        return memoryview(self.data).nbytes
+
+    def to_base64(self):
+        return base64.b64encode(self.data).decode('ascii')
+
+    def to_data_url(self):
+        return f'data:{self.mime_type};base64,{self.to_base64()}'
+
+    def attach_to(self, message):
+        """Add as an attachment to an email.message.EmailMessage"""
+        maintype, _, subtype = self.mime_type.partition('/')
+        message.add_attachment(self.data, maintype=maintype, subtype=subtype, filename=self.filename)
+
+    def __bool__(self):
+        return self.size > 0
+
+    def __repr__(self):
+        return f'<Evidence {self.filename} {self.mime_type} {self.size} bytes>'
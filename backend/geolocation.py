@@ -0,0 +1,256 @@
+import ipaddress
+import json
+import os
+import threading
+import time
+from cache import TTLCache
+from http_client import HttpClient
+
+IP_API_FIELDS = 'status,message,country,regionName,city,timezone,isp,lat,lon'
+
+# ip-api.com accepts at most this many addresses per /batch request
+IP_API_BATCH_SIZE = 100
+
+# What callers get when an address cannot be located
+UNKNOWN_LOCATION = {
+    'city': 'Unknown',
+    'region': 'Unknown',
+    'state': 'Unknown',
+    'country': 'Unknown',
+    'timezone': 'Unknown',
+    'isp': 'Unknown',
+}
+
+
+class GeoLocator:
+    """IP geolocation from an offline range database, falling back to ip-api.com.
+
+    With a ``database`` (see ipdb.IPRangeDatabase) it answers first, in
+    microseconds and without the cache; ``http_fallback`` decides whether
+    addresses it does not cover go out to ip-api.com.
+
+    Results are kept in an LRU cache for ``ttl`` seconds and failed lookups
+    for ``negative_ttl``; concurrent misses on one IP share a single request.
+    Private and loopback addresses are never sent out. With ``persist_path``
+    the cache is written to a JSON file every ``persist_every`` lookups and
+    on close, and reloaded on start, so a restart does not re-query known
+    attackers. Follows the Flask extension pattern like LockoutEngine.
+    """
+
+    def __init__(self, app=None, cache_size=4096, ttl=86400, negative_ttl=300, client=None,
+                 persist_path=None, persist_every=50, database=None, http_fallback=True):
+        self.database = database
+        self.http_fallback = http_fallback
+        self.client = client
+        self.persist_path = persist_path
+        self.persist_every = persist_every
+        self.cache = TTLCache(max_size=cache_size, ttl=ttl, negative_ttl=negative_ttl)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._requests = 0
+        self._failures = 0
+        self._database_hits = 0
+        self._batch_requests = 0
+        if app is not None:
+            self.init_app(app)
+        else:
+            self._load()
+
+    def init_app(self, app):
+        config = app.config
+        self.client = app.extensions.get('http_client') or self.client
+        self.http_fallback = config.get('GEO_HTTP_FALLBACK', self.http_fallback)
+        if config.get('GEO_DATABASE_PATH'):
+            self.database = self._open_database(config['GEO_DATABASE_PATH'])
+        self.persist_path = config.get('GEO_CACHE_PATH', self.persist_path)
+        self.cache = TTLCache(max_size=config.get('GEO_CACHE_SIZE', self.cache.max_size),
+                              ttl=config.get('GEO_CACHE_TTL', self.cache.ttl),
+                              negative_ttl=config.get('GEO_NEGATIVE_TTL', self.cache.negative_ttl))
+        self._load()
+        app.extensions['geolocator'] = self
+
+    def lookup(self, ip_address):
+        """Location dict for ``ip_address``, or None if it cannot be located"""
+        if not ip_address or not self._is_public(ip_address):
+            return None
+        if self.database is not None:
+            location = self.database.lookup(ip_address)
+            if location is not None:
+                with self._lock:
+                    self._database_hits += 1
+                return location
+        if not self.http_fallback:
+            return None
+        return self.cache.get(ip_address, self._fetch)
+
+    def lookup_many(self, ip_addresses):
+        """{ip: location or None} for every distinct address in ``ip_addresses``.
+
+        Addresses the database and cache cannot answer are resolved together
+        with ip-api's batch endpoint (up to IP_API_BATCH_SIZE per request)
+        instead of one request each.
+        """
+        results = {}
+        missing = []
+        for ip_address in dict.fromkeys(ip_addresses):
+            if not ip_address or not self._is_public(ip_address):
+                results[ip_address] = None
+                continue
+            if self.database is not None:
+                location = self.database.lookup(ip_address)
+                if location is not None:
+                    with self._lock:
+                        self._database_hits += 1
+                    results[ip_address] = location
+                    continue
+            if not self.http_fallback:
+                results[ip_address] = None
+                continue
+            hit, location = self.cache.peek(ip_address)
+            if hit:
+                results[ip_address] = location
+            else:
+                missing.append(ip_address)
+
+        for i in range(0, len(missing), IP_API_BATCH_SIZE):
+            results.update(self._fetch_batch(missing[i:i + IP_API_BATCH_SIZE]))
+        return results
+
+    def _client(self):
+        if self.client is None:
+            self.client = HttpClient()
+            self.client.register('ip-api', 'http://ip-api.com')
+        return self.client
+
+    def _open_database(self, path):
+        from ipdb import IPRangeDatabase
+        try:
+            database = IPRangeDatabase.load(path)
+        except (OSError, ValueError) as e:
+            print(f"Geolocation database {path} unavailable, using HTTP only: {str(e)}")
+            return None
+        print(f"Loaded geolocation database {path}: {database.stats()}")
+        return database
+
+    def locate(self, ip_address):
+        """Like lookup, but falls back to UNKNOWN_LOCATION"""
+        return dict(self.lookup(ip_address) or UNKNOWN_LOCATION)
+
+    def describe(self, ip_address):
+        """One-line 'City, Region, Country' description"""
+        return format_location(self.lookup(ip_address))
+
+    def _is_public(self, ip_address):
+        try:
+            return ipaddress.ip_address(ip_address).is_global
+        except ValueError:
+            return False
+
+    def _fetch(self, ip_address):
+        with self._lock:
+            self._requests += 1
+        location = None
+        try:
+            data = self._client().get_json('ip-api', f'/json/{ip_address}', params={'fields': IP_API_FIELDS})
+            location = _parse(data)
+        except Exception as e:
+            print(f"Error getting IP location: {str(e)}")
+        self._fetched(1, 0 if location else 1)
+        return location
+
+    def _fetch_batch(self, ip_addresses):
+        with self._lock:
+            self._requests += 1
+            self._batch_requests += 1
+        results = dict.fromkeys(ip_addresses)
+        try:
+            response = self._client().post('ip-api', '/batch', params={'fields': IP_API_FIELDS + ',query'},
+                                           json=ip_addresses)
+            response.raise_for_status()
+            for data in response.json():
+                if data.get('query') in results:
+                    results[data['query']] = _parse(data)
+        except Exception as e:
+            # Not cached, so the next page retries them
+            print(f"Error getting IP locations: {str(e)}")
+            self._fetched(len(ip_addresses), len(ip_addresses))
+            return results
+
+        for ip_address, location in results.items():
+            self.cache.put(ip_address, location)
+        self._fetched(len(ip_addresses), sum(1 for location in results.values() if location is None))
+        return results
+
+    def _fetched(self, count, failures):
+        with self._lock:
+            self._failures += failures
+            self._unsaved += count
+            save = bool(self.persist_path) and self._unsaved >= self.persist_every
+            if save:
+                self._unsaved = 0
+        if save:
+            # Write in the background so the caller never waits on disk
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def _load(self):
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path) as f:
+                entries = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable geolocation cache {self.persist_path}: {str(e)}")
+            return
+        now = time.time()
+        for ip_address, location, expires_at in entries:
+            if expires_at > now:
+                self.cache.put(ip_address, location, expires_at - now)
+
+    def save(self):
+        """Write the cache to ``persist_path`` atomically"""
+        if not self.persist_path:
+            return
+        now = time.time()
+        entries = [(key, value, now + seconds_left) for key, value, seconds_left in self.cache.snapshot()]
+        directory = os.path.dirname(os.path.abspath(self.persist_path))
+        os.makedirs(directory, exist_ok=True)
+        staging = f'{self.persist_path}.{threading.get_ident()}.tmp'
+        try:
+            with open(staging, 'w') as f:
+                json.dump(entries, f)
+            os.replace(staging, self.persist_path)
+        except OSError as e:
+            print(f"Error saving geolocation cache: {str(e)}")
+
+    def stats(self):
+        stats = self.cache.stats()
+        with self._lock:
+            stats.update(requests=self._requests, failures=self._failures,
+                         persist_path=self.persist_path, database_hits=self._database_hits,
+                         batch_requests=self._batch_requests,
+                         http_fallback=self.http_fallback)
+        stats['database'] = self.database.stats() if self.database is not None else None
+        return stats
+
+
+def _parse(data):
+    if data.get('status') != 'success':
+        return None
+    return {
+        'city': data.get('city') or 'Unknown',
+        'region': data.get('regionName') or 'Unknown',
+        'state': data.get('regionName') or 'Unknown',
+        'country': data.get('country') or 'Unknown',
+        'timezone': data.get('timezone') or 'Unknown',
+        'isp': data.get('isp') or 'Unknown',
+        'lat': data.get('lat'),
+        'lon': data.get('lon'),
+    }
+
+
+def format_location(location):
+    """One-line 'City, Region, Country' for a location dict"""
+    if not location:
+        return 'Location not found'
+    return ', '.join(part for part in (location['city'], location['region'], location['country'])
+                     if part and part != 'Unknown')
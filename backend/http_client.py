@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# Status codes worth another try; anything else is returned to the caller
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpen(Exception):
+    """Raised without touching the network while an upstream's breaker is open"""
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failed calls and fails fast for
+    ``reset_timeout`` seconds, then lets a single trial call through
+    (half-open) and closes again if it succeeds."""
+
+    def __init__(self, threshold=5, reset_timeout=30.0):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial = False
+        self.opens = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                if self._opened_at is None or self._trial:
+                    self.opens += 1
+                self._opened_at = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        """End a half-open trial that produced no verdict, so the next call can try again"""
+        with self._lock:
+            self._trial = False
+
+
+class Endpoint:
+    def __init__(self, name, base_url, timeout=3.0, retries=2, backoff=0.2, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.calls = 0
+        self.failures = 0
+        self.retried = 0
+        self.rejected = 0
+
+    def count(self, calls=0, failures=0, retried=0, rejected=0):
+        # Counters share the breaker's lock; requests run on many threads
+        with self.breaker._lock:
+            self.calls += calls
+            self.failures += failures
+            self.retried += retried
+            self.rejected += rejected
+
+    def counters(self):
+        with self.breaker._lock:
+            return {'calls': self.calls, 'failures': self.failures, 'retried': self.retried,
+                    'rejected': self.rejected}
+
+
+class HttpClient:
+    """Shared outbound HTTP client for the third-party APIs the app calls.
+
+    One keep-alive ``requests.Session`` serves every endpoint. Each named
+    endpoint has its own base URL (so tests can point it at a local stub),
+    timeout, retry budget with full-jitter exponential backoff, and circuit
+    breaker. Follows the Flask extension pattern like LockoutEngine.
+    """
+
+    def __init__(self, app=None, pool_size=10):
+        self.pool_size = pool_size
+        self.endpoints = {}
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._public_ip = None
+        self._public_ip_lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.pool_size = config.get('HTTP_POOL_SIZE', self.pool_size)
+        options = {
+            'retries': config.get('HTTP_RETRIES', 2),
+            'backoff': config.get('HTTP_BACKOFF', 0.2),
+            'threshold': config.get('HTTP_BREAKER_THRESHOLD', 5),
+            'reset_timeout': config.get('HTTP_BREAKER_RESET', 30.0),
+        }
+        self.register('ip-api', config.get('IP_API_URL', 'http://ip-api.com'),
+                      timeout=config.get('GEO_TIMEOUT', 3.0), **options)
+        self.register('ipify', config.get('IPIFY_URL', 'https://api.ipify.org'),
+                      timeout=config.get('PUBLIC_IP_TIMEOUT', 3.0), **options)
+        app.extensions['http_client'] = self
+
+    def register(self, name, base_url, timeout=3.0, retries=2, backoff=0.2, threshold=5, reset_timeout=30.0):
+        self.endpoints[name] = Endpoint(name, base_url, timeout, retries, backoff,
+                                        CircuitBreaker(threshold, reset_timeout))
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    session = requests.Session()
+                    # Retries are ours (with jitter and the breaker), not urllib3's
+                    adapter = HTTPAdapter(pool_connections=len(self.endpoints) or 1,
+                                          pool_maxsize=self.pool_size, max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, name, path='', params=None):
+        """GET ``path`` on endpoint ``name``; raises CircuitOpen or the last requests error"""
+        return self.request('GET', name, path, params=params)
+
+    def post(self, name, path='', params=None, json=None):
+        return self.request('POST', name, path, params=params, json=json)
+
+    def request(self, method, name, path='', params=None, json=None):
+        endpoint = self.endpoints[name]
+        breaker = endpoint.breaker
+        if not breaker.allow():
+            endpoint.count(rejected=1)
+            raise CircuitOpen(f'{name} is unavailable')
+
+        endpoint.count(calls=1)
+        error = None
+        settled = False
+        try:
+            for attempt in range(endpoint.retries + 1):
+                if attempt:
+                    endpoint.count(retried=1)
+                    time.sleep(random.uniform(0, endpoint.backoff * 2 ** (attempt - 1)))
+                try:
+                    response = self.session.request(method, endpoint.base_url + path, params=params, json=json,
+                                                    timeout=endpoint.timeout)
+                except requests.RequestException as e:
+                    error = e
+                    continue
+                if response.status_code in RETRY_STATUSES:
+                    error = requests.HTTPError(f'{name} returned {response.status_code}', response=response)
+                    continue
+                breaker.record_success()
+                settled = True
+                return response
+
+            endpoint.count(failures=1)
+            breaker.record_failure()
+            settled = True
+            raise error
+        finally:
+            # Anything but a requests error (a bad payload, an interrupt) must not
+            # leave a half-open trial claimed forever
+            if not settled:
+                breaker.release()
+
+    def get_json(self, name, path='', params=None):
+        return self.get(name, path, params).json()
+
+    def public_ip(self):
+        """This host's public IP, fetched once per process; 127.0.0.1 if it cannot be found"""
+        if self._public_ip is None:
+            with self._public_ip_lock:
+                if self._public_ip is None:
+                    try:
+                        self._public_ip = self.get_json('ipify', params={'format': 'json'})['ip']
+                    except Exception as e:
+                        # Not memoized, so a later call can still succeed
+                        print(f"Error getting public IP: {str(e)}")
+                        return '127.0.0.1'
+        return self._public_ip
+
+    def stats(self):
+        return {
+            name: dict(
+                {
+                    'base_url': endpoint.base_url,
+                    'timeout': endpoint.timeout,
+                    'breaker': endpoint.breaker.state,
+                    'breaker_opens': endpoint.breaker.opens,
+                },
+                **endpoint.counters(),
+            )
+            for name, endpoint in self.endpoints.items()
+        }
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
@@ -0,0 +1,171 @@
+import threading
+import time
+from io import BytesIO
+from evidence import Evidence
+from lazy import LazyModule
+
+# Pillow is only needed once something is actually captured
+PIL_Image = LazyModule('PIL.Image')
+PIL_features = LazyModule('PIL.features')
+
+MIME_TYPES = {'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+
+# Quality is searched in steps of this size; finer steps buy little at these budgets
+QUALITY_STEP = 5
+# Never shrink below this many pixels on the long side
+MIN_DIMENSION = 320
+MAX_RESCALES = 4
+# libwebp effort (0-6): 2 is about 2.5x faster than the default 4 for a few percent more bytes
+WEBP_METHOD = 2
+
+
+class ImageEncoder:
+    """Encodes evidence images to fit a byte budget.
+
+    An image is first shrunk to fit ``max_width`` x ``max_height``. Then,
+    for each format in ``formats`` (WebP is skipped if this Pillow build
+    lacks it), the highest quality between ``min_quality`` and
+    ``max_quality`` that fits ``max_bytes`` is found by binary search. If
+    even the lowest quality is too large the image is downscaled in
+    proportion to the overshoot and searched again. The first format that
+    fits wins; if none does, the smallest result is used. Follows the
+    Flask extension pattern like LockoutEngine.
+    """
+
+    def __init__(self, app=None, max_bytes=300_000, max_width=1600, max_height=1600,
+                 formats=('webp', 'jpeg'), min_quality=30, max_quality=85):
+        self.max_bytes = max_bytes
+        self.max_width = max_width
+        self.max_height = max_height
+        self.formats = formats
+        self.min_quality = min_quality
+        self.max_quality = max_quality
+
+        self._lock = threading.Lock()
+        self._images = 0
+        self._encodes = 0
+        self._over_budget = 0
+        self._input_pixels = 0
+        self._output_bytes = 0
+        self._seconds = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.max_bytes = config.get('EVIDENCE_MAX_BYTES', self.max_bytes)
+        self.max_width = config.get('EVIDENCE_MAX_WIDTH', self.max_width)
+        self.max_height = config.get('EVIDENCE_MAX_HEIGHT', self.max_height)
+        self.formats = config.get('EVIDENCE_FORMATS', self.formats)
+        self.min_quality = config.get('EVIDENCE_MIN_QUALITY', self.min_quality)
+        self.max_quality = config.get('EVIDENCE_MAX_QUALITY', self.max_quality)
+        app.extensions['image_encoder'] = self
+
+    def encode(self, image, name='evidence'):
+        """Evidence named ``<name>.<ext>`` for a PIL image"""
+        started = time.perf_counter()
+        pixels = image.width * image.height
+        image = self._fit(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+
+        best = None
+        encodes = 0
+        for fmt in self._usable_formats():
+            data, count = self._encode_within_budget(image, fmt)
+            encodes += count
+            if best is None or len(data) < len(best[0]):
+                best = (data, fmt)
+            if len(data) <= self.max_bytes:
+                best = (data, fmt)
+                break
+
+        data, fmt = best
+        with self._lock:
+            self._images += 1
+            self._encodes += encodes
+            self._input_pixels += pixels
+            self._output_bytes += len(data)
+            self._seconds += time.perf_counter() - started
+            if len(data) > self.max_bytes:
+                self._over_budget += 1
+        return Evidence(data, MIME_TYPES[fmt], f'{name}.{EXTENSIONS[fmt]}')
+
+    def encode_bgr(self, frame, name='evidence'):
+        """Like encode, for an OpenCV BGR frame"""
+        return self.encode(PIL_Image.fromarray(frame[:, :, ::-1]), name)
+
+    def _usable_formats(self):
+        formats = [fmt.lower() for fmt in self.formats if fmt.lower() in MIME_TYPES]
+        if 'webp' in formats and not PIL_features.check('webp'):
+            formats.remove('webp')
+        return formats or ['jpeg']
+
+    def _fit(self, image):
+        scale = min(1.0, self.max_width / image.width, self.max_height / image.height)
+        if scale >= 1.0:
+            return image
+        return self._resize(image, scale)
+
+    def _resize(self, image, scale):
+        size = (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+        # reducing_gap lets Pillow shrink by whole factors first, which is much faster
+        return image.resize(size, PIL_Image.BILINEAR, reducing_gap=2.0)
+
+    def _save(self, image, fmt, quality):
+        buffer = BytesIO()
+        if fmt == 'png':
+            image.save(buffer, format='PNG', optimize=False)
+        elif fmt == 'webp':
+            image.save(buffer, format='WEBP', quality=quality, method=WEBP_METHOD)
+        else:
+            image.save(buffer, format=fmt.upper(), quality=quality)
+        return buffer.getvalue()
+
+    def _encode_within_budget(self, image, fmt):
+        """(data, encodes) at the best quality and scale that fit the budget, or the smallest tried"""
+        encodes = 0
+        for _ in range(MAX_RESCALES + 1):
+            data = self._save(image, fmt, self.max_quality)
+            encodes += 1
+            if len(data) <= self.max_bytes or fmt == 'png':
+                return data, encodes
+
+            # Highest quality step that fits: binary search over [min_quality, max_quality)
+            low, high = 0, (self.max_quality - self.min_quality) // QUALITY_STEP - 1
+            best = None
+            while low <= high:
+                mid = (low + high) // 2
+                candidate = self._save(image, fmt, self.min_quality + mid * QUALITY_STEP)
+                encodes += 1
+                if len(candidate) <= self.max_bytes:
+                    best = candidate
+                    low = mid + 1
+                else:
+                    data = candidate
+                    high = mid - 1
+            if best is not None:
+                return best, encodes
+
+            # Even the lowest quality is over budget (``data`` now holds it): shrink and retry
+            if max(image.width, image.height) <= MIN_DIMENSION:
+                return data, encodes
+            scale = max((self.max_bytes / len(data)) ** 0.5 * 0.9,
+                        MIN_DIMENSION / max(image.width, image.height))
+            image = self._resize(image, scale)
+        return data, encodes
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_bytes': self.max_bytes,
+                'max_size': [self.max_width, self.max_height],
+                'formats': list(self.formats),
+                'images': self._images,
+                'encodes': self._encodes,
+                'over_budget': self._over_budget,
+                'avg_bytes': round(self._output_bytes / self._images) if self._images else 0,
+                'avg_ms': round(self._seconds / self._images * 1000, 2) if self._images else 0.0,
+                'avg_input_megapixels': round(self._input_pixels / self._images / 1e6, 2) if self._images else 0.0,
+            }
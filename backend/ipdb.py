@@ -0,0 +1,185 @@
+import csv
+import ipaddress
+from array import array
+from bisect import bisect_right
+
+# Header names accepted for each field; the aliases cover the DB-IP lite CSVs
+COLUMN_ALIASES = {
+    'start': ('start', 'start_ip', 'ip_start', 'network_start'),
+    'end': ('end', 'end_ip', 'ip_end', 'network_end'),
+    'country': ('country', 'country_name', 'country_code'),
+    'region': ('region', 'stateprov', 'state', 'subdivision'),
+    'city': ('city',),
+    'timezone': ('timezone', 'time_zone'),
+    'isp': ('isp', 'organization', 'asn_org'),
+    'lat': ('lat', 'latitude'),
+    'lon': ('lon', 'longitude'),
+}
+
+# Column order assumed for a CSV without a header row
+DEFAULT_COLUMNS = ('start', 'end', 'country', 'region', 'city', 'timezone', 'isp')
+# The headerless DB-IP city lite layout, recognised by its continent code column
+DBIP_CITY_COLUMNS = ('start', 'end', 'continent', 'country', 'region', 'city', 'lat', 'lon')
+CONTINENT_CODES = {'AF', 'AN', 'AS', 'EU', 'NA', 'OC', 'SA'}
+
+_MASK64 = (1 << 64) - 1
+
+
+class IPRangeDatabase:
+    """Offline IP-to-location table searched with binary search.
+
+    Ranges are kept in compact typed arrays: IPv4 starts and ends as uint32,
+    IPv6 as (high, low) uint64 pairs, each with an index into a deduplicated
+    list of location tuples. A lookup is one bisect plus one range check,
+    a few microseconds with no network. Ranges must not overlap.
+    """
+
+    def __init__(self):
+        self._v4_starts = array('I')
+        self._v4_ends = array('I')
+        self._v4_locations = array('I')
+        self._v6_start_hi = array('Q')
+        self._v6_start_lo = array('Q')
+        self._v6_end_hi = array('Q')
+        self._v6_end_lo = array('Q')
+        self._v6_locations = array('I')
+        self._locations = []
+        self.path = None
+
+    @classmethod
+    def load(cls, path):
+        """Build a database from a CSV of start,end ranges plus location columns"""
+        db = cls()
+        db.path = path
+        index = {}
+        v4 = []
+        v6 = []
+        with open(path, newline='', encoding='utf-8') as f:
+            rows = csv.reader(f)
+            first = next(rows, None)
+            if first is None:
+                return db
+            columns = db._columns(first)
+            if columns is None:
+                columns = {name: i for i, name in enumerate(_headerless_layout(first))}
+                rows = _chain(first, rows)
+
+            for row in rows:
+                if not row or row[0].startswith('#'):
+                    continue
+                start = ipaddress.ip_address(row[columns['start']].strip())
+                end = ipaddress.ip_address(row[columns['end']].strip())
+                location = tuple(_field(row, columns, name) for name in ('country', 'region', 'city', 'timezone', 'isp'))
+                location += (_number(row, columns, 'lat'), _number(row, columns, 'lon'))
+                slot = index.get(location)
+                if slot is None:
+                    slot = index[location] = len(db._locations)
+                    db._locations.append(location)
+                (v4 if start.version == 4 else v6).append((int(start), int(end), slot))
+
+        v4.sort()
+        v6.sort()
+        for start, end, slot in v4:
+            db._v4_starts.append(start)
+            db._v4_ends.append(end)
+            db._v4_locations.append(slot)
+        for start, end, slot in v6:
+            db._v6_start_hi.append(start >> 64)
+            db._v6_start_lo.append(start & _MASK64)
+            db._v6_end_hi.append(end >> 64)
+            db._v6_end_lo.append(end & _MASK64)
+            db._v6_locations.append(slot)
+        return db
+
+    @staticmethod
+    def _columns(header):
+        names = [cell.strip().lower() for cell in header]
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for alias in aliases:
+                if alias in names:
+                    columns[field] = names.index(alias)
+                    break
+        if 'start' not in columns or 'end' not in columns:
+            return None
+        return columns
+
+    def lookup(self, ip_address):
+        """Location dict for ``ip_address``, or None if no range covers it"""
+        try:
+            address = ipaddress.ip_address(ip_address)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if address.version == 4:
+            value = int(address)
+            i = bisect_right(self._v4_starts, value) - 1
+            if i < 0 or value > self._v4_ends[i]:
+                return None
+            return self._location(self._v4_locations[i])
+
+        value = int(address)
+        hi, lo = value >> 64, value & _MASK64
+        i = self._bisect_v6(hi, lo) - 1
+        if i < 0 or (hi, lo) > (self._v6_end_hi[i], self._v6_end_lo[i]):
+            return None
+        return self._location(self._v6_locations[i])
+
+    def _bisect_v6(self, hi, lo):
+        """bisect_right over the (high, low) start pairs"""
+        low, high = 0, len(self._v6_start_hi)
+        while low < high:
+            mid = (low + high) // 2
+            if (hi, lo) < (self._v6_start_hi[mid], self._v6_start_lo[mid]):
+                high = mid
+            else:
+                low = mid + 1
+        return low
+
+    def _location(self, slot):
+        country, region, city, timezone, isp, lat, lon = self._locations[slot]
+        return {
+            'city': city or 'Unknown',
+            'region': region or 'Unknown',
+            'state': region or 'Unknown',
+            'country': country or 'Unknown',
+            'timezone': timezone or 'Unknown',
+            'isp': isp or 'Unknown',
+            'lat': lat,
+            'lon': lon,
+        }
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'ipv4_ranges': len(self._v4_starts),
+            'ipv6_ranges': len(self._v6_start_hi),
+            'locations': len(self._locations),
+        }
+
+
+def _headerless_layout(row):
+    if len(row) == len(DBIP_CITY_COLUMNS) and row[2].strip().upper() in CONTINENT_CODES:
+        return DBIP_CITY_COLUMNS
+    return DEFAULT_COLUMNS
+
+
+def _chain(first, rows):
+    yield first
+    yield from rows
+
+
+def _field(row, columns, name):
+    i = columns.get(name)
+    if i is None or i >= len(row):
+        return None
+    return row[i].strip() or None
+
+
+def _number(row, columns, name):
+    value = _field(row, columns, name)
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
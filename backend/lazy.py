@@ -0,0 +1,72 @@
+import importlib
+import threading
+import time
+
+# Seconds each lazily imported module took to load, in load order
+IMPORT_TIMES = {}
+
+_lock = threading.RLock()
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access.
+
+    ``psutil = LazyModule('psutil')`` keeps call sites unchanged while
+    moving the import cost (and any ImportError) to the first real use.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            with _lock:
+                if self._module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    IMPORT_TIMES[self._name] = time.perf_counter() - started
+                    self._module = module
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def available(self):
+        """True if the module can be imported on this host"""
+        try:
+            self._load()
+            return True
+        except Exception:
+            # pyautogui and friends raise more than ImportError without a display
+            return False
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f'<LazyModule {self._name} ({state})>'
+
+
+class LazyObject:
+    """Proxy that builds its target with ``factory()`` on first attribute access"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._target = None
+
+    def _get(self):
+        if self._target is None:
+            with _lock:
+                if self._target is None:
+                    self._target = self._factory()
+        return self._target
+
+    @property
+    def loaded(self):
+        return self._target is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._get(), attr)
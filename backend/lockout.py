@@ -0,0 +1,168 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class MemoryLockoutBackend:
+    """In-process failure counters: one small ring buffer of timestamps per key.
+
+    Each ring only keeps the newest ``capacity`` timestamps, which is all a
+    threshold check needs. Keys with nothing left inside the window are
+    evicted by a sweep that runs at most once per window.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rings = {}
+        self._last_sweep = 0.0
+
+    def add(self, key, now, window, capacity):
+        with self._lock:
+            ring = self._rings.get(key)
+            if ring is None or ring.maxlen != capacity:
+                ring = self._rings[key] = deque(ring or (), maxlen=capacity)
+            ring.append(now)
+            count = self._count(ring, now, window)
+            if now - self._last_sweep >= window:
+                self._sweep(now, window)
+            return count
+
+    def count(self, key, now, window):
+        with self._lock:
+            ring = self._rings.get(key)
+            return self._count(ring, now, window) if ring else 0
+
+    def reset(self, key):
+        with self._lock:
+            self._rings.pop(key, None)
+
+    def size(self):
+        with self._lock:
+            return len(self._rings)
+
+    def _count(self, ring, now, window):
+        cutoff = now - window
+        # Timestamps are appended in order, so expired ones sit at the left
+        while ring and ring[0] <= cutoff:
+            ring.popleft()
+        return len(ring)
+
+    def _sweep(self, now, window):
+        cutoff = now - window
+        for key in [key for key, ring in self._rings.items() if not ring or ring[-1] <= cutoff]:
+            del self._rings[key]
+        self._last_sweep = now
+
+
+class SQLiteLockoutBackend:
+    """Failure counters in a SQLite file shared by every worker on the host"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._last_sweep = 0.0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('CREATE TABLE IF NOT EXISTS lockout_failures (key TEXT NOT NULL, ts REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_lockout_failures_key_ts ON lockout_failures (key, ts)')
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def add(self, key, now, window, capacity):
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT INTO lockout_failures (key, ts) VALUES (?, ?)', (key, now))
+            conn.execute('DELETE FROM lockout_failures WHERE key = ? AND ts <= ?', (key, now - window))
+            count = conn.execute('SELECT COUNT(*) FROM lockout_failures WHERE key = ?', (key,)).fetchone()[0]
+            if now - self._last_sweep >= window:
+                conn.execute('DELETE FROM lockout_failures WHERE ts <= ?', (now - window,))
+                self._last_sweep = now
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return min(count, capacity)
+
+    def count(self, key, now, window):
+        return self._conn().execute(
+            'SELECT COUNT(*) FROM lockout_failures WHERE key = ? AND ts > ?', (key, now - window)
+        ).fetchone()[0]
+
+    def reset(self, key):
+        self._conn().execute('DELETE FROM lockout_failures WHERE key = ?', (key,))
+
+    def size(self):
+        return self._conn().execute('SELECT COUNT(DISTINCT key) FROM lockout_failures').fetchone()[0]
+
+
+class LockoutEngine:
+    """Sliding-window lockout keyed by username and by client IP.
+
+    A username is locked once it collects ``threshold`` failures inside
+    ``window`` seconds; an IP once it collects ``ip_threshold``. Follows the
+    Flask extension pattern so both apps can configure it from app.config.
+    """
+
+    def __init__(self, app=None, backend=None, threshold=3, ip_threshold=20, window=900):
+        self.backend = backend or MemoryLockoutBackend()
+        self.threshold = threshold
+        self.ip_threshold = ip_threshold
+        self.window = window
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.threshold = config.get('LOCKOUT_THRESHOLD', self.threshold)
+        self.ip_threshold = config.get('LOCKOUT_IP_THRESHOLD', self.ip_threshold)
+        self.window = config.get('LOCKOUT_WINDOW', self.window)
+        if config.get('LOCKOUT_BACKEND', 'memory') == 'sqlite':
+            self.backend = SQLiteLockoutBackend(config['LOCKOUT_SQLITE_PATH'])
+        app.extensions['lockout'] = self
+
+    def _keys(self, username, ip_address):
+        keys = []
+        if username:
+            keys.append((f'user:{username}', self.threshold))
+        if ip_address:
+            keys.append((f'ip:{ip_address}', self.ip_threshold))
+        return keys
+
+    def remaining(self, username, ip_address=None):
+        """Failures left before the username or the IP is locked"""
+        now = time.time()
+        return min((limit - self.backend.count(key, now, self.window)
+                    for key, limit in self._keys(username, ip_address)), default=self.threshold)
+
+    def is_locked(self, username, ip_address=None):
+        return self.remaining(username, ip_address) <= 0
+
+    def record_failure(self, username, ip_address=None):
+        """Count a failed attempt and return the failures left afterwards"""
+        now = time.time()
+        return min((limit - self.backend.add(key, now, self.window, limit)
+                    for key, limit in self._keys(username, ip_address)), default=self.threshold)
+
+    def reset(self, username):
+        """Clear a username's failures after a successful login"""
+        self.backend.reset(f'user:{username}')
+
+    def stats(self):
+        return {
+            'backend': type(self.backend).__name__,
+            'threshold': self.threshold,
+            'ip_threshold': self.ip_threshold,
+            'window': self.window,
+            'tracked_keys': self.backend.size(),
+        }
@@ -0,0 +1,27 @@
+# Outcome of a login check (see credentials.authenticate). Passwords are
+# salted hashes verified in Python, so HANA cannot judge a login itself.
+# LOGIN_LOOKUP instead fetches the hash and provisionally records the
+# attempt as a failure in the same call; a login that turns out to be
+# correct deletes that row again. A failed login thus costs one round trip
+# instead of a SELECT followed by an INSERT.
+
+LOGIN_UNKNOWN_USER = 0
+LOGIN_OK = 1
+LOGIN_BAD_PASSWORD = 2
+
+LOGIN_LOOKUP_CALL = 'CALL LOGIN_LOOKUP(?, ?, ?, ?)'
+
+
+def lookup_login(cursor, username, ip_address, timestamp, record=True):
+    """Run LOGIN_LOOKUP and return (password, email, attempt_id), or None for an unknown user.
+
+    ``cursor`` should be a statement-cached cursor (see
+    ConnectionPool.statement) so the CALL is only prepared once per
+    connection. Relies on autocommit for the INSERT. attempt_id is the
+    provisional failed attempt, None when ``record`` is false.
+    """
+    cursor.execute(LOGIN_LOOKUP_CALL, (username, ip_address, timestamp, 1 if record else 0))
+    row = cursor.fetchone()
+    if row is None or row[0] is None:
+        return None
+    return row[0], row[1], row[2]
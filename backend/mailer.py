@@ -0,0 +1,230 @@
+import smtplib
+import ssl
+import threading
+import time
+
+
+class MailerBusy(Exception):
+    """Raised when no SMTP session frees up within the pool timeout"""
+
+
+def is_permanent(error):
+    """True for SMTP failures a retry cannot fix: 5xx replies and refused recipients"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+class _Session:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.last_used = time.monotonic()
+
+
+class SMTPSessionPool:
+    """Keeps authenticated SMTP connections open between messages.
+
+    Connecting, STARTTLS and AUTH happen once per session instead of once
+    per email. A session idle for ``noop_after`` seconds is checked with
+    NOOP before reuse, and one idle past ``idle_timeout`` (servers drop
+    quiet clients) is closed and replaced. If the server hangs up mid-send
+    the message is retried once on a fresh connection. At most ``size``
+    sessions are open at a time. Follows the Flask extension pattern like
+    LockoutEngine; point MAIL_SERVER/MAIL_PORT at a local stand-in such as
+    aiosmtpd to exercise it without a real mail server.
+    """
+
+    def __init__(self, app=None, host='localhost', port=25, username=None, password=None, use_tls=False,
+                 use_ssl=False, size=2, timeout=10.0, noop_after=30.0, idle_timeout=120.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.use_ssl = use_ssl
+        self.size = size
+        self.timeout = timeout
+        self.noop_after = noop_after
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._in_use = 0
+
+        self._connects = 0
+        self._reuses = 0
+        self._noops = 0
+        self._stale = 0
+        self._reconnects = 0
+        self._sent = 0
+        self._failed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.host = config.get('MAIL_SERVER') or self.host
+        self.port = config.get('MAIL_PORT', self.port)
+        self.username = config.get('MAIL_USERNAME', self.username)
+        self.password = config.get('MAIL_PASSWORD', self.password)
+        self.use_tls = config.get('MAIL_USE_TLS', self.use_tls)
+        self.use_ssl = config.get('MAIL_USE_SSL', self.use_ssl)
+        self.size = config.get('MAIL_POOL_SIZE', self.size)
+        self.timeout = config.get('MAIL_TIMEOUT', self.timeout)
+        self.noop_after = config.get('MAIL_NOOP_AFTER', self.noop_after)
+        self.idle_timeout = config.get('MAIL_IDLE_TIMEOUT', self.idle_timeout)
+        self._slots = threading.BoundedSemaphore(self.size)
+        app.extensions['smtp_sessions'] = self
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout,
+                                    context=ssl.create_default_context())
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls(context=ssl.create_default_context())
+            if self.username:
+                smtp.login(self.username, self.password)
+        except Exception:
+            _close(smtp)
+            raise
+        with self._lock:
+            self._connects += 1
+        return _Session(smtp)
+
+    def _checkout(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise MailerBusy(f'no SMTP session free within {self.timeout}s')
+        try:
+            while True:
+                with self._lock:
+                    # Most recently used first, so surplus sessions age out
+                    session = self._idle.pop() if self._idle else None
+                if session is None:
+                    session = self._connect()
+                    break
+                idle = time.monotonic() - session.last_used
+                if idle < self.noop_after or (idle < self.idle_timeout and self._healthy(session)):
+                    with self._lock:
+                        self._reuses += 1
+                    break
+                _close(session.smtp)
+                with self._lock:
+                    self._stale += 1
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use += 1
+        return session
+
+    def _healthy(self, session):
+        with self._lock:
+            self._noops += 1
+        try:
+            return session.smtp.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _checkin(self, session, broken=False):
+        if broken:
+            _close(session.smtp)
+        else:
+            session.last_used = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            if not broken:
+                self._idle.append(session)
+        self._slots.release()
+
+    def send(self, message):
+        """Send one email.message.Message; raises what smtplib raised"""
+        error = self.send_many([message])[0]
+        if error is not None:
+            raise error
+
+    def send_many(self, messages):
+        """Send every message over one session; returns an error (or None) per message"""
+        results = []
+        session = self._checkout()
+        broken = False
+        try:
+            for message in messages:
+                if broken:
+                    results.append(smtplib.SMTPServerDisconnected('connection lost before sending'))
+                    continue
+                try:
+                    session.smtp.send_message(message)
+                    results.append(None)
+                    continue
+                except smtplib.SMTPServerDisconnected:
+                    pass
+                except smtplib.SMTPException as e:
+                    results.append(e)
+                    continue
+                except OSError:
+                    pass
+
+                # The connection dropped; retry this message once on a new one
+                _close(session.smtp)
+                with self._lock:
+                    self._reconnects += 1
+                try:
+                    session = self._connect()
+                except (smtplib.SMTPException, OSError) as e:
+                    results.append(e)
+                    broken = True
+                    continue
+                try:
+                    session.smtp.send_message(message)
+                    results.append(None)
+                except smtplib.SMTPServerDisconnected as e:
+                    results.append(e)
+                    broken = True
+                except smtplib.SMTPException as e:
+                    # Rejected by a healthy session (e.g. refused recipients): only this message fails
+                    results.append(e)
+                except OSError as e:
+                    # SMTPException subclasses OSError, so socket errors are caught last
+                    results.append(e)
+                    broken = True
+        finally:
+            self._checkin(session, broken)
+
+        failed = sum(1 for error in results if error is not None)
+        with self._lock:
+            self._sent += len(results) - failed
+            self._failed += failed
+        return results
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for session in idle:
+            _close(session.smtp)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'server': f'{self.host}:{self.port}',
+                'size': self.size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'connects': self._connects,
+                'reuses': self._reuses,
+                'noops': self._noops,
+                'stale_closed': self._stale,
+                'reconnects': self._reconnects,
+                'sent': self._sent,
+                'failed': self._failed,
+            }
+
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except (smtplib.SMTPException, OSError):
+        smtp.close()
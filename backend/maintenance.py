@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+
+class AttemptMaintenance:
+    """Background job that keeps LOGIN_ATTEMPTS bounded.
+
+    Every ``interval`` seconds raw attempts older than ``retention_days``
+    are folded into LOGIN_ATTEMPTS_HOURLY and deleted, ``batch_size`` rows
+    per transaction with a short ``pause`` between batches so the job never
+    holds locks or the pool for long.
+
+    With an ``archive`` (see archive.ColdArchive) the raw rows are exported
+    before they are deleted, and ``archive_alerts(cutoff, batch_size)`` is
+    called the same way to move SecurityAlert rows older than
+    ``alert_retention_days``.
+    """
+
+    def __init__(self, storage, retention_days, batch_size=1000, interval=3600, pause=0.05,
+                 archive=None, archive_alerts=None, alert_retention_days=0):
+        self.storage = storage
+        self.retention_days = retention_days
+        self.archive = archive
+        self.archive_alerts = archive_alerts
+        self.alert_retention_days = alert_retention_days
+        self.batch_size = batch_size
+        self.interval = interval
+        self.pause = pause
+
+        self._stopping = threading.Event()
+        self._thread = None
+        self._runs = 0
+        self._rolled_up = 0
+        self._alerts_archived = 0
+        self._last_run = None
+        self._last_error = None
+
+    def cutoff(self, now=None, days=None):
+        """Start of the oldest hour that is still kept as raw rows"""
+        now = now or datetime.now()
+        days = self.retention_days if days is None else days
+        return (now - timedelta(days=days)).replace(minute=0, second=0, microsecond=0)
+
+    def run_once(self, now=None):
+        """Roll up everything past the retention window; returns rows rolled up"""
+        archive = self._archive_attempts if self.archive else None
+        total = self._in_batches(
+            lambda cutoff, size: self.storage.roll_up_attempts(cutoff, size, archive=archive),
+            self.cutoff(now))
+        if self.archive_alerts and self.alert_retention_days > 0:
+            self._alerts_archived += self._in_batches(
+                self.archive_alerts, self.cutoff(now, self.alert_retention_days))
+        self._runs += 1
+        self._rolled_up += total
+        self._last_run = datetime.now()
+        return total
+
+    def _in_batches(self, step, cutoff):
+        total = 0
+        while not self._stopping.is_set():
+            done = step(cutoff, self.batch_size)
+            total += done
+            if done < self.batch_size:
+                break
+            time.sleep(self.pause)
+        return total
+
+    def _archive_attempts(self, rows):
+        self.archive.write('login_attempts', rows)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        if self._thread and self._thread.is_alive():
+            self._thread.join()
+
+    def stats(self):
+        return {
+            'retention_days': self.retention_days,
+            'runs': self._runs,
+            'rolled_up': self._rolled_up,
+            'alerts_archived': self._alerts_archived,
+            'last_run': self._last_run.isoformat() if self._last_run else None,
+            'last_error': self._last_error,
+        }
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                rolled = self.run_once()
+                self._last_error = None
+                if rolled:
+                    print(f"Rolled up {rolled} login attempts older than {self.cutoff().isoformat()}")
+            except Exception as e:
+                self._last_error = str(e)
+                print(f"Error rolling up login attempts: {str(e)}")
+            self._stopping.wait(self.interval)
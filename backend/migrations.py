@@ -0,0 +1,293 @@
+# HANA error codes that mean "this object is already there"; they let the
+# baseline migrations adopt tables created before versioning existed and
+# let two workers race through startup safely.
+ERR_INVALID_TABLE = 259
+ERR_DUPLICATE_TABLE = 288
+ERR_DUPLICATE_INDEX = 289
+ERR_UNIQUE_VIOLATION = 301
+
+# CHECK_LOGIN as migrations 4 and 5 installed it. It compared plaintext
+# passwords and is dropped by migration 10; both versions are kept verbatim
+# so fresh databases replay the same history.
+_CHECK_LOGIN_V4 = """
+    CREATE OR REPLACE PROCEDURE CHECK_LOGIN (
+        IN P_USERNAME NVARCHAR(100),
+        IN P_PASSWORD NVARCHAR(100),
+        IN P_IP_ADDRESS NVARCHAR(45),
+        IN P_MAX_ATTEMPTS INTEGER,
+        IN P_RECORD INTEGER
+    )
+    LANGUAGE SQLSCRIPT AS
+    BEGIN
+        DECLARE V_PASSWORD NVARCHAR(100);
+        DECLARE V_EMAIL NVARCHAR(100);
+        DECLARE V_FAILED INTEGER := 0;
+        DECLARE V_STATUS INTEGER := 0;
+        DECLARE V_REMAINING INTEGER := NULL;
+
+        -- MAX() turns a missing user into NULLs instead of a NO_DATA_FOUND error
+        SELECT MAX(PASSWORD), MAX(EMAIL) INTO V_PASSWORD, V_EMAIL
+            FROM USERS WHERE USERNAME = :P_USERNAME;
+
+        IF :V_PASSWORD IS NULL THEN
+            V_STATUS := 0;
+            V_EMAIL := NULL;
+        ELSEIF :V_PASSWORD = :P_PASSWORD THEN
+            V_STATUS := 1;
+        ELSE
+            SELECT COUNT(*) INTO V_FAILED FROM LOGIN_ATTEMPTS
+                WHERE USERNAME = :P_USERNAME AND SUCCESS = FALSE;
+            IF :P_RECORD = 1 THEN
+                INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS)
+                    VALUES (:P_USERNAME, FALSE, :P_IP_ADDRESS);
+            END IF;
+            V_STATUS := 2;
+            V_EMAIL := NULL;
+            V_REMAINING := :P_MAX_ATTEMPTS - :V_FAILED;
+        END IF;
+
+        SELECT :V_STATUS AS STATUS, :V_EMAIL AS EMAIL, :V_REMAINING AS REMAINING FROM DUMMY;
+    END
+"""
+
+_CHECK_LOGIN_V5 = """
+    CREATE OR REPLACE PROCEDURE CHECK_LOGIN (
+        IN P_USERNAME NVARCHAR(100),
+        IN P_PASSWORD NVARCHAR(100),
+        IN P_IP_ADDRESS NVARCHAR(45),
+        IN P_RECORD INTEGER
+    )
+    LANGUAGE SQLSCRIPT AS
+    BEGIN
+        DECLARE V_PASSWORD NVARCHAR(100);
+        DECLARE V_EMAIL NVARCHAR(100);
+        DECLARE V_STATUS INTEGER := 0;
+
+        -- MAX() turns a missing user into NULLs instead of a NO_DATA_FOUND error
+        SELECT MAX(PASSWORD), MAX(EMAIL) INTO V_PASSWORD, V_EMAIL
+            FROM USERS WHERE USERNAME = :P_USERNAME;
+
+        IF :V_PASSWORD IS NULL THEN
+            V_STATUS := 0;
+            V_EMAIL := NULL;
+        ELSEIF :V_PASSWORD = :P_PASSWORD THEN
+            V_STATUS := 1;
+        ELSE
+            IF :P_RECORD = 1 THEN
+                INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS)
+                    VALUES (:P_USERNAME, FALSE, :P_IP_ADDRESS);
+            END IF;
+            V_STATUS := 2;
+            V_EMAIL := NULL;
+        END IF;
+
+        SELECT :V_STATUS AS STATUS, :V_EMAIL AS EMAIL FROM DUMMY;
+    END
+"""
+
+# Fetches a user's hash and email and, for a known user, records the attempt
+# as failed; see login_check.lookup_login.
+_LOGIN_LOOKUP_V11 = """
+    CREATE OR REPLACE PROCEDURE LOGIN_LOOKUP (
+        IN P_USERNAME NVARCHAR(100),
+        IN P_IP_ADDRESS NVARCHAR(45),
+        IN P_TIMESTAMP TIMESTAMP,
+        IN P_RECORD INTEGER
+    )
+    LANGUAGE SQLSCRIPT AS
+    BEGIN
+        DECLARE V_PASSWORD NVARCHAR(255);
+        DECLARE V_EMAIL NVARCHAR(100);
+        DECLARE V_ATTEMPT_ID INTEGER := NULL;
+
+        -- MAX() turns a missing user into NULLs instead of a NO_DATA_FOUND error
+        SELECT MAX(PASSWORD), MAX(EMAIL) INTO V_PASSWORD, V_EMAIL
+            FROM USERS WHERE USERNAME = :P_USERNAME;
+
+        IF :V_PASSWORD IS NOT NULL AND :P_RECORD = 1 THEN
+            INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP)
+                VALUES (:P_USERNAME, FALSE, :P_IP_ADDRESS, :P_TIMESTAMP);
+            SELECT CURRENT_IDENTITY_VALUE() INTO V_ATTEMPT_ID FROM DUMMY;
+        END IF;
+
+        SELECT :V_PASSWORD AS PASSWORD, :V_EMAIL AS EMAIL, :V_ATTEMPT_ID AS ATTEMPT_ID FROM DUMMY;
+    END
+"""
+
+# (version, description, statements). Append only; never edit an applied entry.
+MIGRATIONS = [
+    (1, 'Create USERS', [
+        """
+        CREATE TABLE USERS (
+            USERNAME NVARCHAR(100) PRIMARY KEY,
+            PASSWORD NVARCHAR(100) NOT NULL,
+            EMAIL NVARCHAR(100) NOT NULL
+        )
+        """,
+    ]),
+    (2, 'Create LOGIN_ATTEMPTS', [
+        """
+        CREATE TABLE LOGIN_ATTEMPTS (
+            ID INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            USERNAME NVARCHAR(100) NOT NULL,
+            SUCCESS BOOLEAN NOT NULL,
+            IP_ADDRESS NVARCHAR(45),
+            TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (3, 'Index LOGIN_ATTEMPTS for lockout counts and listings', [
+        'CREATE INDEX IDX_LOGIN_ATTEMPTS_USER ON LOGIN_ATTEMPTS (USERNAME, SUCCESS, TIMESTAMP)',
+        'CREATE INDEX IDX_LOGIN_ATTEMPTS_TIME ON LOGIN_ATTEMPTS (TIMESTAMP, ID)',
+        'CREATE INDEX IDX_LOGIN_ATTEMPTS_IP ON LOGIN_ATTEMPTS (IP_ADDRESS, TIMESTAMP)',
+    ]),
+    (4, 'Create CHECK_LOGIN procedure', [
+        _CHECK_LOGIN_V4,
+    ]),
+    (5, 'Drop the failure COUNT from CHECK_LOGIN', [
+        _CHECK_LOGIN_V5,
+    ]),
+    (6, 'Create LOGIN_ATTEMPTS_HOURLY rollups', [
+        """
+        CREATE TABLE LOGIN_ATTEMPTS_HOURLY (
+            ID INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+            USERNAME NVARCHAR(100) NOT NULL,
+            IP_ADDRESS NVARCHAR(45) NOT NULL,
+            SUCCESS BOOLEAN NOT NULL,
+            HOUR TIMESTAMP NOT NULL,
+            ATTEMPTS INTEGER NOT NULL,
+            UNIQUE (USERNAME, IP_ADDRESS, SUCCESS, HOUR)
+        )
+        """,
+        'CREATE INDEX IDX_LOGIN_ATTEMPTS_HOURLY_TIME ON LOGIN_ATTEMPTS_HOURLY (HOUR, ID)',
+    ]),
+    (7, 'Index USERS by email for prefix search', [
+        'CREATE INDEX IDX_USERS_EMAIL ON USERS (EMAIL, USERNAME)',
+    ]),
+    (8, 'Widen USERS.PASSWORD for salted hashes', [
+        'ALTER TABLE USERS ALTER (PASSWORD NVARCHAR(255))',
+    ]),
+    (9, 'Add LOGIN_ATTEMPTS.LOCATION for backfilled geolocation', [
+        'ALTER TABLE LOGIN_ATTEMPTS ADD (LOCATION NVARCHAR(255))',
+    ]),
+    (10, 'Drop the plaintext-comparing CHECK_LOGIN procedure', [
+        'DROP PROCEDURE CHECK_LOGIN',
+    ]),
+    (11, 'Create LOGIN_LOOKUP: fetch credentials and record the attempt in one call', [
+        _LOGIN_LOOKUP_V11,
+    ]),
+]
+
+# The same schema for the local SQLite stand-in (see storage.SQLiteStorage).
+# Numbered independently of MIGRATIONS since SQLite has no procedures.
+SQLITE_MIGRATIONS = [
+    (1, 'Create USERS', [
+        """
+        CREATE TABLE IF NOT EXISTS USERS (
+            USERNAME NVARCHAR(100) PRIMARY KEY,
+            PASSWORD NVARCHAR(100) NOT NULL,
+            EMAIL NVARCHAR(100) NOT NULL
+        )
+        """,
+    ]),
+    (2, 'Create LOGIN_ATTEMPTS', [
+        """
+        CREATE TABLE IF NOT EXISTS LOGIN_ATTEMPTS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            USERNAME NVARCHAR(100) NOT NULL,
+            SUCCESS BOOLEAN NOT NULL,
+            IP_ADDRESS NVARCHAR(45),
+            TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (3, 'Index LOGIN_ATTEMPTS for lockout counts and listings', [
+        'CREATE INDEX IF NOT EXISTS IDX_LOGIN_ATTEMPTS_USER ON LOGIN_ATTEMPTS (USERNAME, SUCCESS, TIMESTAMP)',
+        'CREATE INDEX IF NOT EXISTS IDX_LOGIN_ATTEMPTS_TIME ON LOGIN_ATTEMPTS (TIMESTAMP, ID)',
+        'CREATE INDEX IF NOT EXISTS IDX_LOGIN_ATTEMPTS_IP ON LOGIN_ATTEMPTS (IP_ADDRESS, TIMESTAMP)',
+    ]),
+    (4, 'Create LOGIN_ATTEMPTS_HOURLY rollups', [
+        """
+        CREATE TABLE IF NOT EXISTS LOGIN_ATTEMPTS_HOURLY (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            USERNAME NVARCHAR(100) NOT NULL,
+            IP_ADDRESS NVARCHAR(45) NOT NULL,
+            SUCCESS BOOLEAN NOT NULL,
+            HOUR TIMESTAMP NOT NULL,
+            ATTEMPTS INTEGER NOT NULL,
+            UNIQUE (USERNAME, IP_ADDRESS, SUCCESS, HOUR)
+        )
+        """,
+        'CREATE INDEX IF NOT EXISTS IDX_LOGIN_ATTEMPTS_HOURLY_TIME ON LOGIN_ATTEMPTS_HOURLY (HOUR, ID)',
+    ]),
+    (5, 'Index USERS by email for prefix search', [
+        'CREATE INDEX IF NOT EXISTS IDX_USERS_EMAIL ON USERS (EMAIL, USERNAME)',
+    ]),
+    (6, 'Add LOGIN_ATTEMPTS.LOCATION for backfilled geolocation', [
+        'ALTER TABLE LOGIN_ATTEMPTS ADD COLUMN LOCATION NVARCHAR(255)',
+    ]),
+]
+
+
+def _error_code(error):
+    return getattr(error, 'errorcode', None)
+
+
+def _is_missing_table(error):
+    # sqlite3 has no error codes on OperationalError, only the message
+    return _error_code(error) == ERR_INVALID_TABLE or 'no such table' in str(error)
+
+
+def current_version(conn, cursor):
+    """Applied schema version, creating SCHEMA_VERSION on first run"""
+    try:
+        cursor.execute('SELECT MAX(VERSION) FROM SCHEMA_VERSION')
+        return cursor.fetchone()[0] or 0
+    except Exception as e:
+        if not _is_missing_table(e):
+            raise
+        conn.rollback()
+    try:
+        cursor.execute("""
+            CREATE TABLE SCHEMA_VERSION (
+                VERSION INTEGER PRIMARY KEY,
+                DESCRIPTION NVARCHAR(200),
+                APPLIED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    except Exception as e:
+        if _error_code(e) != ERR_DUPLICATE_TABLE:
+            raise
+    return 0
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations and return the resulting schema version.
+
+    Costs a single query when the schema is already current.
+    """
+    cursor = conn.cursor()
+    try:
+        version = current_version(conn, cursor)
+        for number, description, statements in migrations:
+            if number <= version:
+                continue
+            print(f"Applying migration {number}: {description}")
+            for statement in statements:
+                try:
+                    cursor.execute(statement)
+                except Exception as e:
+                    if _error_code(e) not in (ERR_DUPLICATE_TABLE, ERR_DUPLICATE_INDEX):
+                        raise
+            try:
+                cursor.execute('INSERT INTO SCHEMA_VERSION (VERSION, DESCRIPTION) VALUES (?, ?)',
+                               (number, description))
+            except Exception as e:
+                # Another worker recorded it first
+                if _error_code(e) != ERR_UNIQUE_VIOLATION and 'UNIQUE constraint' not in str(e):
+                    raise
+            conn.commit()
+            version = number
+        return version
+    finally:
+        cursor.close()
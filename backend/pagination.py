@@ -0,0 +1,52 @@
+import base64
+import json
+from datetime import datetime
+
+
+def encode_cursor(*values):
+    """Opaque keyset cursor for the last row of a page"""
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Inverse of encode_cursor; raises ValueError on a malformed token"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list):
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def parse_page_size(value, default, maximum):
+    """Requested page size clamped to [1, maximum]"""
+    if value in (None, ''):
+        return default
+    try:
+        size = int(value)
+    except ValueError:
+        raise ValueError('limit must be an integer')
+    return max(1, min(size, maximum))
+
+
+def parse_bool(value):
+    if value is None:
+        return None
+    lowered = value.strip().lower()
+    if lowered in ('1', 'true', 'yes'):
+        return True
+    if lowered in ('0', 'false', 'no'):
+        return False
+    raise ValueError(f'Invalid boolean: {value}')
+
+
+def parse_timestamp(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f'{name} must be an ISO 8601 timestamp')
@@ -0,0 +1,157 @@
+import math
+import threading
+import time
+from functools import wraps
+from flask import jsonify, request
+
+
+class _Stripe:
+    """One lock and the buckets whose keys hash to it"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [tokens, last refill time]
+        self.buckets = {}
+        self.last_sweep = time.monotonic()
+
+
+class RateLimiter:
+    """In-process token buckets per client IP and per username.
+
+    Each key refills at ``rate`` tokens per second up to ``burst``; a request
+    costs one token from its IP bucket and, when a username is present, one
+    from that username's bucket, and is admitted only if both have one.
+    Buckets live in ``stripes`` independently locked shards, and a bucket
+    idle long enough to have refilled completely is dropped, since a fresh
+    one is identical. A rate of 0 (or less) turns that scope's limit off.
+    Follows the Flask extension pattern like LockoutEngine.
+    """
+
+    def __init__(self, app=None, ip_rate=1.0, ip_burst=10, user_rate=0.2, user_burst=5, stripes=16):
+        self.ip_rate = ip_rate
+        self.ip_burst = ip_burst
+        self.user_rate = user_rate
+        self.user_burst = user_burst
+        self.enabled = True
+        self._stripes = [_Stripe() for _ in range(stripes)]
+        self._stats_lock = threading.Lock()
+        self._admitted = 0
+        self._rejected_ip = 0
+        self._rejected_user = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('RATE_LIMIT_ENABLED', self.enabled)
+        self.ip_rate = config.get('RATE_LIMIT_IP_RATE', self.ip_rate)
+        self.ip_burst = config.get('RATE_LIMIT_IP_BURST', self.ip_burst)
+        self.user_rate = config.get('RATE_LIMIT_USER_RATE', self.user_rate)
+        self.user_burst = config.get('RATE_LIMIT_USER_BURST', self.user_burst)
+        stripes = config.get('RATE_LIMIT_STRIPES', len(self._stripes))
+        if stripes != len(self._stripes):
+            self._stripes = [_Stripe() for _ in range(stripes)]
+        app.extensions['rate_limiter'] = self
+
+    def _stripe(self, key):
+        return self._stripes[hash(key) % len(self._stripes)]
+
+    def _refill(self, stripe, key, now, rate, burst):
+        bucket = stripe.buckets.get(key)
+        if bucket is None:
+            bucket = stripe.buckets[key] = [float(burst), now]
+        else:
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        return bucket
+
+    def _sweep(self, stripe, now):
+        # Past this age every bucket has refilled to burst and can be forgotten
+        idle = max([burst / rate for rate, burst in ((self.ip_rate, self.ip_burst), (self.user_rate, self.user_burst))
+                    if rate > 0], default=0.0)
+        if now - stripe.last_sweep < idle:
+            return
+        for key in [key for key, (_, last) in stripe.buckets.items() if now - last >= idle]:
+            del stripe.buckets[key]
+        stripe.last_sweep = now
+
+    def acquire(self, scope, ip_address, username=None):
+        """Take a token for this request; returns 0 if admitted, else seconds to wait"""
+        now = time.monotonic()
+        limits = []
+        if self.ip_rate > 0:
+            limits.append((f'{scope}:ip:{ip_address}', self.ip_rate, self.ip_burst))
+        if username and self.user_rate > 0:
+            limits.append((f'{scope}:user:{username}', self.user_rate, self.user_burst))
+        if not limits:
+            with self._stats_lock:
+                self._admitted += 1
+            return 0
+
+        # Lock every stripe involved in a fixed order so the check-then-take is atomic
+        stripes = sorted({id(stripe): stripe for stripe in (self._stripe(key) for key, _, _ in limits)}.items())
+        for _, stripe in stripes:
+            stripe.lock.acquire()
+        try:
+            buckets = [self._refill(self._stripe(key), key, now, rate, burst) for key, rate, burst in limits]
+            waits = [(1 - bucket[0]) / rate for bucket, (_, rate, _) in zip(buckets, limits) if bucket[0] < 1]
+            ip_short = self.ip_rate > 0 and buckets[0][0] < 1
+            if not waits:
+                for bucket in buckets:
+                    bucket[0] -= 1
+            for _, stripe in stripes:
+                self._sweep(stripe, now)
+        finally:
+            for _, stripe in reversed(stripes):
+                stripe.lock.release()
+
+        with self._stats_lock:
+            if not waits:
+                self._admitted += 1
+            elif ip_short:
+                self._rejected_ip += 1
+            else:
+                self._rejected_user += 1
+        return max(waits) if waits else 0
+
+    def limit(self, scope, username_field=None):
+        """Decorator that rejects over-limit requests with 429 before the view runs"""
+        def decorator(view):
+            @wraps(view)
+            def wrapped(*args, **kwargs):
+                if not self.enabled or request.method == 'OPTIONS':
+                    return view(*args, **kwargs)
+                username = None
+                if username_field:
+                    data = request.get_json(silent=True)
+                    if isinstance(data, dict) and isinstance(data.get(username_field), str):
+                        username = data[username_field]
+                wait = self.acquire(scope, request.remote_addr, username)
+                if wait:
+                    retry_after = math.ceil(wait)
+                    response = jsonify({
+                        'error': 'Too many requests',
+                        'message': f'Too many requests. Please try again in {retry_after} seconds.',
+                        'retry_after': retry_after
+                    })
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, 429
+                return view(*args, **kwargs)
+            return wrapped
+        return decorator
+
+    def stats(self):
+        buckets = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                buckets += len(stripe.buckets)
+        with self._stats_lock:
+            return {
+                'enabled': self.enabled,
+                'admitted': self._admitted,
+                'rejected_ip': self._rejected_ip,
+                'rejected_user': self._rejected_user,
+                'rejected': self._rejected_ip + self._rejected_user,
+                'buckets': buckets,
+                'stripes': len(self._stripes),
+            }
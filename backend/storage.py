@@ -0,0 +1,450 @@
+import os
+import sqlite3
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from cache import TTLCache
+from db_pool import ConnectionPool
+from login_check import LOGIN_LOOKUP_CALL, lookup_login
+from migrations import MIGRATIONS, SQLITE_MIGRATIONS, migrate
+
+# Sorts after any character a username or email can hold, so a prefix P
+# matches exactly the range [P, P + PREFIX_UPPER_BOUND)
+PREFIX_UPPER_BOUND = '\uffff'
+
+
+class SQLStorage:
+    """Repository for the USERS and LOGIN_ATTEMPTS operations the app uses.
+
+    Works on any DB-API connection pool with qmark parameters; subclasses
+    supply the connection factory, migrations and dialect quirks. Rows are
+    returned as tuples in the column order of each query.
+    """
+
+    migrations = ()
+    # Adds a batch of hourly counts onto LOGIN_ATTEMPTS_HOURLY; dialect specific
+    merge_hourly_sql = None
+    # Row lock for the rollup SELECT so two workers never roll up the same rows
+    lock_suffix = ''
+
+    def __init__(self, pool, user_cache=None, user_page_cache=None):
+        self.pool = pool
+        # USERS rows by username; every write below goes through invalidate_user
+        self.user_cache = user_cache or TTLCache(max_size=0)
+        # list_users pages keyed by their arguments; any user write clears them all
+        self.user_page_cache = user_page_cache or TTLCache(max_size=0)
+
+    def connection(self):
+        return self.pool.connection()
+
+    def migrate(self):
+        """Apply pending schema migrations and return the schema version"""
+        with self.pool.connection() as conn:
+            return migrate(conn, self.migrations)
+
+    def lookup_login(self, username, ip_address, record=True):
+        """(PASSWORD, EMAIL, attempt_id) straight from USERS, or None for an unknown user.
+
+        With ``record`` a known user's attempt is written as a failure in the
+        same call and attempt_id identifies it, so a failed login needs no
+        further write; call discard_attempt(attempt_id) if it succeeded.
+        """
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT PASSWORD, EMAIL FROM USERS WHERE USERNAME = ?', (username,))
+                user = cursor.fetchone()
+                if user is None:
+                    return None
+                if not record:
+                    return user[0], user[1], None
+                cursor.execute('INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP) '
+                               'VALUES (?, ?, ?, ?)', (username, False, ip_address, datetime.now()))
+                attempt_id = cursor.lastrowid
+                conn.commit()
+                return user[0], user[1], attempt_id
+            finally:
+                cursor.close()
+
+    def discard_attempt(self, attempt_id):
+        """Delete a provisional failed attempt written by lookup_login"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('DELETE FROM LOGIN_ATTEMPTS WHERE ID = ?', (attempt_id,))
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def get_user(self, username):
+        """(USERNAME, PASSWORD, EMAIL) or None, served from the user cache when fresh"""
+        return self.user_cache.get(username, self._load_user)
+
+    def _load_user(self, username):
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('SELECT USERNAME, PASSWORD, EMAIL FROM USERS WHERE USERNAME = ?', (username,))
+                return cursor.fetchone()
+            finally:
+                cursor.close()
+
+    def create_user(self, username, password, email):
+        """Insert a user; returns False if the username is taken"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('INSERT INTO USERS (USERNAME, PASSWORD, EMAIL) VALUES (?, ?, ?)',
+                               (username, password, email))
+                conn.commit()
+                return True
+            except Exception as e:
+                if self._is_duplicate(e):
+                    conn.rollback()
+                    return False
+                raise
+            finally:
+                cursor.close()
+                # Drops a cached "no such user" as well
+                self.invalidate_user(username)
+
+    def update_user(self, username, password=None, email=None):
+        """Change a user's password and/or email; returns False if there is no such user"""
+        changes = [(column, value) for column, value in (('PASSWORD', password), ('EMAIL', email))
+                   if value is not None]
+        if not changes:
+            return self.get_user(username) is not None
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute('UPDATE USERS SET ' + ', '.join(f'{column} = ?' for column, _ in changes) +
+                               ' WHERE USERNAME = ?', [value for _, value in changes] + [username])
+                updated = cursor.rowcount
+                conn.commit()
+                return updated > 0
+            finally:
+                cursor.close()
+                self.invalidate_user(username)
+
+    def invalidate_user(self, username):
+        self.user_cache.invalidate(username)
+        self.user_page_cache.clear()
+
+    def record_attempt(self, username, success, ip_address):
+        self.record_attempts([(username, bool(success), ip_address, datetime.now())])
+
+    def record_attempts(self, rows):
+        """Insert (username, success, ip_address, timestamp) rows in one batch"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany('INSERT INTO LOGIN_ATTEMPTS (USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP) VALUES (?, ?, ?, ?)',
+                                   rows)
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def count_failures(self, username, since=None):
+        """Failed attempts from raw rows plus hourly rollups (hour granularity for ``since``)"""
+        raw = 'SELECT COUNT(*) FROM LOGIN_ATTEMPTS WHERE USERNAME = ? AND SUCCESS = ?'
+        hourly = 'SELECT COALESCE(SUM(ATTEMPTS), 0) FROM LOGIN_ATTEMPTS_HOURLY WHERE USERNAME = ? AND SUCCESS = ?'
+        params = [username, False]
+        hourly_params = [username, False]
+        if since:
+            raw += ' AND TIMESTAMP >= ?'
+            params.append(since)
+            hourly += ' AND HOUR >= ?'
+            hourly_params.append(since.replace(minute=0, second=0, microsecond=0))
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(raw, params)
+                count = cursor.fetchone()[0]
+                cursor.execute(hourly, hourly_params)
+                return count + cursor.fetchone()[0]
+            finally:
+                cursor.close()
+
+    def list_attempts(self, limit, username=None, success=None, ip_address=None,
+                      since=None, until=None, before=None):
+        """Up to ``limit`` (ID, USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP, ATTEMPTS, LOCATION) rows, newest first.
+
+        Raw attempts come first (ATTEMPTS = 1); once they run out the listing
+        continues into LOGIN_ATTEMPTS_HOURLY, whose rows carry a negative ID,
+        the hour as TIMESTAMP and the number of attempts they stand for.
+        LOCATION is whatever set_attempt_locations stored, NULL until then
+        and always NULL for hourly rows.
+        ``before`` is the (timestamp, id) keyset of the last row already seen.
+        """
+        raw_where, raw_params = self._attempt_filters('TIMESTAMP', 'ID', username, success, ip_address,
+                                                      since, until, before)
+        hourly_where, hourly_params = self._attempt_filters('HOUR', '-ID', username, success, ip_address,
+                                                            since, until, before)
+        query = f"""
+            SELECT * FROM (
+                SELECT * FROM (
+                    SELECT ID, USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP, 1 AS ATTEMPTS, LOCATION
+                    FROM LOGIN_ATTEMPTS{raw_where}
+                    ORDER BY TIMESTAMP DESC, ID DESC LIMIT ?
+                ) AS RAW_ROWS
+                UNION ALL
+                SELECT * FROM (
+                    SELECT -ID AS ID, USERNAME, SUCCESS, NULLIF(IP_ADDRESS, '') AS IP_ADDRESS,
+                           HOUR AS TIMESTAMP, ATTEMPTS, CAST(NULL AS NVARCHAR(255)) AS LOCATION
+                    FROM LOGIN_ATTEMPTS_HOURLY{hourly_where}
+                    ORDER BY HOUR DESC, ID ASC LIMIT ?
+                ) AS HOURLY_ROWS
+            ) AS ALL_ROWS
+            ORDER BY TIMESTAMP DESC, ID DESC LIMIT ?
+        """
+        params = raw_params + [limit] + hourly_params + [limit, limit]
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                rows = cursor.fetchmany(limit)
+            finally:
+                cursor.close()
+        # Column types are lost through UNION ALL on SQLite
+        return [row if not isinstance(row[4], str) else row[:4] + (datetime.fromisoformat(row[4]),) + row[5:]
+                for row in rows]
+
+    def set_attempt_locations(self, locations):
+        """Store {ip_address: location} on attempts from those addresses that have none yet"""
+        if not locations:
+            return
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.executemany('UPDATE LOGIN_ATTEMPTS SET LOCATION = ? WHERE IP_ADDRESS = ? AND LOCATION IS NULL',
+                                   [(location, ip_address) for ip_address, location in locations.items()])
+                conn.commit()
+            finally:
+                cursor.close()
+
+    def _attempt_filters(self, time_column, id_column, username, success, ip_address, since, until, before):
+        conditions = []
+        params = []
+        if username:
+            conditions.append('USERNAME = ?')
+            params.append(username)
+        if success is not None:
+            conditions.append('SUCCESS = ?')
+            params.append(success)
+        if ip_address:
+            conditions.append('IP_ADDRESS = ?')
+            params.append(ip_address)
+        if since:
+            conditions.append(f'{time_column} >= ?')
+            params.append(since)
+        if until:
+            conditions.append(f'{time_column} < ?')
+            params.append(until)
+        if before:
+            conditions.append(f'({time_column} < ? OR ({time_column} = ? AND {id_column} < ?))')
+            params.extend([before[0], before[0], before[1]])
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), params
+
+    def roll_up_attempts(self, cutoff, batch_size, archive=None):
+        """Fold up to ``batch_size`` raw attempts older than ``cutoff`` into hourly rollups.
+
+        The rows are counted into LOGIN_ATTEMPTS_HOURLY and deleted in the same
+        transaction; returns how many raw rows were rolled up. ``archive(rows)``,
+        if given, receives the raw (ID, USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP)
+        rows first and aborts the batch by raising.
+        """
+        with self.pool.connection() as conn:
+            with self._transaction(conn):
+                cursor = conn.cursor()
+                try:
+                    cursor.execute('SELECT ID, USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP FROM LOGIN_ATTEMPTS '
+                                   'WHERE TIMESTAMP < ? ORDER BY TIMESTAMP, ID LIMIT ?' + self.lock_suffix,
+                                   (cutoff, batch_size))
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return 0
+                    if archive:
+                        archive(rows)
+                    counts = Counter(
+                        (username, ip_address or '', bool(success), timestamp.replace(minute=0, second=0, microsecond=0))
+                        for _, username, success, ip_address, timestamp in rows
+                    )
+                    cursor.executemany(self.merge_hourly_sql, [key + (count,) for key, count in counts.items()])
+                    cursor.executemany('DELETE FROM LOGIN_ATTEMPTS WHERE ID = ?', [(row[0],) for row in rows])
+                finally:
+                    cursor.close()
+        return len(rows)
+
+    def list_users(self, limit=None, username=None, email=None, after=None):
+        """A page of (USERNAME, EMAIL) rows matching the given prefixes.
+
+        Ordered by USERNAME, or by (EMAIL, USERNAME) when only an email
+        prefix is given; ``after`` is the sort key of the previous page's last
+        row. Pages are cached until the next user write.
+        """
+        key = (limit, username, email, tuple(after) if after else None)
+        return self.user_page_cache.get(key, lambda _: self._load_users(limit, username, email, after))
+
+    def _load_users(self, limit, username, email, after):
+        order = ('EMAIL', 'USERNAME') if email and not username else ('USERNAME',)
+        conditions = []
+        params = []
+        # Prefix as a range so it is answered from the primary key / email index
+        for column, prefix in (('USERNAME', username), ('EMAIL', email)):
+            if prefix:
+                conditions.append(f'{column} >= ? AND {column} < ?')
+                params.extend([prefix, prefix + PREFIX_UPPER_BOUND])
+        if after:
+            if len(order) == 2:
+                conditions.append('(EMAIL > ? OR (EMAIL = ? AND USERNAME > ?))')
+                params.extend([after[0], after[0], after[1]])
+            else:
+                conditions.append('USERNAME > ?')
+                params.append(after[0])
+
+        sql = 'SELECT USERNAME, EMAIL FROM USERS'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ' + ', '.join(order)
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def stats(self):
+        return self.pool.stats()
+
+    def cache_stats(self):
+        return {'users': self.user_cache.stats(), 'user_pages': self.user_page_cache.stats()}
+
+    def close(self):
+        self.pool.close()
+
+    @contextmanager
+    def _transaction(self, conn):
+        yield
+        conn.commit()
+
+    def _is_duplicate(self, error):
+        return False
+
+
+class HanaStorage(SQLStorage):
+    """SAP HANA Cloud via hdbcli"""
+
+    migrations = MIGRATIONS
+    merge_hourly_sql = """
+        MERGE INTO LOGIN_ATTEMPTS_HOURLY AS T
+        USING (SELECT CAST(? AS NVARCHAR(100)) AS USERNAME, CAST(? AS NVARCHAR(45)) AS IP_ADDRESS,
+                      CAST(? AS BOOLEAN) AS SUCCESS, CAST(? AS TIMESTAMP) AS HOUR,
+                      CAST(? AS INTEGER) AS ATTEMPTS FROM DUMMY) AS S
+        ON T.USERNAME = S.USERNAME AND T.IP_ADDRESS = S.IP_ADDRESS
+           AND T.SUCCESS = S.SUCCESS AND T.HOUR = S.HOUR
+        WHEN MATCHED THEN UPDATE SET T.ATTEMPTS = T.ATTEMPTS + S.ATTEMPTS
+        WHEN NOT MATCHED THEN INSERT (USERNAME, IP_ADDRESS, SUCCESS, HOUR, ATTEMPTS)
+            VALUES (S.USERNAME, S.IP_ADDRESS, S.SUCCESS, S.HOUR, S.ATTEMPTS)
+    """
+    lock_suffix = ' FOR UPDATE'
+
+    def __init__(self, address, port, user, password, pool_size=10, pool_timeout=5.0, pool_max_age=1800,
+                 user_cache=None, user_page_cache=None):
+        self._connect_args = {'address': address, 'port': port, 'user': user, 'password': password}
+        super().__init__(ConnectionPool(self._connect, max_size=pool_size,
+                                        timeout=pool_timeout, max_age=pool_max_age),
+                         user_cache, user_page_cache)
+
+    def lookup_login(self, username, ip_address, record=True):
+        # One round trip: LOGIN_LOOKUP reads the user and records the attempt server-side
+        with self.pool.connection() as conn:
+            return lookup_login(self.pool.statement(conn, LOGIN_LOOKUP_CALL), username, ip_address,
+                                datetime.now(), record)
+
+    def _connect(self):
+        import hdbcli.dbapi
+        # Autocommit saves a COMMIT round trip on single-statement writes such as attempt inserts
+        conn = hdbcli.dbapi.connect(autocommit=True, **self._connect_args)
+        print("Successfully connected to HANA database")
+        return conn
+
+    @contextmanager
+    def _transaction(self, conn):
+        # Pooled HANA connections run in autocommit; batch maintenance needs one transaction
+        conn.setautocommit(False)
+        try:
+            yield
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            conn.setautocommit(True)
+
+    def _is_duplicate(self, error):
+        return getattr(error, 'errorcode', None) == 301
+
+
+class SQLiteStorage(SQLStorage):
+    """Local SQLite file with the same schema, for offline benchmarks and CI"""
+
+    migrations = SQLITE_MIGRATIONS
+    merge_hourly_sql = """
+        INSERT INTO LOGIN_ATTEMPTS_HOURLY (USERNAME, IP_ADDRESS, SUCCESS, HOUR, ATTEMPTS)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (USERNAME, IP_ADDRESS, SUCCESS, HOUR) DO UPDATE SET ATTEMPTS = ATTEMPTS + excluded.ATTEMPTS
+    """
+
+    def __init__(self, path, pool_size=10, pool_timeout=5.0, user_cache=None, user_page_cache=None):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        super().__init__(ConnectionPool(self._connect, max_size=pool_size, timeout=pool_timeout,
+                                        max_age=float('inf'), ping_query='SELECT 1'),
+                         user_cache, user_page_cache)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    @contextmanager
+    def _transaction(self, conn):
+        # sqlite3 would only BEGIN at the first write, leaving the batch SELECT
+        # outside the transaction; take the write lock up front instead so two
+        # workers (or processes) cannot roll up the same rows twice
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    def _is_duplicate(self, error):
+        return isinstance(error, sqlite3.IntegrityError)
+
+
+def create_storage(config):
+    """Build the storage backend named by STORAGE_BACKEND"""
+    backend = config.get('STORAGE_BACKEND', 'hana')
+    caches = {
+        'user_cache': TTLCache(max_size=config.get('USER_CACHE_SIZE', 1024), ttl=config.get('USER_CACHE_TTL', 300)),
+        'user_page_cache': TTLCache(max_size=config.get('USER_PAGE_CACHE_SIZE', 256),
+                                    ttl=config.get('USER_PAGE_CACHE_TTL', 30)),
+    }
+    if backend == 'sqlite':
+        return SQLiteStorage(config['STORAGE_SQLITE_PATH'], pool_size=config['DB_POOL_SIZE'],
+                             pool_timeout=config['DB_POOL_TIMEOUT'], **caches)
+    if backend == 'hana':
+        return HanaStorage(config['DB_ADDRESS'], config['DB_PORT'], config['DB_USER'], config['DB_PASSWORD'],
+                           pool_size=config['DB_POOL_SIZE'], pool_timeout=config['DB_POOL_TIMEOUT'],
+                           pool_max_age=config['DB_POOL_MAX_AGE'], **caches)
+    raise ValueError(f'Unknown STORAGE_BACKEND: {backend}')
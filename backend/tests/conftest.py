@@ -0,0 +1,31 @@
+import os
+import sys
+
+# The backend modules are flat top-level imports (lockout, storage, ...)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import importlib.util
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def backend_app(tmp_path_factory):
+    """app.py loaded as a module, with every local store in a scratch directory"""
+    directory = tmp_path_factory.mktemp('backend_app')
+    os.environ.update({
+        'JWT_SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'SECRET_KEY': 'test-secret-key-of-at-least-32-bytes',
+        'STORAGE_BACKEND': 'sqlite',
+        'STORAGE_SQLITE_PATH': str(directory / 'appsec.db'),
+        'ALERT_QUEUE_PATH': str(directory / 'alerts.db'),
+        'LOCKOUT_SQLITE_PATH': str(directory / 'lockout.db'),
+        'GEO_CACHE_PATH': str(directory / 'geolocation.json'),
+        'ARCHIVE_PATH': str(directory / 'archive'),
+    })
+    # app.py shares its name with the app/ package, so load it by path
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app.py')
+    spec = importlib.util.spec_from_file_location('backend_app', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
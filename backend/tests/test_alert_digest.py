@@ -0,0 +1,152 @@
+from datetime import datetime
+
+import pytest
+
+import alert_digest
+from alert_digest import AlertCoalescer
+from login_check import LOGIN_BAD_PASSWORD
+
+START = datetime(2024, 5, 20, 12, 0).timestamp()
+
+
+class FakeQueue:
+    def __init__(self, fail=False):
+        self.jobs = []
+        self.fail = fail
+
+    def enqueue(self, kind, payload):
+        if self.fail:
+            raise OSError('queue unavailable')
+        self.jobs.append((kind, payload))
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [START]
+    monkeypatch.setattr(alert_digest.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def queue():
+    return FakeQueue()
+
+
+@pytest.fixture
+def coalescer(queue, clock):
+    return AlertCoalescer(window=300, queue=queue)
+
+
+def test_first_event_is_admitted_and_repeats_fold(coalescer, clock):
+    assert coalescer.admit('owner@example.com', 'AppSec', '10.0.0.1')
+    clock[0] += 10
+    assert not coalescer.admit('owner@example.com', 'AppSec', '10.0.0.1')
+    assert not coalescer.admit('owner@example.com', 'AppSec', '10.0.0.2')
+    # Other recipients and apps have their own windows
+    assert coalescer.admit('other@example.com', 'AppSec', '10.0.0.1')
+    assert coalescer.admit('owner@example.com', 'Notepad', '10.0.0.1')
+    stats = coalescer.stats()
+    assert (stats['immediate'], stats['folded'], stats['groups'], stats['pending_events']) == (3, 2, 3, 2)
+    assert stats['suppression_ratio'] == 0.4
+
+
+def test_flush_waits_for_the_window_end(coalescer, queue, clock):
+    coalescer.admit('owner@example.com', 'AppSec', '10.0.0.1')
+    clock[0] += 60
+    coalescer.admit('owner@example.com', 'AppSec', '10.0.0.1')
+    clock[0] += 120
+    coalescer.admit('owner@example.com', 'AppSec', '10.0.0.2')
+    coalescer.admit('owner@example.com', 'AppSec', None)
+
+    clock[0] = START + 299
+    assert coalescer.flush() == 0
+    clock[0] = START + 300
+    assert coalescer.flush() == 1
+    assert queue.jobs == [('alert_digest', {
+        'recipient': 'owner@example.com',
+        'app_name': 'AppSec',
+        'count': 3,
+        'first': '2024-05-20 12:01:00',
+        'last': '2024-05-20 12:03:00',
+        'ips': [('10.0.0.1', 1), ('10.0.0.2', 1), ('unknown', 1)],
+        'other_ips': 0,
+    })]
+    assert coalescer.stats()['digests'] == 1
+
+
+def test_a_flushed_window_starts_a_new_one_that_keeps_folding(coalescer, queue, clock):
+    coalescer.admit('owner@example.com', 'AppSec')
+    coalescer.admit('owner@example.com', 'AppSec')
+    clock[0] += 300
+    coalescer.flush()
+    # Events just after the digest are still folded, into the new window
+    clock[0] += 1
+    assert not coalescer.admit('owner@example.com', 'AppSec')
+    clock[0] += 299
+    assert coalescer.flush() == 1
+    assert [job[1]['count'] for job in queue.jobs] == [1, 1]
+
+
+def test_a_quiet_window_is_dropped_so_the_next_event_alerts(coalescer, queue, clock):
+    assert coalescer.admit('owner@example.com', 'AppSec')
+    clock[0] += 300
+    assert coalescer.flush() == 0
+    assert coalescer.stats()['groups'] == 0
+    assert coalescer.admit('owner@example.com', 'AppSec')
+    # A quiet window that was never flushed also lets the next event through
+    clock[0] += 300
+    assert coalescer.admit('owner@example.com', 'AppSec')
+    assert queue.jobs == []
+
+
+def test_stop_flushes_open_windows(coalescer, queue, clock):
+    coalescer.admit('owner@example.com', 'AppSec')
+    coalescer.admit('owner@example.com', 'AppSec')
+    coalescer.stop()
+    assert [job[1]['count'] for job in queue.jobs] == [1]
+
+
+def test_digest_lists_the_busiest_ips(coalescer, queue, monkeypatch):
+    monkeypatch.setattr(alert_digest, 'DIGEST_MAX_IPS', 2)
+    coalescer.admit('owner@example.com', 'AppSec')
+    for ip_address in ['10.0.0.1', '10.0.0.2', '10.0.0.2', '10.0.0.3', '10.0.0.3', '10.0.0.3']:
+        coalescer.admit('owner@example.com', 'AppSec', ip_address)
+    coalescer.flush(force=True)
+    digest = queue.jobs[0][1]
+    assert (digest['ips'], digest['other_ips']) == ([('10.0.0.3', 3), ('10.0.0.2', 2)], 1)
+
+
+def test_a_zero_window_admits_everything(queue, clock):
+    coalescer = AlertCoalescer(window=0, queue=queue)
+    assert all(coalescer.admit('owner@example.com', 'AppSec') for _ in range(3))
+    assert coalescer.flush(force=True) == 0
+
+
+def test_queue_errors_do_not_escape_flush(clock):
+    coalescer = AlertCoalescer(window=300, queue=FakeQueue(fail=True))
+    coalescer.admit('owner@example.com', 'AppSec')
+    coalescer.admit('owner@example.com', 'AppSec')
+    assert coalescer.flush(force=True) == 1
+
+
+@pytest.mark.parametrize('admitted, message', [
+    (True, 'Account locked. A security alert has been sent.'),
+    (False, 'Account locked. A security alert was sent recently; '
+            'this attempt will be included in the next alert digest.'),
+])
+def test_login_lockout_message_says_whether_an_alert_was_sent(backend_app, monkeypatch, admitted, message):
+    module = backend_app
+    sent = []
+    # Keep the request from starting the app's worker threads
+    monkeypatch.setattr(module, '_workers_started', True)
+    monkeypatch.setattr(module, 'authenticate', lambda *args, **kwargs: (LOGIN_BAD_PASSWORD, 'owner@example.com'))
+    monkeypatch.setattr(module.lockout, 'is_locked', lambda username, ip_address: False)
+    monkeypatch.setattr(module.lockout, 'record_failure', lambda username, ip_address: 0)
+    monkeypatch.setattr(module.alert_coalescer, 'admit', lambda *args: admitted)
+    monkeypatch.setattr(module, 'capture_screenshot', lambda pid=None, window=None: None)
+    monkeypatch.setattr(module, 'send_security_alert', lambda *args, **kwargs: sent.append(args))
+
+    response = module.app.test_client().post('/api/login', json={'username': 'owner', 'password': 'wrong'})
+    assert response.status_code == 429
+    assert (response.get_json()['message'], response.get_json()['alert_sent']) == (message, admitted)
+    assert len(sent) == int(admitted)
@@ -0,0 +1,136 @@
+import pytest
+
+import alert_queue
+from alert_queue import AlertQueue, PermanentAlertError
+from evidence import Evidence
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(alert_queue.time, 'time', lambda: now[0])
+    monkeypatch.setattr(alert_queue.random, 'uniform', lambda low, high: high)
+    return now
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return AlertQueue(path=str(tmp_path / 'alerts.db'), max_attempts=3, backoff=5.0, max_backoff=60.0, lease=30.0)
+
+
+def test_delivers_payload_and_evidence(queue):
+    delivered = []
+    queue.register('mail', delivered.append)
+    image = Evidence(b'\x89PNG\r\n\x1a\n' + bytes(range(256)), 'image/png', 'camera.png', captured_at=123.5)
+    queue.enqueue('mail', {'subject': 'Failed login'}, [image, None])
+
+    assert queue.run_once()
+    assert not queue.run_once()
+    payload = delivered[0]
+    assert payload['subject'] == 'Failed login'
+    [stored] = payload['evidence']
+    assert (stored.data, stored.mime_type, stored.filename, stored.captured_at) == \
+        (image.data, 'image/png', 'camera.png', 123.5)
+    stats = queue.stats()
+    assert (stats['depth'], stats['delivered'], stats['enqueued']) == (0, 1, 1)
+
+
+def test_failed_job_waits_for_backoff_then_dead_letters(queue, clock):
+    calls = []
+
+    def flaky(payload):
+        calls.append(clock[0])
+        raise ConnectionError('mail server down')
+
+    queue.register('mail', flaky)
+    job_id = queue.enqueue('mail', {})
+    assert queue.run_once()
+    # The retry is not due until the backoff has passed, and it doubles each time
+    assert not queue.run_once()
+    clock[0] += 5.0
+    assert queue.run_once()
+    clock[0] += 9.9
+    assert not queue.run_once()
+    clock[0] += 0.1
+    assert queue.run_once()
+    assert len(calls) == 3
+
+    clock[0] += 3600
+    assert not queue.run_once()
+    [dead] = queue.dead_letters()
+    assert (dead['id'], dead['attempts']) == (job_id, 3)
+    assert dead['last_error'] == 'ConnectionError: mail server down'
+    stats = queue.stats()
+    assert (stats['depth'], stats['dead_letters'], stats['retried'], stats['dead_lettered']) == (0, 1, 2, 1)
+
+
+def test_permanent_error_and_unknown_kind_dead_letter_at_once(queue):
+    def reject(payload):
+        raise PermanentAlertError('bad address')
+
+    queue.register('mail', reject)
+    queue.enqueue('mail', {})
+    queue.enqueue('sms', {})
+    assert queue.run_once() and queue.run_once()
+    errors = sorted(dead['last_error'] for dead in queue.dead_letters())
+    assert errors == ["PermanentAlertError: bad address", "PermanentAlertError: no handler for 'sms'"]
+    assert all(dead['attempts'] == 1 for dead in queue.dead_letters())
+
+
+def test_requeue_gives_a_dead_letter_fresh_attempts(queue):
+    outcomes = [PermanentAlertError('rejected'), None]
+    delivered = []
+
+    def handler(payload):
+        outcome = outcomes.pop(0)
+        if outcome:
+            raise outcome
+        delivered.append(payload)
+
+    queue.register('mail', handler)
+    job_id = queue.enqueue('mail', {'n': 1}, [Evidence(b'jpeg', 'image/jpeg', 'screen.jpg')])
+    assert queue.run_once()
+    assert not queue.requeue(job_id + 1)
+    assert queue.requeue(job_id)
+    assert queue.run_once()
+    assert delivered[0]['n'] == 1
+    assert delivered[0]['evidence'][0].data == b'jpeg'
+    assert queue.dead_letters() == []
+
+
+def test_expired_lease_is_claimed_again(queue, clock):
+    job_id = queue.enqueue('mail', {})
+    # A worker that claims the job and then dies never reports back
+    assert queue._claim()[0] == job_id
+    assert queue._claim() is None
+    clock[0] += 30.0
+    claimed = queue._claim()
+    assert (claimed[0], claimed[3]) == (job_id, 2)
+
+
+def test_jobs_survive_reopening_the_file(tmp_path, clock):
+    path = str(tmp_path / 'alerts.db')
+    AlertQueue(path=path).enqueue('mail', {'n': 7})
+    delivered = []
+    reopened = AlertQueue(path=path)
+    reopened.register('mail', delivered.append)
+    assert reopened.stats()['depth'] == 1
+    assert reopened.run_once()
+    assert delivered[0]['n'] == 7
+
+
+def test_workers_drain_the_queue(tmp_path):
+    queue = AlertQueue(path=str(tmp_path / 'alerts.db'), workers=3, poll_interval=0.05)
+    delivered = []
+    queue.register('mail', lambda payload: delivered.append(payload['n']))
+    queue.start()
+    try:
+        for n in range(20):
+            queue.enqueue('mail', {'n': n})
+        deadline = alert_queue.time.time() + 5
+        while len(delivered) < 20 and alert_queue.time.time() < deadline:
+            alert_queue.time.sleep(0.01)
+    finally:
+        queue.stop()
+    assert sorted(delivered) == list(range(20))
+    assert queue.stats()['workers'] == 0
@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from archive import ColdArchive
+from maintenance import AttemptMaintenance
+from storage import SQLiteStorage
+
+NOW = datetime(2024, 5, 20, 12, 30)
+DAY_ONE = datetime(2024, 4, 1, 23, 58)
+DAY_TWO = datetime(2024, 4, 2, 0, 1)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'login.db'))
+    storage.migrate()
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return ColdArchive(str(tmp_path / 'archive'))
+
+
+def raw_rows(storage):
+    with storage.connection() as conn:
+        return conn.execute('SELECT USERNAME, SUCCESS, IP_ADDRESS, TIMESTAMP FROM LOGIN_ATTEMPTS '
+                            'ORDER BY TIMESTAMP').fetchall()
+
+
+def test_rollup_archives_attempts_and_removes_them(storage, archive):
+    old = [
+        ('alice', False, '10.0.0.1', DAY_ONE),
+        ('alice', True, None, DAY_ONE + timedelta(minutes=1)),
+        ('bob', False, '10.0.0.2', DAY_TWO),
+    ]
+    recent = [('carol', False, '10.0.0.3', NOW - timedelta(hours=1))]
+    storage.record_attempts(old + recent)
+
+    maintenance = AttemptMaintenance(storage, retention_days=30, batch_size=100, pause=0, archive=archive)
+    assert maintenance.run_once(now=NOW) == 3
+
+    # Archived rows are gone from the source table; recent ones stay
+    assert [row[0] for row in raw_rows(storage)] == ['carol']
+
+    rows = list(archive.query('login_attempts'))
+    assert [(row['username'], row['success'], row['ip_address'], row['timestamp']) for row in rows] == old
+    assert all(isinstance(row['id'], int) for row in rows)
+    assert archive.stats()['login_attempts']['rows'] == 3
+
+
+def test_rows_are_partitioned_by_day_into_gzipped_columns(storage, archive):
+    storage.record_attempts([
+        ('alice', False, '10.0.0.1', DAY_ONE),
+        ('bob', False, '10.0.0.2', DAY_TWO),
+    ])
+    storage.roll_up_attempts(NOW - timedelta(days=30), 100, archive=lambda rows: archive.write('login_attempts', rows))
+
+    base = os.path.join(archive.root, 'login_attempts')
+    assert sorted(os.listdir(base)) == ['date=2024-04-01', 'date=2024-04-02']
+    partition = os.path.join(base, 'date=2024-04-02')
+    [part] = os.listdir(partition)
+    assert not part.startswith('.')
+    path = os.path.join(partition, part)
+    assert sorted(os.listdir(path)) == [
+        '_meta.json', 'id.json.gz', 'ip_address.json.gz', 'success.json.gz', 'timestamp.json.gz', 'username.json.gz',
+    ]
+    with gzip.open(os.path.join(path, 'username.json.gz'), 'rt', encoding='utf-8') as f:
+        assert json.load(f) == ['bob']
+    with open(os.path.join(path, '_meta.json')) as f:
+        assert json.load(f) == {'rows': 1, 'min': DAY_TWO.isoformat(), 'max': DAY_TWO.isoformat()}
+
+
+def test_query_filters_by_time_columns_and_values(archive):
+    archive.write('login_attempts', [
+        (1, 'alice', False, '10.0.0.1', DAY_ONE),
+        (2, 'bob', True, '10.0.0.2', DAY_ONE + timedelta(minutes=1)),
+        (3, 'alice', False, '10.0.0.1', DAY_TWO),
+    ])
+    assert [row['id'] for row in archive.query('login_attempts', since=DAY_TWO)] == [3]
+    assert [row['id'] for row in archive.query('login_attempts', until=DAY_TWO)] == [1, 2]
+    assert list(archive.query('login_attempts', columns=['id'], where={'username': 'alice'})) == [
+        {'id': 1}, {'id': 3},
+    ]
+    assert len(list(archive.query('login_attempts', limit=2))) == 2
+    with pytest.raises(ValueError):
+        list(archive.query('login_attempts', columns=['password']))
+
+
+def test_a_failed_write_leaves_no_part_and_keeps_the_source_rows(storage, archive, monkeypatch):
+    storage.record_attempts([('alice', False, '10.0.0.1', DAY_ONE)])
+
+    def full(*args, **kwargs):
+        raise OSError('archive volume full')
+
+    monkeypatch.setattr('archive.json.dump', full)
+    with pytest.raises(OSError):
+        storage.roll_up_attempts(NOW - timedelta(days=30), 100,
+                                 archive=lambda rows: archive.write('login_attempts', rows))
+
+    assert len(raw_rows(storage)) == 1
+    assert os.listdir(os.path.join(archive.root, 'login_attempts', 'date=2024-04-01')) == []
+    assert list(archive.query('login_attempts')) == []
@@ -0,0 +1,61 @@
+from attempt_recorder import LoginAttemptRecorder
+
+
+class Sink:
+    def __init__(self):
+        self.batches = []
+        self.fail = False
+
+    def __call__(self, rows):
+        if self.fail:
+            raise RuntimeError('database unavailable')
+        self.batches.append(list(rows))
+
+
+def test_flush_writes_one_batch_in_order():
+    sink = Sink()
+    recorder = LoginAttemptRecorder(sink, flush_size=100)
+    for i in range(3):
+        recorder.record(f'user{i}', False, '10.0.0.1')
+    assert recorder.stats()['buffered'] == 3
+    assert recorder.flush() == 3
+    assert [row[0] for row in sink.batches[0]] == ['user0', 'user1', 'user2']
+    stats = recorder.stats()
+    assert stats['buffered'] == 0
+    assert stats['oldest_buffered_s'] == 0.0
+    assert (stats['flushed'], stats['flushes']) == (3, 1)
+    assert stats['flush_max_ms'] >= stats['flush_avg_ms'] >= 0
+
+
+def test_failed_flush_keeps_rows_and_drops_oldest_beyond_bound():
+    sink = Sink()
+    sink.fail = True
+    recorder = LoginAttemptRecorder(sink, max_buffer=4, flush_size=100)
+    for i in range(3):
+        recorder.record(f'user{i}', False, '10.0.0.1')
+    assert recorder.flush() == 0
+    for i in range(3, 6):
+        recorder.record(f'user{i}', False, '10.0.0.1')
+    stats = recorder.stats()
+    # Records that found the buffer full flushed inline and failed again; the last one had to drop a row
+    assert stats['failed_flushes'] == 3
+    assert stats['dropped'] == 1
+    sink.fail = False
+    recorder.flush()
+    assert [row[0] for row in sink.batches[0]] == ['user1', 'user2', 'user3', 'user4', 'user5']
+
+
+def test_background_thread_flushes_and_stop_drains():
+    sink = Sink()
+    recorder = LoginAttemptRecorder(sink, flush_size=2, flush_interval=60)
+    recorder.start()
+    try:
+        recorder.record('alice', False, '10.0.0.1')
+        recorder.record('bob', False, '10.0.0.1')
+        recorder.record('carol', True, '10.0.0.2')
+    finally:
+        recorder.stop()
+    assert sum(len(batch) for batch in sink.batches) == 3
+    stats = recorder.stats()
+    assert not stats['running']
+    assert stats['recorded'] == stats['flushed'] == 3
@@ -0,0 +1,151 @@
+import threading
+
+import pytest
+
+import cache
+from cache import TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    return now
+
+
+class Loader:
+    def __init__(self, values=None):
+        self.values = values or {}
+        self.calls = []
+
+    def __call__(self, key):
+        self.calls.append(key)
+        return self.values.get(key)
+
+
+def test_hit_until_ttl_expires(clock):
+    cached = TTLCache(ttl=10)
+    load = Loader({'alice': {'id': 1}})
+    assert cached.get('alice', load) == {'id': 1}
+    clock[0] += 9.9
+    assert cached.get('alice', load) == {'id': 1}
+    clock[0] += 0.1
+    cached.get('alice', load)
+    assert load.calls == ['alice', 'alice']
+    stats = cached.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations']) == (1, 2, 1)
+
+
+def test_missing_records_use_the_negative_ttl(clock):
+    cached = TTLCache(ttl=300, negative_ttl=5)
+    load = Loader()
+    assert cached.get('ghost', load) is None
+    assert cached.get('ghost', load) is None
+    clock[0] += 5
+    cached.get('ghost', load)
+    assert load.calls == ['ghost', 'ghost']
+
+    uncached = TTLCache(negative_ttl=0)
+    uncached.get('ghost', load)
+    uncached.get('ghost', load)
+    assert len(load.calls) == 4
+
+
+def test_least_recently_used_is_evicted(clock):
+    cached = TTLCache(max_size=2)
+    load = Loader({key: key.upper() for key in 'abc'})
+    cached.get('a', load)
+    cached.get('b', load)
+    cached.get('a', load)
+    cached.get('c', load)
+    assert [key for key, _, _ in cached.snapshot()] == ['a', 'c']
+    assert cached.stats()['evictions'] == 1
+
+
+def test_peek_never_loads(clock):
+    cached = TTLCache(ttl=10)
+    assert cached.peek('alice') == (False, None)
+    cached.put('alice', 'record')
+    assert cached.peek('alice') == (True, 'record')
+    clock[0] += 10
+    assert cached.peek('alice') == (False, None)
+
+
+def test_concurrent_misses_share_one_load():
+    cached = TTLCache()
+    release = threading.Event()
+    calls = []
+
+    def slow_load(key):
+        calls.append(key)
+        release.wait(5)
+        return 'record'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cached.get('alice', slow_load)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    while cached.stats()['shared_loads'] < 7:
+        threading.Event().wait(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ['alice']
+    assert results == ['record'] * 8
+    assert cached.stats()['loads'] == 1
+
+
+def test_load_error_reaches_waiters_and_is_not_cached():
+    cached = TTLCache()
+    release = threading.Event()
+
+    def failing_load(key):
+        release.wait(5)
+        raise ConnectionError('database unavailable')
+
+    errors = []
+
+    def lookup():
+        try:
+            cached.get('alice', failing_load)
+        except ConnectionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=lookup) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while cached.stats()['shared_loads'] < 2:
+        threading.Event().wait(0.005)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 3
+    assert cached.get('alice', Loader({'alice': 'record'})) == 'record'
+
+
+def test_invalidate_during_load_discards_its_result():
+    cached = TTLCache()
+    started, release = threading.Event(), threading.Event()
+
+    def slow_load(key):
+        started.set()
+        release.wait(5)
+        return 'old password hash'
+
+    thread = threading.Thread(target=cached.get, args=('alice', slow_load))
+    thread.start()
+    started.wait(5)
+    cached.invalidate('alice')
+    release.set()
+    thread.join()
+    assert cached.peek('alice') == (False, None)
+
+
+def test_zero_size_stores_nothing(clock):
+    cached = TTLCache(max_size=0)
+    load = Loader({'alice': 'record'})
+    cached.get('alice', load)
+    cached.get('alice', load)
+    assert load.calls == ['alice', 'alice']
+    assert cached.stats()['size'] == 0
@@ -0,0 +1,147 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from camera import CameraService
+
+cv2 = pytest.importorskip('cv2')
+np = pytest.importorskip('numpy')
+
+
+@pytest.fixture
+def video(tmp_path):
+    """Two seconds of 30 fps video whose frame n is a flat grey of level 4n"""
+    path = str(tmp_path / 'door.avi')
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), 30.0, (160, 120))
+    if not writer.isOpened():
+        pytest.skip('OpenCV cannot write MJPG video here')
+    for n in range(60):
+        writer.write(np.full((120, 160, 3), 4 * n, dtype=np.uint8))
+    writer.release()
+    return path
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise AssertionError('timed out')
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service(video):
+    service = CameraService(source=video, frames=8, fps=20.0, enabled=True)
+    yield service
+    service.stop()
+
+
+def test_disabled_service_does_not_start(video):
+    service = CameraService(source=video)
+    assert not service.start()
+    assert service.frame_at() is None
+    assert service.stats()['missed'] == 1
+
+
+def test_ring_buffer_fills_and_wraps(service):
+    assert service.start()
+    wait_for(lambda: service.stats()['stored'] > 10)
+    stats = service.stats()
+    assert stats['running'] and stats['opens'] == 1
+    assert stats['buffered'] == 8
+    assert 0 < stats['buffer_seconds'] < 1.0
+    frame = service.frame_at()
+    assert frame.shape == (120, 160, 3)
+
+
+def frozen(service):
+    """Let the buffer fill, then end the grab thread without dropping what it buffered"""
+    service.start()
+    wait_for(lambda: service.stats()['buffered'] == service.size)
+    service._stopping.set()
+    service._thread.join()
+    return service._head, list(service._times), service._frames.copy()
+
+
+def test_frame_at_picks_the_newest_frame_not_after_the_timestamp(service):
+    head, times, frames = frozen(service)
+    newest, oldest = head, (head + 1) % service.size
+    assert np.array_equal(service.frame_at(), frames[newest])
+    for back in range(service.size - 1):
+        slot = (head - back) % service.size
+        previous = (slot - 1) % service.size
+        assert np.array_equal(service.frame_at(times[slot]), frames[slot])
+        assert np.array_equal(service.frame_at(times[slot] - 1e-6), frames[previous])
+    # Older than anything buffered: the oldest frame is the best there is
+    assert np.array_equal(service.frame_at(times[oldest] - 60), frames[oldest])
+    # Frames are copies, not views into the ring
+    service.frame_at()[:] = 0
+    assert np.array_equal(service.frame_at(), frames[newest])
+
+
+def test_stale_buffer_is_not_served(service):
+    frozen(service)
+    assert service.frame_at(max_age=0) is None
+    assert service.frame_at() is not None
+    stats = service.stats()
+    assert (stats['missed'], stats['served']) == (1, 1)
+
+
+def test_stop_drops_the_buffer(service):
+    service.start()
+    wait_for(lambda: service.stats()['buffered'] > 0)
+    service.stop()
+    assert not service.running
+    assert service.frame_at() is None
+
+
+def test_unopenable_source_keeps_retrying(tmp_path):
+    service = CameraService(source=str(tmp_path / 'missing.avi'), enabled=True)
+    service.start()
+    try:
+        wait_for(lambda: service.running)
+        assert service.frame_at() is None
+        assert service.stats()['opens'] == 0
+    finally:
+        service.stop()
+
+
+def test_camera_stays_on_until_the_last_owner_releases(service):
+    assert service.acquire('process-monitor')
+    # A second hold by the same owner counts once
+    assert not service.acquire('process-monitor')
+    assert not service.acquire('windows-monitor')
+    wait_for(lambda: service.stats()['buffered'] > 0)
+
+    assert not service.release('windows-monitor')
+    assert service.running and service.frame_at() is not None
+    assert service.stats()['owners'] == ['process-monitor']
+
+    assert service.release('process-monitor')
+    assert not service.running
+    assert service.stats()['owners'] == []
+
+
+def test_stopping_one_monitor_keeps_the_camera_for_the_other(backend_app, service, monkeypatch):
+    module = backend_app
+    monkeypatch.setattr(module, 'camera_service', service)
+    monkeypatch.setattr(module, '_workers_started', True)
+    # The process monitor itself needs win32 APIs; only its camera hold matters here
+    monkeypatch.setattr(module, 'monitoring_service',
+                        SimpleNamespace(start_monitoring=lambda names: None, stop_monitoring=lambda: None))
+    monitor = module.WindowsAppMonitor()
+    monkeypatch.setattr(monitor, '_monitor_loop', lambda: None)
+    client = module.app.test_client()
+
+    assert client.post('/api/monitor/start', json={'process_names': ['notepad.exe']}).status_code == 200
+    monitor.start_monitoring()
+    wait_for(lambda: service.stats()['buffered'] > 0)
+
+    monitor.stop_monitoring()
+    assert service.running and service.stats()['owners'] == ['process-monitor']
+    monitor.start_monitoring()
+    assert client.post('/api/monitor/stop').status_code == 200
+    assert service.running and service.stats()['owners'] == ['windows-monitor']
+    monitor.stop_monitoring()
+    assert not service.running
@@ -0,0 +1,126 @@
+import threading
+import time
+
+import pytest
+from werkzeug.security import check_password_hash, generate_password_hash
+
+import credentials
+from credentials import CredentialVerifier, VerifierBusy, authenticate
+from login_check import LOGIN_BAD_PASSWORD, LOGIN_OK
+from storage import SQLiteStorage
+
+OLD_METHOD = 'pbkdf2:sha256:1000'
+METHOD = 'pbkdf2:sha256:2000'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'login.db'))
+    storage.migrate()
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def gate(monkeypatch):
+    """Holds every password check until set"""
+    gate = threading.Event()
+    started = threading.Semaphore(0)
+
+    def slow_check(stored, password):
+        started.release()
+        gate.wait(5)
+        return check_password_hash(stored, password)
+
+    monkeypatch.setattr(credentials, 'check_password_hash', slow_check)
+    gate.started = started
+    yield gate
+    gate.set()
+
+
+def stored_password(storage, username):
+    return storage.lookup_login(username, None, record=False)[0]
+
+
+def test_full_queue_fails_fast_with_verifier_busy(gate):
+    verifier = CredentialVerifier(method=OLD_METHOD, workers=1, max_queue=1, timeout=5)
+    stored = generate_password_hash('secret', OLD_METHOD)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(verifier.verify(stored, 'secret')))
+               for _ in range(2)]
+    threads[0].start()
+    assert gate.started.acquire(timeout=5)
+    threads[1].start()
+    while verifier.stats()['queue_depth'] < 1:
+        time.sleep(0.001)
+
+    began = time.monotonic()
+    with pytest.raises(VerifierBusy) as busy:
+        verifier.verify(stored, 'secret')
+    assert time.monotonic() - began < 1
+    assert busy.value.retry_after >= 1
+
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == [(True, None), (True, None)]
+    stats = verifier.stats()
+    assert (stats['rejected'], stats['completed'], stats['queue_depth'], stats['active']) == (1, 2, 0, 0)
+    # The freed slots accept work again
+    assert verifier.verify(stored, 'secret') == (True, None)
+    verifier.shutdown()
+
+
+def test_timeout_gives_up_but_the_hash_frees_its_slot(gate):
+    verifier = CredentialVerifier(method=OLD_METHOD, workers=1, max_queue=0, timeout=0.05)
+    stored = generate_password_hash('secret', OLD_METHOD)
+    with pytest.raises(VerifierBusy):
+        verifier.verify(stored, 'secret')
+    assert verifier.stats()['timeouts'] == 1
+
+    gate.set()
+    verifier.shutdown()
+    verifier.timeout = 5
+    assert verifier.verify(stored, 'secret') == (True, None)
+    assert verifier.stats()['completed'] == 2
+    verifier.shutdown()
+
+
+def test_login_rehashes_an_outdated_hash(storage):
+    storage.create_user('alice', generate_password_hash('secret', OLD_METHOD), 'alice@example.com')
+    verifier = CredentialVerifier(method=METHOD, workers=1)
+
+    assert authenticate(storage, verifier, 'alice', 'wrong')[0] == LOGIN_BAD_PASSWORD
+    assert stored_password(storage, 'alice').startswith(OLD_METHOD + '$')
+
+    assert authenticate(storage, verifier, 'alice', 'secret') == (LOGIN_OK, 'alice@example.com')
+    stored = stored_password(storage, 'alice')
+    assert stored.startswith(METHOD + '$') and check_password_hash(stored, 'secret')
+    assert verifier.stats()['rehashed'] == 1
+
+    # Already current: nothing more to write
+    assert authenticate(storage, verifier, 'alice', 'secret')[0] == LOGIN_OK
+    assert stored_password(storage, 'alice') == stored
+    assert verifier.stats()['rehashed'] == 1
+    verifier.shutdown()
+
+
+def test_login_upgrades_a_legacy_plaintext_row(storage, monkeypatch):
+    storage.create_user('bob', 'hunter2', 'bob@example.com')
+    verifier = CredentialVerifier(method=METHOD, workers=1)
+    updates = []
+    update_user = storage.update_user
+    monkeypatch.setattr(storage, 'update_user',
+                        lambda username, **fields: updates.append((username, fields)) or update_user(username, **fields))
+
+    assert authenticate(storage, verifier, 'bob', 'hunter2') == (LOGIN_OK, 'bob@example.com')
+    [(username, fields)] = updates
+    assert username == 'bob' and list(fields) == ['password']
+    assert check_password_hash(stored_password(storage, 'bob'), 'hunter2')
+    verifier.shutdown()
+
+
+def test_method_prefix_expands_werkzeug_short_forms():
+    assert CredentialVerifier(method=METHOD).method_prefix == METHOD
+    assert CredentialVerifier(method='scrypt').method_prefix.startswith('scrypt:')
+    assert not CredentialVerifier(method='scrypt').needs_rehash(generate_password_hash('x', 'scrypt'))
@@ -0,0 +1,188 @@
+import threading
+
+import pytest
+
+import db_pool
+from db_pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.connected = True
+        self.closed = False
+        self.pings = 0
+        self.rollbacks = 0
+        self.ping_fails = False
+        self.rollback_fails = False
+
+    def isconnected(self):
+        return self.connected
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def rollback(self):
+        if self.rollback_fails:
+            raise ConnectionError('socket closed')
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, query):
+        if self.conn.ping_fails:
+            raise ConnectionError('server went away')
+        self.conn.pings += 1
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def opened():
+    return []
+
+
+@pytest.fixture
+def pool(opened):
+    def connect():
+        opened.append(FakeConnection(len(opened)))
+        return opened[-1]
+    return ConnectionPool(connect, max_size=2, timeout=0.05, max_age=100, ping_after=10)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(db_pool.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_connections_are_reused(pool, opened):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert first is second
+    assert len(opened) == 1
+    stats = pool.stats()
+    assert (stats['checkouts'], stats['opened'], stats['idle'], stats['in_use']) == (2, 1, 1, 0)
+
+
+def test_checkout_times_out_when_exhausted(pool):
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+    pool.release(held[0])
+    assert pool.acquire() is held[0]
+
+
+def test_waiter_gets_a_released_connection(pool):
+    held = [pool.acquire(), pool.acquire()]
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=5)))
+    waiter.start()
+    threading.Event().wait(0.05)
+    pool.release(held[1])
+    waiter.join()
+    assert got == [held[1]]
+
+
+def test_disconnected_connection_is_replaced(pool, opened):
+    with pool.connection() as conn:
+        pass
+    conn.connected = False
+    with pool.connection() as replacement:
+        pass
+    assert replacement is not conn and conn.closed
+    assert pool.stats()['recycled'] == 1
+
+
+def test_idle_connection_is_pinged_before_use(pool, opened, clock):
+    with pool.connection() as conn:
+        pass
+    clock[0] += 5
+    with pool.connection():
+        pass
+    assert conn.pings == 0
+    clock[0] += 10
+    with pool.connection():
+        pass
+    assert conn.pings == 1
+    clock[0] += 10
+    conn.ping_fails = True
+    with pool.connection() as replacement:
+        pass
+    assert replacement is not conn and conn.closed
+
+
+def test_old_connections_are_recycled(pool, opened, clock):
+    with pool.connection() as conn:
+        clock[0] += 100
+    assert conn.closed
+    assert pool.stats()['recycled'] == 1
+    with pool.connection() as fresh:
+        pass
+    assert fresh is not conn
+
+
+def test_error_rolls_back_and_discards_broken_connections(pool, opened):
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            raise ValueError('bad query')
+    assert conn.rollbacks == 1 and not conn.closed
+    with pytest.raises(ValueError):
+        with pool.connection() as same:
+            same.rollback_fails = True
+            raise ValueError('bad query')
+    assert same is conn and conn.closed
+    assert pool.stats()['size'] == 0
+
+
+def test_failed_connect_frees_its_slot(opened):
+    attempts = []
+
+    def connect():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError('refused')
+        return FakeConnection(len(attempts))
+
+    pool = ConnectionPool(connect, max_size=1, timeout=0.05)
+    with pytest.raises(ConnectionError):
+        pool.acquire()
+    assert pool.acquire().number == 2
+
+
+def test_close_refuses_checkouts_and_closes_returned_connections(pool):
+    held = pool.acquire()
+    with pool.connection() as idle:
+        pass
+    pool.close()
+    assert idle.closed and not held.closed
+    with pytest.raises(PoolTimeout):
+        pool.acquire()
+    pool.release(held)
+    assert held.closed
+
+
+def test_statement_cursors_are_cached_per_connection(pool):
+    with pool.connection() as conn:
+        cursor = pool.statement(conn, 'CALL LOGIN_LOOKUP(?, ?, ?, ?)')
+        assert pool.statement(conn, 'CALL LOGIN_LOOKUP(?, ?, ?, ?)') is cursor
+        assert pool.statement(conn, 'SELECT 1') is not cursor
+    with pool.connection() as same:
+        assert pool.statement(same, 'CALL LOGIN_LOOKUP(?, ?, ?, ?)') is cursor
+    same.connected = False
+    with pool.connection() as replacement:
+        assert pool.statement(replacement, 'CALL LOGIN_LOOKUP(?, ?, ?, ?)') is not cursor
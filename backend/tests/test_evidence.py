@@ -0,0 +1,91 @@
+import base64
+import email
+from email.message import EmailMessage
+from email.policy import default
+
+import pytest
+
+from alert_queue import AlertQueue
+from evidence import Evidence
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 40
+JPEG = b'\xff\xd8\xff\xe0' + bytes(reversed(range(256))) * 25 + b'\xff\xd9'
+LOCATION = {'city': 'Berlin', 'region': 'Berlin', 'country': 'DE', 'timezone': 'Europe/Berlin'}
+
+
+def legacy_attachments(screenshot, camera_image):
+    """How alerts attached images before Evidence: base64 strings decoded at send time"""
+    msg = EmailMessage()
+    msg.set_content('alert')
+    msg.add_attachment(base64.b64decode(screenshot.split(',')[-1]), maintype='image', subtype='png',
+                       filename='screenshot.png')
+    msg.add_attachment(base64.b64decode(camera_image.split(',')[-1]), maintype='image', subtype='jpeg',
+                       filename='intruder.jpg')
+    return msg
+
+
+def attachments(msg):
+    """(filename, content type, decoded bytes) for each attachment after a serialise/parse round trip"""
+    parsed = email.message_from_bytes(msg.as_bytes(), policy=default)
+    return [(part.get_filename(), part.get_content_type(), part.get_payload(decode=True))
+            for part in parsed.iter_attachments()]
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview], ids=['bytes', 'bytearray', 'memoryview'])
+def test_attachments_match_the_base64_path(wrap):
+    screenshot = 'data:image/png;base64,' + base64.b64encode(PNG).decode()
+    camera_image = base64.b64encode(JPEG).decode()
+
+    msg = EmailMessage()
+    msg.set_content('alert')
+    Evidence(wrap(PNG), 'image/png', 'screenshot.png').attach_to(msg)
+    Evidence(wrap(JPEG), 'image/jpeg', 'intruder.jpg').attach_to(msg)
+
+    assert attachments(msg) == attachments(legacy_attachments(screenshot, camera_image)) == [
+        ('screenshot.png', 'image/png', PNG),
+        ('intruder.jpg', 'image/jpeg', JPEG),
+    ]
+    assert [part['Content-Transfer-Encoding'] for part in msg.iter_attachments()] == ['base64', 'base64']
+
+
+def test_size_counts_bytes_not_elements():
+    # A view of 4-byte items has a quarter as many elements as bytes
+    view = memoryview(PNG).cast('I')
+    image = Evidence(view, 'image/png', 'screenshot.png')
+    assert (len(view), image.size) == (len(PNG) // 4, len(PNG))
+    msg = EmailMessage()
+    image.attach_to(msg)
+    [(_, _, payload)] = attachments(msg)
+    assert len(payload) == image.size
+    assert not Evidence(b'', 'image/png')
+
+
+def test_data_url_round_trip():
+    image = Evidence(JPEG, 'image/jpeg', 'intruder.jpg')
+    decoded = Evidence.from_data_url(image.to_data_url(), 'image/png', 'intruder.png')
+    assert (decoded.data, decoded.mime_type, decoded.filename) == (JPEG, 'image/jpeg', 'intruder.jpeg')
+    assert Evidence.from_data_url(image.to_base64(), 'image/jpeg').data == JPEG
+    assert Evidence.from_data_url('not base64!', 'image/png') is None
+    assert Evidence.from_data_url({'data': 'x'}, 'image/png') is None
+
+
+def test_queued_alert_mail_carries_the_original_bytes(backend_app, tmp_path, monkeypatch):
+    module = backend_app
+    sent = []
+    monkeypatch.setattr(module.smtp_sessions, 'send', sent.append)
+    queue = AlertQueue(path=str(tmp_path / 'alerts.db'))
+    queue.register('security_alert', module.deliver_security_alert)
+
+    alert = {'recipient': 'owner@example.com', 'app_name': 'AppSec', 'ip_address': '10.0.0.1',
+             'location': LOCATION, 'time': '2024-05-20 12:00:00'}
+    queue.enqueue('security_alert', alert, evidence=[
+        Evidence(memoryview(PNG), 'image/png', 'screenshot.png'),
+        Evidence(JPEG, 'image/jpeg', 'intruder.jpg'),
+    ])
+    # A job queued before evidence moved to BLOBs still carries base64 in its payload
+    queue.enqueue('security_alert', dict(alert, screenshot=base64.b64encode(PNG).decode(),
+                                         camera_image='data:image/jpeg;base64,' + base64.b64encode(JPEG).decode()))
+    assert queue.run_once() and queue.run_once()
+
+    expected = [('screenshot.png', 'image/png', PNG), ('intruder.jpg', 'image/jpeg', JPEG)]
+    assert [attachments(msg) for msg in sent] == [expected, expected]
@@ -0,0 +1,146 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+import pytest
+
+import http_client
+from geolocation import GeoLocator, format_location
+from http_client import CircuitOpen, HttpClient
+
+LOCATIONS = {
+    '8.8.8.8': {'city': 'Mountain View', 'regionName': 'California', 'country': 'United States'},
+    '1.1.1.1': {'city': 'Sydney', 'regionName': 'New South Wales', 'country': 'Australia'},
+}
+
+
+class IpApiStub(ThreadingHTTPServer):
+    """Answers ip-api's /json/<ip> and /batch; ``failures`` 503s are served first"""
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), IpApiHandler)
+        self.requests = []
+        self.failures = 0
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+
+class IpApiHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _location(self, ip_address):
+        if ip_address not in LOCATIONS:
+            return {'status': 'fail', 'message': 'reserved range', 'query': ip_address}
+        return dict(LOCATIONS[ip_address], status='success', query=ip_address)
+
+    def _reply(self, body):
+        self.server.requests.append(self.path)
+        if self.server.failures:
+            self.server.failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self._reply(self._location(urlparse(self.path).path.rsplit('/', 1)[-1]))
+
+    def do_POST(self):
+        addresses = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self._reply([self._location(ip_address) for ip_address in addresses])
+
+
+@pytest.fixture
+def stub():
+    server = IpApiStub()
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub):
+    client = HttpClient()
+    client.register('ip-api', stub.url, timeout=2.0, retries=2, backoff=0, threshold=2, reset_timeout=30.0)
+    yield client
+    client.close()
+
+
+def test_lookup_is_cached_and_private_addresses_stay_local(stub, client):
+    locator = GeoLocator(client=client)
+    location = locator.lookup('8.8.8.8')
+    assert format_location(location) == 'Mountain View, California, United States'
+    assert locator.lookup('8.8.8.8') == location
+    assert locator.lookup('192.168.1.10') is None
+    assert locator.lookup('not an address') is None
+    assert len(stub.requests) == 1
+
+
+def test_failed_lookup_is_negatively_cached(stub, client):
+    locator = GeoLocator(client=client, negative_ttl=300)
+    assert locator.lookup('9.9.9.9') is None
+    assert locator.locate('9.9.9.9')['city'] == 'Unknown'
+    assert len(stub.requests) == 1
+    assert locator.stats()['failures'] == 1
+
+
+def test_lookup_many_uses_one_batch_request(stub, client):
+    locator = GeoLocator(client=client)
+    locator.lookup('8.8.8.8')
+    results = locator.lookup_many(['8.8.8.8', '1.1.1.1', '9.9.9.9', '10.0.0.1', '1.1.1.1'])
+    assert results['1.1.1.1']['city'] == 'Sydney'
+    assert results['8.8.8.8']['city'] == 'Mountain View'
+    assert results['9.9.9.9'] is None and results['10.0.0.1'] is None
+    # The cached address was not sent again, and the rest went out together
+    assert [path.split('?')[0] for path in stub.requests] == ['/json/8.8.8.8', '/batch']
+    assert locator.lookup('1.1.1.1')['city'] == 'Sydney'
+    assert len(stub.requests) == 2
+
+
+def test_retries_server_errors(stub, client):
+    stub.failures = 2
+    assert client.get_json('ip-api', '/json/1.1.1.1')['city'] == 'Sydney'
+    stats = client.stats()['ip-api']
+    assert (stats['calls'], stats['retried'], stats['failures'], stats['breaker']) == (1, 2, 0, 'closed')
+
+
+def test_breaker_opens_then_half_opens(stub, client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    stub.failures = 6
+    locator = GeoLocator(client=client, negative_ttl=0)
+    assert locator.lookup('8.8.8.8') is None
+    assert locator.lookup('8.8.8.8') is None
+    assert client.stats()['ip-api']['breaker'] == 'open'
+    with pytest.raises(CircuitOpen):
+        client.get('ip-api', '/json/8.8.8.8')
+    assert len(stub.requests) == 6
+
+    now[0] += 30
+    assert client.stats()['ip-api']['breaker'] == 'half-open'
+    assert locator.lookup('8.8.8.8')['city'] == 'Mountain View'
+    stats = client.stats()['ip-api']
+    assert (stats['breaker'], stats['breaker_opens'], stats['rejected']) == ('closed', 1, 1)
+
+
+def test_cache_survives_a_restart(stub, client, tmp_path):
+    path = str(tmp_path / 'geolocation.json')
+    locator = GeoLocator(client=client, persist_path=path)
+    locator.lookup('8.8.8.8')
+    locator.save()
+    restarted = GeoLocator(client=client, persist_path=path)
+    assert restarted.lookup('8.8.8.8')['city'] == 'Mountain View'
+    assert len(stub.requests) == 1
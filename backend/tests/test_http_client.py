@@ -0,0 +1,105 @@
+import threading
+
+import pytest
+import requests
+
+import http_client
+from http_client import CircuitOpen, HttpClient
+
+
+class Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class FakeSession:
+    """Stands in for requests.Session: pops scripted outcomes, then answers 200"""
+
+    def __init__(self, outcomes=()):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def request(self, method, url, **kwargs):
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if self.outcomes else 200
+        if isinstance(outcome, Exception):
+            raise outcome
+        return Response(outcome)
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(http_client.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def make_client(outcomes=(), retries=0, threshold=1):
+    client = HttpClient()
+    client.register('upstream', 'http://upstream.invalid', retries=retries, backoff=0, threshold=threshold,
+                    reset_timeout=30.0)
+    client._session = FakeSession(outcomes)
+    return client
+
+
+def test_unexpected_error_in_the_trial_releases_it(clock):
+    client = make_client([requests.ConnectionError('down'), TypeError('bad payload')])
+    with pytest.raises(requests.ConnectionError):
+        client.get('upstream')
+    assert client.stats()['upstream']['breaker'] == 'open'
+
+    clock[0] += 30
+    with pytest.raises(TypeError):
+        client.get('upstream')
+    # Still half-open, and the next call is let through as a new trial
+    assert client.stats()['upstream']['breaker'] == 'half-open'
+    assert client.get('upstream').status_code == 200
+    stats = client.stats()['upstream']
+    assert (stats['breaker'], stats['calls'], stats['failures'], stats['rejected']) == ('closed', 3, 1, 0)
+
+
+def test_failed_trial_reopens_and_rejects(clock):
+    client = make_client([requests.ConnectionError('down'), requests.Timeout('slow')])
+    with pytest.raises(requests.ConnectionError):
+        client.get('upstream')
+    clock[0] += 30
+    with pytest.raises(requests.Timeout):
+        client.get('upstream')
+    with pytest.raises(CircuitOpen):
+        client.get('upstream')
+    stats = client.stats()['upstream']
+    assert (stats['breaker'], stats['breaker_opens'], stats['rejected']) == ('open', 2, 1)
+    assert client._session.calls == 2
+
+
+class AlternatingSession(FakeSession):
+    """Per thread: 503 then 200 for one request, 200 for the next"""
+
+    def __init__(self):
+        super().__init__()
+        self.local = threading.local()
+
+    def request(self, method, url, **kwargs):
+        step = getattr(self.local, 'step', 0)
+        self.local.step = (step + 1) % 3
+        return Response(503 if step == 0 else 200)
+
+
+def test_counters_are_exact_under_concurrency():
+    client = make_client(retries=1, threshold=10 ** 6)
+    client._session = AlternatingSession()
+
+    def worker():
+        for _ in range(1000):
+            client.get('upstream')
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = client.stats()['upstream']
+    assert (stats['calls'], stats['retried'], stats['failures']) == (6000, 3000, 0)
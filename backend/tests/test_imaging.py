@@ -0,0 +1,88 @@
+import random
+from io import BytesIO
+
+import pytest
+
+import imaging
+from imaging import ImageEncoder
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def noisy(width, height, seed=1):
+    # Random pixels barely compress, so every budget below forces real work
+    rng = random.Random(seed)
+    return Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3))
+
+
+def smooth(width, height):
+    return Image.linear_gradient('L').resize((width, height)).convert('RGB')
+
+
+def decoded(evidence):
+    return Image.open(BytesIO(evidence.data))
+
+
+def test_small_image_keeps_max_quality():
+    encoder = ImageEncoder(max_bytes=300_000, formats=('jpeg',))
+    evidence = encoder.encode(smooth(640, 480), 'camera')
+    assert (evidence.mime_type, evidence.filename) == ('image/jpeg', 'camera.jpg')
+    assert decoded(evidence).size == (640, 480)
+    assert encoder.stats()['encodes'] == 1
+
+
+def test_large_image_is_fitted_to_max_dimensions():
+    encoder = ImageEncoder(max_width=800, max_height=800, formats=('jpeg',))
+    assert decoded(encoder.encode(smooth(3200, 1600))).size == (800, 400)
+
+
+def test_quality_search_meets_the_budget():
+    encoder = ImageEncoder(max_bytes=60_000, formats=('jpeg',))
+    evidence = encoder.encode(noisy(400, 300))
+    assert len(evidence.data) <= 60_000
+    # Found by searching quality, not by shrinking the picture
+    assert decoded(evidence).size == (400, 300)
+    assert encoder.stats()['over_budget'] == 0
+
+
+def test_downscales_when_lowest_quality_is_too_large():
+    encoder = ImageEncoder(max_bytes=40_000, formats=('jpeg',))
+    evidence = encoder.encode(noisy(1200, 900))
+    assert len(evidence.data) <= 40_000
+    width, height = decoded(evidence).size
+    assert imaging.MIN_DIMENSION <= width < 1200
+    assert abs(width / height - 4 / 3) < 0.01
+
+
+def test_unreachable_budget_is_reported_over_budget():
+    encoder = ImageEncoder(max_bytes=1_000, formats=('jpeg',))
+    evidence = encoder.encode(noisy(1200, 900))
+    assert len(evidence.data) > 1_000
+    assert max(decoded(evidence).size) == imaging.MIN_DIMENSION
+    assert encoder.stats()['over_budget'] == 1
+
+
+def test_webp_preferred_and_jpeg_used_without_it(monkeypatch):
+    encoder = ImageEncoder(max_bytes=100_000)
+    if imaging.PIL_features.check('webp'):
+        assert encoder.encode(smooth(640, 480), 'screen').filename == 'screen.webp'
+    monkeypatch.setattr(imaging.PIL_features, 'check', lambda feature: False)
+    evidence = encoder.encode(smooth(640, 480), 'screen')
+    assert (evidence.mime_type, evidence.filename) == ('image/jpeg', 'screen.jpg')
+
+
+def test_next_format_tried_when_first_misses_budget():
+    encoder = ImageEncoder(max_bytes=50_000, formats=('png', 'jpeg'))
+    evidence = encoder.encode(noisy(400, 300))
+    assert evidence.mime_type == 'image/jpeg'
+    assert len(evidence.data) <= 50_000
+
+
+def test_rgba_and_bgr_inputs():
+    np = pytest.importorskip('numpy')
+    encoder = ImageEncoder(formats=('jpeg',))
+    assert decoded(encoder.encode(Image.new('RGBA', (64, 48), (255, 0, 0, 128)))).mode == 'RGB'
+    frame = np.zeros((48, 64, 3), dtype=np.uint8)
+    frame[:, :, 0] = 255  # blue in OpenCV's channel order
+    red, green, blue = decoded(encoder.encode_bgr(frame)).getpixel((32, 24))
+    assert blue > 200 and red < 50
@@ -0,0 +1,97 @@
+import pytest
+
+from ipdb import IPRangeDatabase
+
+CSV = """start_ip,end_ip,country,stateprov,city,timezone,isp,latitude,longitude
+10.0.0.0,10.0.0.255,US,California,San Jose,America/Los_Angeles,ExampleNet,37.33,-121.89
+10.0.2.0,10.0.2.255,DE,Berlin,Berlin,Europe/Berlin,,52.52,13.40
+10.0.3.0,10.0.3.127,US,California,San Jose,America/Los_Angeles,ExampleNet,37.33,-121.89
+1.0.0.0,1.0.0.255,AU,Queensland,Brisbane,Australia/Brisbane,APNIC,-27.47,153.02
+2001:db8::,2001:db8::ffff,NL,North Holland,Amsterdam,Europe/Amsterdam,,52.37,4.90
+2001:db8:0:1::,2001:db8:0:1:ffff:ffff:ffff:ffff,FR,Ile-de-France,Paris,Europe/Paris,,48.86,2.35
+"""
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / 'ranges.csv'
+    path.write_text(CSV, encoding='utf-8')
+    return IPRangeDatabase.load(str(path))
+
+
+def city(db, address):
+    location = db.lookup(address)
+    return location and location['city']
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('10.0.0.0', 'San Jose'),
+    ('10.0.0.255', 'San Jose'),
+    ('10.0.1.0', None),
+    ('10.0.1.255', None),
+    ('10.0.2.0', 'Berlin'),
+    ('10.0.2.255', 'Berlin'),
+    ('10.0.3.127', 'San Jose'),
+    ('10.0.3.128', None),
+    ('0.255.255.255', None),
+    ('1.0.0.0', 'Brisbane'),
+    ('255.255.255.255', None),
+])
+def test_ipv4_range_boundaries_and_gaps(db, address, expected):
+    assert city(db, address) == expected
+
+
+@pytest.mark.parametrize('address, expected', [
+    ('2001:db7:ffff:ffff:ffff:ffff:ffff:ffff', None),
+    ('2001:db8::', 'Amsterdam'),
+    ('2001:db8::ffff', 'Amsterdam'),
+    ('2001:db8::1:0', None),
+    ('2001:db8:0:1::', 'Paris'),
+    # The end differs from the start only in the low 64 bits
+    ('2001:db8:0:1:ffff:ffff:ffff:ffff', 'Paris'),
+    ('2001:db8:0:2::', None),
+    ('::', None),
+])
+def test_ipv6_range_boundaries_and_gaps(db, address, expected):
+    assert city(db, address) == expected
+
+
+def test_ipv4_mapped_ipv6_uses_the_ipv4_table(db):
+    assert city(db, '::ffff:10.0.2.7') == 'Berlin'
+
+
+def test_invalid_addresses_miss(db):
+    assert db.lookup('not-an-ip') is None
+    assert db.lookup('') is None
+
+
+def test_location_fields_and_deduplication(db):
+    assert db.lookup('10.0.2.1') == {
+        'city': 'Berlin', 'region': 'Berlin', 'state': 'Berlin', 'country': 'DE',
+        'timezone': 'Europe/Berlin', 'isp': 'Unknown', 'lat': 52.52, 'lon': 13.40,
+    }
+    # The two San Jose ranges share one location tuple
+    assert db.stats() == {
+        'path': db.path, 'ipv4_ranges': 4, 'ipv6_ranges': 2, 'locations': 5,
+    }
+
+
+def test_headerless_dbip_city_layout(tmp_path):
+    path = tmp_path / 'dbip.csv'
+    path.write_text(
+        '192.0.2.0,192.0.2.255,NA,US,Virginia,Ashburn,39.04,-77.49\n',
+        encoding='utf-8',
+    )
+    db = IPRangeDatabase.load(str(path))
+    location = db.lookup('192.0.2.128')
+    assert (location['country'], location['region'], location['city']) == ('US', 'Virginia', 'Ashburn')
+    assert (location['lat'], location['lon']) == (39.04, -77.49)
+    assert location['timezone'] == 'Unknown'
+
+
+def test_empty_file_misses_everything(tmp_path):
+    path = tmp_path / 'empty.csv'
+    path.write_text('', encoding='utf-8')
+    db = IPRangeDatabase.load(str(path))
+    assert db.lookup('10.0.0.1') is None
+    assert db.lookup('2001:db8::1') is None
@@ -0,0 +1,97 @@
+import pytest
+
+from cache import TTLCache
+from pagination import decode_cursor, encode_cursor
+from storage import SQLiteStorage
+
+USERS = [
+    ('al', 'zed@example.com'),
+    ('alice', 'alice@example.com'),
+    ('alicia', 'alicia@corp.example'),
+    ('bob', 'alice.b@example.com'),
+    ('carol', 'carol@corp.example'),
+]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'users.db'), user_page_cache=TTLCache(max_size=16, ttl=30))
+    storage.migrate()
+    for username, email in USERS:
+        storage.create_user(username, 'hash', email)
+    yield storage
+    storage.close()
+
+
+def all_pages(storage, limit, username=None, email=None):
+    """Walk list_users a page at a time through encoded cursors, like GET /api/db/users"""
+    by_email = email and not username
+    pages = []
+    after = None
+    while True:
+        page = storage.list_users(limit + 1, username=username, email=email, after=after)
+        pages.append(page[:limit])
+        if len(page) <= limit:
+            return pages
+        last = page[limit - 1]
+        token = encode_cursor(last[1], last[0]) if by_email else encode_cursor(last[0])
+        after = decode_cursor(token)
+
+
+def test_username_prefix_matches_a_range(storage):
+    assert storage.list_users(username='ali') == [
+        ('alice', 'alice@example.com'), ('alicia', 'alicia@corp.example'),
+    ]
+    assert [row[0] for row in storage.list_users(username='al')] == ['al', 'alice', 'alicia']
+    assert storage.list_users(username='zz') == []
+    assert len(storage.list_users()) == len(USERS)
+
+
+def test_email_prefix_orders_by_email(storage):
+    assert storage.list_users(email='alice') == [
+        ('bob', 'alice.b@example.com'), ('alice', 'alice@example.com'),
+    ]
+    # With both prefixes the order stays by username
+    assert storage.list_users(username='a', email='ali') == [
+        ('alice', 'alice@example.com'), ('alicia', 'alicia@corp.example'),
+    ]
+
+
+def test_cursor_round_trip_visits_every_user_once(storage):
+    pages = all_pages(storage, 2)
+    assert [len(page) for page in pages] == [2, 2, 1]
+    assert [row for page in pages for row in page] == sorted(USERS)
+
+
+def test_email_cursor_round_trip_breaks_ties_on_username(storage):
+    storage.create_user('dave', 'hash', 'carol@corp.example')
+    pages = all_pages(storage, 1, email='c')
+    assert [row for page in pages for row in page] == [
+        ('carol', 'carol@corp.example'), ('dave', 'carol@corp.example'),
+    ]
+
+
+def test_pages_are_cached_until_a_user_write(storage):
+    first = storage.list_users(10, username='a')
+    # A write that bypasses storage is not seen while the page is cached
+    with storage.connection() as conn:
+        conn.execute("INSERT INTO USERS (USERNAME, PASSWORD, EMAIL) VALUES ('amy', 'hash', 'amy@example.com')")
+        conn.commit()
+    assert storage.list_users(10, username='a') == first
+    assert storage.cache_stats()['user_pages']['hits'] == 1
+
+    storage.create_user('anna', 'hash', 'anna@example.com')
+    assert [row[0] for row in storage.list_users(10, username='a')] == ['al', 'alice', 'alicia', 'amy', 'anna']
+
+    storage.update_user('alice', email='alice@new.example')
+    assert ('alice', 'alice@new.example') in storage.list_users(10, username='a')
+    assert storage.list_users(email='alice@new') == [('alice', 'alice@new.example')]
+
+
+def test_a_duplicate_create_still_clears_the_pages(storage):
+    assert storage.list_users(username='bob') == [('bob', 'alice.b@example.com')]
+    with storage.connection() as conn:
+        conn.execute("UPDATE USERS SET EMAIL = 'bob@example.com' WHERE USERNAME = 'bob'")
+        conn.commit()
+    assert not storage.create_user('bob', 'hash', 'other@example.com')
+    assert storage.list_users(username='bob') == [('bob', 'bob@example.com')]
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+import lockout
+from lockout import LockoutEngine, MemoryLockoutBackend, SQLiteLockoutBackend
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(lockout.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryLockoutBackend()
+    return SQLiteLockoutBackend(str(tmp_path / 'lockout.db'))
+
+
+def test_username_locks_at_threshold(backend, clock):
+    engine = LockoutEngine(backend=backend, threshold=3, window=60)
+    assert engine.remaining('alice') == 3
+    assert [engine.record_failure('alice') for _ in range(3)] == [2, 1, 0]
+    assert engine.is_locked('alice')
+    assert not engine.is_locked('bob')
+
+
+def test_failures_slide_out_of_the_window(backend, clock):
+    engine = LockoutEngine(backend=backend, threshold=3, window=60)
+    engine.record_failure('alice')
+    clock[0] += 30
+    engine.record_failure('alice')
+    engine.record_failure('alice')
+    assert engine.is_locked('alice')
+    clock[0] += 30
+    # The first failure is now exactly one window old and no longer counts
+    assert engine.remaining('alice') == 1
+    assert engine.record_failure('alice') == 0
+    clock[0] += 61
+    assert engine.remaining('alice') == 3
+
+
+def test_ip_locks_across_usernames(backend, clock):
+    engine = LockoutEngine(backend=backend, threshold=3, ip_threshold=4, window=60)
+    for name in ('alice', 'bob', 'carol'):
+        engine.record_failure(name, '10.0.0.1')
+    assert engine.remaining('dave', '10.0.0.1') == 1
+    assert engine.record_failure('dave', '10.0.0.1') == 0
+    assert engine.is_locked('erin', '10.0.0.1')
+    assert not engine.is_locked('erin', '10.0.0.2')
+
+
+def test_reset_clears_only_the_username(backend, clock):
+    engine = LockoutEngine(backend=backend, threshold=2, ip_threshold=3, window=60)
+    engine.record_failure('alice', '10.0.0.1')
+    engine.record_failure('alice', '10.0.0.1')
+    engine.reset('alice')
+    assert engine.remaining('alice') == 2
+    assert engine.remaining('alice', '10.0.0.1') == 1
+
+
+def test_idle_keys_are_swept(backend, clock):
+    engine = LockoutEngine(backend=backend, threshold=3, window=60)
+    for i in range(20):
+        engine.record_failure(f'user{i}')
+    assert engine.stats()['tracked_keys'] == 20
+    clock[0] += 61
+    engine.record_failure('late')
+    assert engine.stats()['tracked_keys'] == 1
+
+
+def test_sqlite_backend_is_shared_between_engines(tmp_path, clock):
+    path = str(tmp_path / 'lockout.db')
+    first = LockoutEngine(backend=SQLiteLockoutBackend(path), threshold=3, window=60)
+    second = LockoutEngine(backend=SQLiteLockoutBackend(path), threshold=3, window=60)
+    first.record_failure('alice')
+    second.record_failure('alice')
+    assert first.record_failure('alice') == 0
+    assert second.is_locked('alice')
+
+
+def test_concurrent_failures_are_all_counted(backend):
+    engine = LockoutEngine(backend=backend, threshold=1000, window=600)
+    barrier = threading.Barrier(8)
+
+    def worker():
+        barrier.wait()
+        for _ in range(25):
+            engine.record_failure('alice')
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert engine.remaining('alice') == 800
@@ -0,0 +1,69 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from credentials import CredentialVerifier, VerifierBusy, authenticate
+from login_check import LOGIN_BAD_PASSWORD, LOGIN_OK, LOGIN_UNKNOWN_USER
+from storage import SQLiteStorage
+
+METHOD = 'pbkdf2:sha256:1000'
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'login.db'))
+    storage.migrate()
+    storage.create_user('alice', generate_password_hash('secret', METHOD), 'alice@example.com')
+    yield storage
+    storage.close()
+
+
+@pytest.fixture
+def verifier():
+    verifier = CredentialVerifier(method=METHOD, workers=1)
+    yield verifier
+    verifier.shutdown()
+
+
+def attempts(storage):
+    with storage.connection() as conn:
+        return conn.execute('SELECT USERNAME, SUCCESS, IP_ADDRESS FROM LOGIN_ATTEMPTS ORDER BY ID').fetchall()
+
+
+def test_lookup_records_a_provisional_failure(storage):
+    stored, email, attempt_id = storage.lookup_login('alice', '10.0.0.1')
+    assert stored.startswith('pbkdf2:') and email == 'alice@example.com'
+    assert attempts(storage) == [('alice', 0, '10.0.0.1')]
+    storage.discard_attempt(attempt_id)
+    assert attempts(storage) == []
+    assert storage.lookup_login('alice', '10.0.0.1', record=False)[2] is None
+    assert storage.lookup_login('mallory', '10.0.0.1') is None
+    assert attempts(storage) == []
+
+
+def test_failed_login_is_recorded_by_the_lookup(storage, verifier):
+    assert authenticate(storage, verifier, 'alice', 'wrong', '10.0.0.1', record=True) == \
+        (LOGIN_BAD_PASSWORD, 'alice@example.com')
+    assert attempts(storage) == [('alice', 0, '10.0.0.1')]
+    assert storage.count_failures('alice') == 1
+
+
+def test_successful_login_leaves_no_attempt(storage, verifier):
+    assert authenticate(storage, verifier, 'alice', 'secret', '10.0.0.1', record=True) == \
+        (LOGIN_OK, 'alice@example.com')
+    assert attempts(storage) == []
+
+
+def test_unknown_user_and_unrecorded_logins_write_nothing(storage, verifier):
+    assert authenticate(storage, verifier, 'mallory', 'x', '10.0.0.1', record=True) == (LOGIN_UNKNOWN_USER, None)
+    assert authenticate(storage, verifier, 'alice', 'wrong', '10.0.0.1')[0] == LOGIN_BAD_PASSWORD
+    assert attempts(storage) == []
+
+
+def test_busy_verifier_discards_the_provisional_attempt(storage, verifier, monkeypatch):
+    def busy(stored, password):
+        raise VerifierBusy(3)
+
+    monkeypatch.setattr(verifier, 'verify', busy)
+    with pytest.raises(VerifierBusy):
+        authenticate(storage, verifier, 'alice', 'wrong', '10.0.0.1', record=True)
+    assert attempts(storage) == []
@@ -0,0 +1,83 @@
+import smtplib
+import socket
+from email.message import EmailMessage
+
+import pytest
+
+from mailer import SMTPSessionPool
+
+aiosmtpd_controller = pytest.importorskip('aiosmtpd.controller')
+
+
+class Sink:
+    """Collects delivered messages and refuses recipients at refused.example"""
+
+    def __init__(self):
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.endswith('@refused.example'):
+            return '550 5.1.1 No such user'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.append(envelope.rcpt_tos[:])
+        return '250 Message accepted'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    sink = Sink()
+    controller = aiosmtpd_controller.Controller(sink, hostname='127.0.0.1', port=_free_port())
+    controller.start()
+    yield sink, controller.port
+    controller.stop()
+
+
+def _message(to):
+    message = EmailMessage()
+    message['From'] = 'alerts@appsec.example'
+    message['To'] = to
+    message['Subject'] = 'Security alert'
+    message.set_content('test')
+    return message
+
+
+def test_sessions_are_reused(smtp_sink):
+    sink, port = smtp_sink
+    pool = SMTPSessionPool(host='127.0.0.1', port=port)
+    pool.send(_message('a@ok.example'))
+    pool.send(_message('b@ok.example'))
+    stats = pool.stats()
+    assert stats['connects'] == 1
+    assert stats['reuses'] == 1
+    assert len(sink.delivered) == 2
+    pool.close()
+
+
+def test_refused_recipient_after_reconnect_fails_only_that_message(smtp_sink):
+    sink, port = smtp_sink
+    pool = SMTPSessionPool(host='127.0.0.1', port=port)
+    pool.send(_message('warmup@ok.example'))
+    # Drop the idle session underneath the pool, as a server timeout would
+    pool._idle[-1].smtp.sock.shutdown(socket.SHUT_RDWR)
+
+    results = pool.send_many([_message('x@refused.example'), _message('c@ok.example'),
+                              _message('d@ok.example')])
+
+    assert isinstance(results[0], smtplib.SMTPRecipientsRefused)
+    assert results[1:] == [None, None]
+    assert sink.delivered[1:] == [['c@ok.example'], ['d@ok.example']]
+    stats = pool.stats()
+    assert stats['reconnects'] == 1
+    assert stats['connects'] == 2
+    # The fresh session was healthy and goes back to the pool
+    assert stats['idle'] == 1
+    pool.close()
@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+import migrations
+from migrations import MIGRATIONS, SQLITE_MIGRATIONS, migrate
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'schema.db'))
+    yield conn
+    conn.close()
+
+
+def applied(conn):
+    return conn.execute('SELECT VERSION, DESCRIPTION FROM SCHEMA_VERSION ORDER BY VERSION').fetchall()
+
+
+def schema_objects(conn):
+    return {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+
+
+@pytest.mark.parametrize('history', [MIGRATIONS, SQLITE_MIGRATIONS], ids=['hana', 'sqlite'])
+def test_versions_are_consecutive(history):
+    assert [number for number, _, _ in history] == list(range(1, len(history) + 1))
+
+
+def test_check_login_history_is_kept_verbatim():
+    statements = {number: statements for number, _, statements in MIGRATIONS}
+    assert statements[4] == [migrations._CHECK_LOGIN_V4]
+    assert statements[5] == [migrations._CHECK_LOGIN_V5]
+    assert migrations._CHECK_LOGIN_V4 != migrations._CHECK_LOGIN_V5
+    assert 'P_MAX_ATTEMPTS' in migrations._CHECK_LOGIN_V4 and 'P_MAX_ATTEMPTS' not in migrations._CHECK_LOGIN_V5
+
+
+def test_fresh_database_applies_everything_in_order(conn, capsys):
+    assert migrate(conn, SQLITE_MIGRATIONS) == len(SQLITE_MIGRATIONS)
+    assert applied(conn) == [(number, description) for number, description, _ in SQLITE_MIGRATIONS]
+    printed = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Applying')]
+    assert printed == [f'Applying migration {number}: {description}'
+                       for number, description, _ in SQLITE_MIGRATIONS]
+    assert {'USERS', 'LOGIN_ATTEMPTS', 'LOGIN_ATTEMPTS_HOURLY', 'SCHEMA_VERSION',
+            'IDX_USERS_EMAIL', 'IDX_LOGIN_ATTEMPTS_HOURLY_TIME'} <= schema_objects(conn)
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(LOGIN_ATTEMPTS)')]
+    assert columns[-1] == 'LOCATION'
+
+
+def test_rerun_is_a_no_op(conn, capsys):
+    migrate(conn, SQLITE_MIGRATIONS)
+    before = (applied(conn), schema_objects(conn))
+    capsys.readouterr()
+
+    assert migrate(conn, SQLITE_MIGRATIONS) == len(SQLITE_MIGRATIONS)
+    assert (applied(conn), schema_objects(conn)) == before
+    assert 'Applying' not in capsys.readouterr().out
+
+
+def test_only_pending_migrations_run(conn, capsys):
+    assert migrate(conn, SQLITE_MIGRATIONS[:3]) == 3
+    capsys.readouterr()
+
+    assert migrate(conn, SQLITE_MIGRATIONS) == len(SQLITE_MIGRATIONS)
+    printed = [line for line in capsys.readouterr().out.splitlines() if line.startswith('Applying')]
+    assert [int(line.split()[2].rstrip(':')) for line in printed] == list(range(4, len(SQLITE_MIGRATIONS) + 1))
+    assert [number for number, _ in applied(conn)] == list(range(1, len(SQLITE_MIGRATIONS) + 1))
+
+
+def test_a_failing_migration_keeps_the_last_good_version(conn):
+    broken = SQLITE_MIGRATIONS[:2] + [(3, 'Broken', ['CREATE INDEX IDX_BROKEN ON NO_SUCH_TABLE (X)'])]
+    with pytest.raises(sqlite3.OperationalError):
+        migrate(conn, broken)
+    assert [number for number, _ in applied(conn)] == [1, 2]
+    # Fixing the entry lets the next run pick up from there
+    assert migrate(conn, SQLITE_MIGRATIONS) == len(SQLITE_MIGRATIONS)
+
+
+def test_tables_created_before_versioning_are_adopted(conn):
+    conn.execute('CREATE TABLE USERS (USERNAME NVARCHAR(100) PRIMARY KEY, PASSWORD NVARCHAR(100) NOT NULL, '
+                 'EMAIL NVARCHAR(100) NOT NULL)')
+    conn.execute("INSERT INTO USERS VALUES ('alice', 'hash', 'alice@example.com')")
+    conn.commit()
+    assert migrate(conn, SQLITE_MIGRATIONS) == len(SQLITE_MIGRATIONS)
+    assert conn.execute('SELECT USERNAME FROM USERS').fetchall() == [('alice',)]
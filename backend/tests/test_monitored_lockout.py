@@ -0,0 +1,80 @@
+import pytest
+
+from login_check import LOGIN_BAD_PASSWORD
+
+
+class FakeProcess:
+    def __init__(self, pid, events, fail_terminate=False):
+        self.pid = pid
+        self.info = {'name': 'notepad.exe'}
+        self.events = events
+        self.fail_terminate = fail_terminate
+
+    def terminate(self):
+        if self.fail_terminate:
+            raise PermissionError('access denied')
+        self.events.append(('terminate', self.pid))
+
+
+@pytest.fixture
+def monitor(backend_app, monkeypatch):
+    events = []
+    module = backend_app
+    monitor = module.WindowsAppMonitor()
+    monitor.max_login_attempts = 2
+
+    monkeypatch.setattr(module, 'get_jwt_identity', lambda: 'owner')
+    monkeypatch.setattr(module.storage, 'get_user', lambda username: (username, 'hash', 'owner@example.com'))
+    monkeypatch.setattr(module, 'authenticate', lambda *args, **kwargs: (LOGIN_BAD_PASSWORD, None))
+    monkeypatch.setattr(module.alert_coalescer, 'admit', lambda *args: events.append(('admit',)) or True)
+    monkeypatch.setattr(module, 'capture_screenshot',
+                        lambda pid=None, window=None: events.append(('screenshot', pid)) or f'window of {pid}')
+    monkeypatch.setattr(module, 'capture_camera_image', lambda at=None: None)
+    monkeypatch.setattr(module, 'get_public_ip', lambda: '203.0.113.9')
+    monkeypatch.setattr(module, 'send_security_alert',
+                        lambda **alert: events.append(('alert', alert['screenshot_data'])))
+
+    def suspend(pid, **options):
+        process = FakeProcess(pid, events, **options)
+        monitor.suspended_processes[pid] = {'app_name': 'Notepad', 'process': process, 'login_attempts': 0}
+        monitor.blocked_pids.add(pid)
+        return process
+
+    monitor.suspend = suspend
+    monitor.events = events
+    with module.app.test_request_context('/api/monitor/login', environ_base={'REMOTE_ADDR': '10.0.0.5'}):
+        yield monitor
+
+
+def test_window_is_captured_before_the_process_is_terminated(monitor):
+    monitor.suspend(4242)
+    assert monitor.handle_login_attempt('Notepad', 'owner', 'wrong') == \
+        (False, 'Invalid credentials. Attempts remaining: 1')
+    assert monitor.events == []
+
+    assert monitor.handle_login_attempt('notepad', 'owner', 'wrong') == (False, 'Max login attempts exceeded')
+    assert monitor.events == [('admit',), ('screenshot', 4242), ('terminate', 4242), ('alert', 'window of 4242')]
+    assert 4242 not in monitor.suspended_processes and 4242 not in monitor.blocked_pids
+    assert monitor.handle_login_attempt('Notepad', 'owner', 'wrong') == \
+        (False, 'No suspended process found for this app')
+
+
+def test_failed_termination_keeps_the_process_for_a_retry(monitor):
+    process = monitor.suspend(7, fail_terminate=True)
+    monitor.handle_login_attempt('Notepad', 'owner', 'wrong')
+    assert monitor.handle_login_attempt('Notepad', 'owner', 'wrong') == (False, 'Error terminating process')
+    assert 7 in monitor.suspended_processes
+
+    process.fail_terminate = False
+    monitor.events.clear()
+    assert monitor.handle_login_attempt('Notepad', 'owner', 'wrong') == (False, 'Max login attempts exceeded')
+    assert ('terminate', 7) in monitor.events
+    assert 7 not in monitor.suspended_processes
+
+
+def test_folded_alert_skips_the_capture(monitor, backend_app, monkeypatch):
+    monkeypatch.setattr(backend_app.alert_coalescer, 'admit', lambda *args: False)
+    monitor.suspend(9)
+    monitor.handle_login_attempt('Notepad', 'owner', 'wrong')
+    assert monitor.handle_login_attempt('Notepad', 'owner', 'wrong') == (False, 'Max login attempts exceeded')
+    assert monitor.events == [('terminate', 9)]
@@ -0,0 +1,90 @@
+import threading
+
+import pytest
+
+import ratelimit
+from ratelimit import RateLimiter
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_ip_burst_then_wait_for_refill(clock):
+    limiter = RateLimiter(ip_rate=1.0, ip_burst=3)
+    assert [limiter.acquire('login', '10.0.0.1') for _ in range(3)] == [0, 0, 0]
+    assert limiter.acquire('login', '10.0.0.1') == pytest.approx(1.0)
+    clock[0] += 1.0
+    assert limiter.acquire('login', '10.0.0.1') == 0
+    assert limiter.stats()['rejected_ip'] == 1
+
+
+def test_username_limit_applies_across_ips(clock):
+    limiter = RateLimiter(ip_rate=10.0, ip_burst=10, user_rate=0.5, user_burst=2)
+    assert limiter.acquire('login', '10.0.0.1', 'alice') == 0
+    assert limiter.acquire('login', '10.0.0.2', 'alice') == 0
+    assert limiter.acquire('login', '10.0.0.3', 'alice') == pytest.approx(2.0)
+    # A rejection takes no token from the IP bucket either
+    assert limiter.acquire('login', '10.0.0.3', 'bob') == 0
+    stats = limiter.stats()
+    assert stats['rejected_user'] == 1
+    assert stats['admitted'] == 3
+
+
+def test_scopes_are_independent(clock):
+    limiter = RateLimiter(ip_rate=1.0, ip_burst=1)
+    assert limiter.acquire('login', '10.0.0.1') == 0
+    assert limiter.acquire('register', '10.0.0.1') == 0
+    assert limiter.acquire('login', '10.0.0.1') > 0
+
+
+@pytest.mark.parametrize('setting', ['ip_rate', 'user_rate'])
+def test_zero_rate_disables_that_limit(clock, setting):
+    limiter = RateLimiter(ip_rate=1.0, ip_burst=1, user_rate=1.0, user_burst=1)
+    setattr(limiter, setting, 0)
+    # One of the two buckets still limits; the disabled one never does
+    results = [limiter.acquire('login', f'10.0.0.{i}' if setting == 'user_rate' else '10.0.0.1',
+                               'alice' if setting == 'user_rate' else f'user{i}')
+               for i in range(5)]
+    assert results == [0] * 5
+    clock[0] += 3600
+    assert limiter.acquire('login', '10.0.0.9', 'carol') == 0
+
+
+def test_both_rates_zero_admits_everything(clock):
+    limiter = RateLimiter(ip_rate=0, user_rate=0)
+    assert all(limiter.acquire('login', '10.0.0.1', 'alice') == 0 for _ in range(100))
+    assert limiter.stats()['buckets'] == 0
+
+
+def test_idle_full_buckets_are_swept(clock):
+    limiter = RateLimiter(ip_rate=1.0, ip_burst=2, user_rate=1.0, user_burst=2, stripes=1)
+    for i in range(50):
+        limiter.acquire('login', f'10.0.1.{i}')
+    assert limiter.stats()['buckets'] == 50
+    clock[0] += 10
+    limiter.acquire('login', '10.0.2.1')
+    assert limiter.stats()['buckets'] == 1
+
+
+def test_concurrent_acquires_never_exceed_burst():
+    limiter = RateLimiter(ip_rate=0.001, ip_burst=100, user_rate=0.001, user_burst=60, stripes=4)
+    admitted = []
+    barrier = threading.Barrier(8)
+
+    def worker(n):
+        barrier.wait()
+        for i in range(50):
+            if limiter.acquire('login', f'10.0.0.{(n + i) % 3}', 'alice') == 0:
+                admitted.append(1)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(admitted) == 60
+    assert limiter.stats()['admitted'] == 60
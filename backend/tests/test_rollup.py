@@ -0,0 +1,97 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from maintenance import AttemptMaintenance
+from storage import SQLiteStorage
+
+NOW = datetime(2024, 5, 20, 12, 30)
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = SQLiteStorage(str(tmp_path / 'login.db'))
+    storage.migrate()
+    yield storage
+    storage.close()
+
+
+def attempts(username, count, start, step=timedelta(minutes=1), success=False, ip_address='10.0.0.1'):
+    return [(username, success, ip_address, start + i * step) for i in range(count)]
+
+
+def raw_count(storage):
+    with storage.connection() as conn:
+        return conn.execute('SELECT COUNT(*) FROM LOGIN_ATTEMPTS').fetchone()[0]
+
+
+def hourly_rows(storage):
+    with storage.connection() as conn:
+        return conn.execute('SELECT USERNAME, IP_ADDRESS, SUCCESS, HOUR, ATTEMPTS FROM LOGIN_ATTEMPTS_HOURLY '
+                            'ORDER BY HOUR, USERNAME').fetchall()
+
+
+def test_rollup_counts_per_hour_and_keeps_recent_rows(storage):
+    old = NOW - timedelta(days=40)
+    storage.record_attempts(attempts('alice', 90, old.replace(minute=0)))
+    storage.record_attempts(attempts('alice', 2, old, success=True, ip_address=None))
+    storage.record_attempts(attempts('alice', 5, NOW - timedelta(hours=1)))
+
+    maintenance = AttemptMaintenance(storage, retention_days=30, batch_size=25, pause=0)
+    assert maintenance.run_once(now=NOW) == 92
+    assert raw_count(storage) == 5
+    hour = old.replace(minute=0)
+    assert sorted((row[3], row[0], row[1], bool(row[2]), row[4]) for row in hourly_rows(storage)) == [
+        (hour, 'alice', '', True, 2),
+        (hour, 'alice', '10.0.0.1', False, 60),
+        (hour + timedelta(hours=1), 'alice', '10.0.0.1', False, 30),
+    ]
+    assert storage.count_failures('alice') == 95
+    assert storage.count_failures('alice', since=NOW - timedelta(days=1)) == 5
+
+
+def test_repeated_rollups_merge_into_the_same_hour(storage):
+    hour = (NOW - timedelta(days=40)).replace(minute=0)
+    storage.record_attempts(attempts('bob', 10, hour))
+    assert storage.roll_up_attempts(NOW - timedelta(days=30), 100) == 10
+    storage.record_attempts(attempts('bob', 4, hour + timedelta(minutes=30)))
+    assert storage.roll_up_attempts(NOW - timedelta(days=30), 100) == 4
+    assert [row[4] for row in hourly_rows(storage)] == [14]
+
+
+def test_failed_archive_aborts_the_batch(storage):
+    storage.record_attempts(attempts('carol', 3, NOW - timedelta(days=40)))
+
+    def archive(rows):
+        raise OSError('archive volume full')
+
+    with pytest.raises(OSError):
+        storage.roll_up_attempts(NOW - timedelta(days=30), 100, archive=archive)
+    assert raw_count(storage) == 3
+    assert hourly_rows(storage) == []
+
+
+def test_concurrent_rollups_count_each_row_once(storage):
+    old = NOW - timedelta(days=40)
+    storage.record_attempts(attempts('dave', 2000, old, step=timedelta(seconds=7)))
+    barrier = threading.Barrier(4)
+    rolled = []
+
+    def worker():
+        barrier.wait()
+        while True:
+            done = storage.roll_up_attempts(NOW - timedelta(days=30), 50)
+            if not done:
+                return
+            rolled.append(done)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(rolled) == 2000
+    assert raw_count(storage) == 0
+    assert sum(row[4] for row in hourly_rows(storage)) == 2000
+    assert storage.count_failures('dave') == 2000
@@ -0,0 +1,149 @@
+import os
+import shutil
+import subprocess
+import time
+from io import BytesIO
+
+import pytest
+
+from capture import ScreenCapture
+from capture_providers import CaptureProvider, X11CaptureProvider, clip
+from imaging import ImageEncoder
+
+Image = pytest.importorskip('PIL.Image')
+
+# Pixel colours encode their coordinates, so a crop's origin can be read back
+SCREEN = Image.new('RGB', (1000, 600))
+SCREEN.putdata([(x // 4, y // 4, 0) for y in range(600) for x in range(1000)])
+
+
+class FakeProvider(CaptureProvider):
+    """Serves SCREEN, with windows at fixed bounds keyed by pid or window id"""
+
+    name = 'fake'
+
+    def __init__(self, windows):
+        self.windows = windows
+        self.grabs = []
+
+    def available(self):
+        return True
+
+    def screen_bounds(self):
+        return 0, 0, 1000, 600
+
+    def window_bounds(self, pid=None, window=None):
+        return self.windows.get(window or pid)
+
+    def grab(self, bbox):
+        self.grabs.append(bbox)
+        return SCREEN.crop(bbox)
+
+
+def capture(provider, scale=1.0, **target):
+    screen = ScreenCapture(ImageEncoder(formats=('png',), max_bytes=10_000_000), provider, scale)
+    evidence = screen.capture(**target)
+    return Image.open(BytesIO(evidence.data)).convert('RGB'), screen.stats()
+
+
+@pytest.mark.parametrize('bbox, bounds, expected', [
+    ((10, 20, 110, 220), (0, 0, 1000, 600), (10, 20, 110, 220)),
+    ((-50, -10, 200, 100), (0, 0, 1000, 600), (0, 0, 200, 100)),
+    ((900, 500, 1200, 700), (0, 0, 1000, 600), (900, 500, 1000, 600)),
+    ((1000, 0, 1100, 100), (0, 0, 1000, 600), None),
+    ((-1920, 0, -10, 1080), (-1920, 0, 1920, 1080), (-1920, 0, -10, 1080)),
+])
+def test_clip(bbox, bounds, expected):
+    assert clip(bbox, bounds) == expected
+
+
+def test_window_is_cropped_to_its_bounds():
+    provider = FakeProvider({4242: (200, 100, 520, 340)})
+    image, stats = capture(provider, pid=4242)
+    assert provider.grabs == [(200, 100, 520, 340)]
+    assert image.size == (320, 240)
+    # The top-left pixel of the grab is screen pixel (200, 100)
+    assert image.getpixel((0, 0)) == (50, 25, 0)
+    assert (stats['window_captures'], stats['window_not_found']) == (1, 0)
+
+
+def test_window_hanging_off_screen_is_clipped():
+    provider = FakeProvider({'hwnd': (800, -40, 1100, 160)})
+    image, _ = capture(provider, window='hwnd')
+    assert provider.grabs == [(800, 0, 1000, 160)]
+    assert image.size == (200, 160)
+
+
+@pytest.mark.parametrize('windows', [{}, {7: (1200, 0, 1400, 100)}])
+def test_missing_or_offscreen_window_falls_back_to_the_screen(windows):
+    provider = FakeProvider(windows)
+    image, stats = capture(provider, pid=7)
+    assert provider.grabs == [(0, 0, 1000, 600)]
+    assert image.size == (1000, 600)
+    assert (stats['window_captures'], stats['window_not_found']) == (0, 1)
+
+
+def test_no_target_grabs_the_screen_without_counting_a_miss():
+    image, stats = capture(FakeProvider({}))
+    assert image.size == (1000, 600)
+    assert stats['window_not_found'] == 0
+
+
+@pytest.mark.parametrize('scale, size', [(0.5, (160, 120)), (0.25, (80, 60)), (0.001, (1, 1))])
+def test_scale_shrinks_the_cropped_window(scale, size):
+    image, stats = capture(FakeProvider({1: (0, 0, 320, 240)}), scale=scale, pid=1)
+    assert image.size == size
+    # Scaling happens after the grab; the stats count the pixels actually grabbed
+    assert stats['avg_megapixels'] == round(320 * 240 / 1e6, 2)
+
+
+def test_encoder_budget_still_applies_after_cropping():
+    screen = ScreenCapture(ImageEncoder(formats=('jpeg',), max_bytes=20_000, max_width=200, max_height=200),
+                           FakeProvider({1: (0, 0, 800, 400)}))
+    evidence = screen.capture(pid=1)
+    assert len(evidence.data) <= 20_000
+    assert Image.open(BytesIO(evidence.data)).size == (200, 100)
+
+
+@pytest.fixture
+def xvfb():
+    pytest.importorskip('Xlib.display')
+    if not shutil.which('Xvfb'):
+        pytest.skip('Xvfb is not installed')
+    display = ':97'
+    server = subprocess.Popen(['Xvfb', display, '-screen', '0', '800x600x24', '-nolisten', 'tcp'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        from Xlib import display as xdisplay
+        for _ in range(50):
+            try:
+                connection = xdisplay.Display(display)
+                break
+            except Exception:
+                time.sleep(0.1)
+        else:
+            pytest.skip('Xvfb did not start')
+        yield display, connection
+        connection.close()
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def test_x11_provider_finds_and_grabs_a_window_by_pid(xvfb):
+    from Xlib import Xatom
+    display, connection = xvfb
+    screen = connection.screen()
+    window = screen.root.create_window(120, 80, 300, 200, 0, screen.root_depth,
+                                       background_pixel=screen.white_pixel)
+    window.change_property(connection.intern_atom('_NET_WM_PID'), Xatom.CARDINAL, 32, [os.getpid()])
+    window.map()
+    connection.sync()
+
+    provider = X11CaptureProvider(display)
+    assert provider.available()
+    assert provider.window_bounds(pid=os.getpid()) == (120, 80, 420, 280)
+    assert provider.window_bounds(pid=os.getpid() + 1) is None
+    image = provider.grab((120, 80, 420, 280))
+    assert image.size == (300, 200)
+    assert image.getpixel((150, 100)) == (255, 255, 255)
@@ -52,7 +52,7 @@ const Login = () => {
       }
       
       if (err.response?.status === 429) {
-        setError('Account locked due to too many failed attempts. A security alert has been sent.');
+        setError(errorData.message || 'Account locked due to too many failed attempts. A security alert has been sent.');
       }
     }
   };